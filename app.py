@@ -6,7 +6,9 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ConversationHandler
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
 from multiprocessing import Process
-from bot import run_bot_sync
+from modules.supervisor import Supervisor
+import modules.webhook as tg_webhook
+import modules.retention as retention
 
 # Configurações do Mercado Pago
 CLIENT_ID = os.environ.get("CLIENT_ID", "4714763730515747")
@@ -32,68 +34,39 @@ port = int(os.environ.get("PORT", 4040))
 dashboard_data = {
     "botsActive": 0,
     "usersCount": 0,
-    "salesCount": 0
+    "salesCount": 0,
+    "revenue": 0
 }
 
-bots_data = {}
-processes = {}
+# Pool de workers que hospeda os bots (registro bot -> worker por hash consistente)
+supervisor = Supervisor()
 tokens = []
 event_loop = asyncio.new_event_loop()
 # Estados para o bot de registro
 REGISTRO_MENU, REGISTRO_AGUARDANDO_TOKEN, REGISTRO_SELECIONAR_BOT, REGISTRO_AGUARDANDO_NOVO_TOKEN = range(4)
 
 def initialize_all_registered_bots():
-    """Inicializa todos os bots registrados e ativos com carregamento gradual."""
+    """Inicializa todos os bots registrados e ativos, priorizando os com vendas recentes."""
     print('Inicializando bots registrados...')
     
     # Marca todos os bots como ativos para não deletar bots existentes
     manager.mark_all_bots_active()
     
-    global bots_data, processes
-    bots = manager.get_all_bots()
+    # Bots que venderam ou tiveram atividade recente sobem primeiro
+    bots = [bot for bot in manager.get_bots_for_startup() if not supervisor.is_running(bot[0])]
     total_bots = len(bots)
     print(f'Encontrados {total_bots} bots')
     
-    # Define tamanho do lote e delay
-    BATCH_SIZE = 10
-    BATCH_DELAY = 5  # segundos entre lotes
-    
-    # Processa bots em lotes
-    for i in range(0, total_bots, BATCH_SIZE):
-        batch = bots[i:i + BATCH_SIZE]
-        batch_number = (i // BATCH_SIZE) + 1
-        total_batches = (total_bots + BATCH_SIZE - 1) // BATCH_SIZE
-        
-        print(f'\n📦 Iniciando lote {batch_number}/{total_batches} ({len(batch)} bots)...')
-        
-        for bot in batch:
-            bot_id = bot[0]
-
-            # Verifica se já existe um processo rodando para este bot
-            if str(bot_id) in processes and processes[str(bot_id)].is_alive():
-                print(f"Bot {bot_id} já está em execução. Ignorando nova inicialização.")
-                continue
-
-            try:
-                start_bot(bot[1], bot_id)
-                print(f"✅ Bot {bot_id} iniciado com sucesso.")
-                
-                # CORREÇÃO: Garante que o bot_id seja string no dicionário processes
-                if str(bot_id) not in processes and bot_id in processes:
-                    processes[str(bot_id)] = processes[bot_id]
-                    processes.pop(bot_id)
-                
-            except Exception as e:
-                print(f"❌ Erro ao iniciar o bot {bot_id}: {e}")
-        
-        # Aguarda antes do próximo lote (exceto no último)
-        if i + BATCH_SIZE < total_bots:
-            print(f'⏳ Aguardando {BATCH_DELAY} segundos antes do próximo lote...')
-            time.sleep(BATCH_DELAY)
+    # Os workers iniciam os bots com concorrência limitada e taxa controlada
+    # da Bot API; o supervisor imprime o progresso conforme eles ficam online
+    supervisor.begin_startup(total_bots)
+    for bot_id, token in bots:
+        try:
+            start_bot(token, bot_id)
+        except Exception as e:
+            print(f"❌ Erro ao enviar o bot {bot_id} para o worker: {e}")
     
-    # Aguarda um pouco para garantir que todos os bots iniciaram
-    print('\n✅ Todos os bots foram iniciados!')
-    time.sleep(2)
+    print(f'\n📨 {total_bots} bots enviados para os workers!')
     
     # Inicia disparos programados para todos os bots
     print('\nInicializando disparos programados...')
@@ -196,6 +169,10 @@ def callback():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def notify_payment(payment):
+    """Avisa o processo do bot dono do pagamento para entregar o acesso na hora"""
+    supervisor.notify_payment(payment[4], payment[0])
+
 @app.route('/webhook/mp', methods=['POST'])
 def handle_webhook():
     data = request.get_json(silent=True)
@@ -216,7 +193,9 @@ def handle_webhook():
 
             if pagamento_status == "approved":
                 print(f'Pagamento {transaction_id} aprovado - Mercado Pago')
-                manager.update_payment_status(transaction_id, 'paid')
+                # Webhook repetido não muda nada: só a primeira confirmação avisa o bot
+                if manager.mark_payment_paid(transaction_id):
+                    notify_payment(payment)
                 return jsonify({"message": "Webhook recebido com sucesso."}), 200
     
     return jsonify({"message": "Evento ignorado."}), 400
@@ -240,18 +219,32 @@ def webhook():
     
     if data.get('status', '').lower() == 'paid':
         print(f'Pagamento {transaction_id} pago - PushinPay')
-        manager.update_payment_status(transaction_id, 'paid')
+        payment = manager.mark_payment_paid(transaction_id)
+        if payment:
+            notify_payment(payment)
     else:
         print(f"[ERRO] Status do pagamento não é 'paid': {data.get('status')}")
 
     return jsonify({"status": "success"})
 
+@app.route('/tg/<bot_id>', methods=['POST'])
+def telegram_webhook(bot_id):
+    """Recebe os updates dos bots no modo webhook e repassa para o worker do bot"""
+    if not tg_webhook.is_valid(bot_id, request.headers.get('X-Telegram-Bot-Api-Secret-Token')):
+        return 'Unauthorized', 403
+
+    update = request.get_json(silent=True)
+    if not update:
+        return 'Bad Request', 400
+
+    # Bot fora do ar: o Telegram guarda o update e tenta de novo depois
+    if not supervisor.dispatch_update(bot_id, update):
+        return 'Not Found', 404
+    return 'OK', 200
+
 @app.route('/', methods=['GET'])
 def home():
     if session.get("auth", False):
-        dashboard_data['botsActive'] = manager.count_bots()
-        dashboard_data['usersCount'] = '?'
-        dashboard_data['salesCount'] = len(manager.get_all_payments_by_status('finished'))
         return send_file('./templates/terminal.html')
     return redirect(url_for('login'))
 
@@ -264,11 +257,8 @@ def view():
 @app.route('/delete/<id>', methods=['DELETE'])
 async def delete(id):
     if session.get("auth", False):
-        # Remove apenas o processo e dados em memória
-        if id in processes.keys():
-            processes.pop(id)
-        if id in bots_data:
-            bots_data.pop(id)
+        # Para o bot no worker dele
+        supervisor.stop_bot(id)
         
         # Remove completamente do banco
         manager.delete_bot(id)
@@ -291,108 +281,11 @@ def login():
     '''
 
 def start_bot(new_token, bot_id):
-    """Inicia um novo bot em um processo separado."""
-    bot_id = str(bot_id)
-    
-    # NOVA VERIFICAÇÃO: Procura por processos com o mesmo token
-    global processes, bots_data
-    
-    # Verifica se já existe um processo com este token
-    for pid, process in list(processes.items()):
-        if pid in bots_data and bots_data[pid].get('token') == new_token:
-            print(f"Token {new_token[:20]}... já está em uso pelo bot {pid}")
-            
-            # Para o processo antigo
-            try:
-                if process and process.is_alive():
-                    print(f"Parando processo antigo do bot {pid}")
-                    process.terminate()
-                    time.sleep(0.5)
-                    if process.is_alive():
-                        process.kill()
-                    process.join(timeout=2)
-            except Exception as e:
-                print(f"Erro ao parar processo antigo: {e}")
-            
-            # Remove dos dicionários
-            processes.pop(pid, None)
-            bots_data.pop(pid, None)
-    
-    # Verifica se o bot_id já tem processo
-    if bot_id in processes:
-        process = processes[bot_id]
-        if process and process.is_alive():
-            print(f"Bot {bot_id} já tem processo ativo. Parando...")
-            try:
-                process.terminate()
-                time.sleep(0.5)
-                if process.is_alive():
-                    process.kill()
-                process.join(timeout=2)
-            except:
-                pass
-        processes.pop(bot_id, None)
-    
-    # Agora inicia o novo processo
-    process = Process(target=run_bot_sync, args=(new_token, bot_id))
-    process.start()
+    """Inicia um novo bot no worker indicado pelo supervisor."""
+    # O supervisor para qualquer bot que já use este token ou este bot_id
+    supervisor.start_bot(new_token, bot_id)
     tokens.append(new_token)
-    
-    bot = manager.get_bot_by_id(bot_id)
-    bot_details = manager.check_bot_token(new_token)
-    bot_obj = {
-        'id': bot_id,
-        'url':f'https://t.me/{bot_details["result"].get("username", "INDEFINIDO")}' if bot_details else 'Token Inválido',
-        'token': new_token,  # IMPORTANTE: Salvar o token aqui
-        'owner': bot[2],
-        'data': json.loads(bot[4])
-    }
-    bots_data[bot_id] = bot_obj
-    processes[bot_id] = process
-    print(f"Bot {bot_id} processo iniciado - PID: {process.pid}")
     return True
-def check_and_remove_inactive_bots():
-    """Remove bots inativos do sistema"""
-    global processes, bots_data
-    
-    try:
-        # Pega bots inativos há mais de 5 minutos (para teste)
-        inactive_bots = manager.get_inactive_bots(minutes=21600)
-        
-        for bot_data in inactive_bots:
-            bot_id = str(bot_data[0])
-            bot_token = bot_data[1]
-            owner_id = bot_data[2]
-            
-            print(f"Removendo bot inativo {bot_id} do sistema")
-            
-            # Para o processo se estiver rodando
-            if bot_id in processes:
-                try:
-                    process = processes[bot_id]
-                    if process and process.is_alive():
-                        process.terminate()
-                        time.sleep(0.5)
-                        if process.is_alive():
-                            process.kill()
-                        process.join(timeout=2)
-                    processes.pop(bot_id)
-                except Exception as e:
-                    print(f"Erro ao parar processo: {e}")
-            
-            # Remove dos dados em memória
-            if bot_id in bots_data:
-                bots_data.pop(bot_id)
-                
-    except Exception as e:
-        print(f"Erro ao verificar bots inativos: {e}")
-        
-def inactivity_checker_thread():
-    """Thread para verificar bots inativos periodicamente"""
-    while True:
-        time.sleep(18000)  # Verifica a cada 5 horas
-        check_and_remove_inactive_bots()
-
 async def receive_token_register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Verifica se é callback de cancelar
     if update.callback_query:
@@ -418,7 +311,16 @@ async def receive_token_register(update: Update, context: ContextTypes.DEFAULT_T
             return ConversationHandler.END
             
         # Verifica se o token é válido
-        telegram_bot = manager.check_bot_token(new_token)
+        try:
+            # getMe com novas tentativas (pode esperar alguns segundos): fora do event loop
+            telegram_bot = await asyncio.to_thread(manager.check_bot_token, new_token)
+        except (manager.TelegramUnavailable, requests.RequestException):
+            await update.message.reply_text(
+                '⏳ <b>O Telegram não respondeu agora.</b>\n\n'
+                'Envie o token novamente em instantes.',
+                parse_mode='HTML'
+            )
+            return ConversationHandler.END
         if telegram_bot and telegram_bot.get('result'):
             bot_info = telegram_bot['result']
             bot_id = bot_info.get('id')
@@ -428,6 +330,7 @@ async def receive_token_register(update: Update, context: ContextTypes.DEFAULT_T
             if bot_id:
                 # Cria o bot no banco
                 manager.create_bot(str(bot_id), new_token, admin_id)
+                manager.save_bot_profile(bot_id, telegram_bot)
                 
                 # Inicia o bot
                 start_bot(new_token, bot_id)
@@ -537,7 +440,7 @@ async def registro_menu_callback(update: Update, context: ContextTypes.DEFAULT_T
                 bot_token = bot[1]
                 
                 # Verifica se o bot está ativo
-                bot_details = manager.check_bot_token(bot_token)
+                bot_details = manager.get_bot_details(bot_id)
                 if bot_details and bot_details.get('result'):
                     bot_username = bot_details['result'].get('username', 'INDEFINIDO')
                     bot_name = bot_details['result'].get('first_name', 'Sem nome')
@@ -588,7 +491,7 @@ async def registro_menu_callback(update: Update, context: ContextTypes.DEFAULT_T
             bot_token = bot[1]
             
             # Pega info do bot
-            bot_details = manager.check_bot_token(bot_token)
+            bot_details = manager.get_bot_details(bot_id)
             if bot_details and bot_details.get('result'):
                 bot_username = bot_details['result'].get('username', 'INDEFINIDO')
                 bot_name = bot_details['result'].get('first_name', 'Sem nome')
@@ -698,7 +601,16 @@ async def registro_processar_novo_token(update: Update, context: ContextTypes.DE
             return REGISTRO_AGUARDANDO_NOVO_TOKEN
         
         # Valida o novo token
-        telegram_bot = manager.check_bot_token(new_token)
+        try:
+            # getMe com novas tentativas (pode esperar alguns segundos): fora do event loop
+            telegram_bot = await asyncio.to_thread(manager.check_bot_token, new_token)
+        except (manager.TelegramUnavailable, requests.RequestException):
+            await update.message.reply_text(
+                '⏳ <b>O Telegram não respondeu agora.</b>\n\n'
+                'Envie o token novamente em instantes.',
+                parse_mode='HTML'
+            )
+            return REGISTRO_AGUARDANDO_NOVO_TOKEN
         if not telegram_bot or not telegram_bot.get('result'):
             await update.message.reply_text(
                 '❌ <b>Token inválido!</b>\n\n'
@@ -722,24 +634,9 @@ async def registro_processar_novo_token(update: Update, context: ContextTypes.DE
         
         try:
             # 1. Para o bot antigo se estiver rodando
-            if bot_id_antigo in processes:
-                try:
-                    process = processes[bot_id_antigo]
-                    if process:
-                        process.terminate()
-                        time.sleep(0.5)
-                        if process.is_alive():
-                            process.kill()
-                        process.join(timeout=2)
-                    processes.pop(bot_id_antigo)
-                except:
-                    pass
+            supervisor.stop_bot(bot_id_antigo)
             
-            # 2. Remove dos dados em memória
-            if bot_id_antigo in bots_data:
-                bots_data.pop(bot_id_antigo)
-            
-            # 3. Copia apenas configurações específicas
+            # 2. Copia apenas configurações específicas
             bot_antigo = manager.get_bot_by_id(bot_id_antigo)
             if bot_antigo:
                 # Prepara as configurações selecionadas
@@ -778,6 +675,7 @@ async def registro_processar_novo_token(update: Update, context: ContextTypes.DE
                     group=group_data,        # grupo copiado
                     expiration={}            # expiração vazia
                 )
+                manager.save_bot_profile(new_bot_id, telegram_bot)
                 
                 # 4. Deleta o bot antigo
                 manager.delete_bot(bot_id_antigo)
@@ -879,9 +777,12 @@ def start_register():
 @app.route('/dashboard-data', methods=['GET'])
 def get_dashboard_data():
     if session.get("auth", False):
-        dashboard_data['botsActive'] = len(processes)
-        dashboard_data['usersCount'] = '?'
-        dashboard_data['salesCount'] = len(manager.get_all_payments_by_status('finished'))
+        # Leitura de tamanho fixo na tabela COUNTERS (a tela consulta a cada segundo)
+        counters = manager.get_counters()
+        dashboard_data['botsActive'] = counters['bots']
+        dashboard_data['usersCount'] = counters['users']
+        dashboard_data['salesCount'] = counters['sales']
+        dashboard_data['revenue'] = round(counters['revenue'], 2)
         return jsonify(dashboard_data)
     return jsonify({"error": "Unauthorized"}), 403
 
@@ -889,10 +790,11 @@ def get_dashboard_data():
 def bots():
     if session.get("auth", False):
         bot_list = manager.get_all_bots()
+        profiles = manager.get_all_bot_details()
         bots = []
 
         for bot in bot_list:
-            bot_details = manager.check_bot_token(bot[1])
+            bot_details = profiles.get(str(bot[0]))
             bot_structure = {
                 'id': bot[0],
                 'token': bot[1],
@@ -903,7 +805,6 @@ def bots():
             if bot_details:
                 bot_structure['url'] = f'https://t.me/{bot_details['result'].get('username', "INDEFINIDO")}'
             
-            bots_data[str(bot[0])] = bot_structure
             bots.append(bot_structure)
         return jsonify(bots)
     return jsonify({"error": "Unauthorized"}), 403
@@ -925,7 +826,8 @@ def health():
     """Endpoint de health check para o Railway"""
     return jsonify({
         "status": "healthy",
-        "bots_active": len(processes),
+        "bots_active": supervisor.count(),
+        "startup": supervisor.startup_progress(),
         "timestamp": datetime.datetime.now().isoformat()
     })
     
@@ -941,6 +843,8 @@ def get_active_bots():
         # Retorna bots ativos com status dos processos
         active_bots = []
         all_bots = manager.get_all_bots()
+        profiles = manager.get_all_bot_details()
+        health = supervisor.health_report()['bots']
         
         for bot in all_bots:
             bot_id = str(bot[0])
@@ -955,20 +859,21 @@ def get_active_bots():
                 'name': 'Sem nome'  # Default
             }
             
-            # Verifica se o processo está ativo
-            if bot_id in processes:
-                if processes[bot_id] and processes[bot_id].is_alive():
-                    bot_info['status'] = 'active'
-                else:
-                    bot_info['status'] = 'inactive'
+            # Verifica se o bot está rodando em um worker vivo
+            if supervisor.is_running(bot_id):
+                bot_info['status'] = 'active'
             
-            # Tenta pegar username e nome do bot
-            try:
-                bot_details = manager.check_bot_token(bot_token)
-                if bot_details and bot_details.get('result'):
-                    bot_info['username'] = bot_details['result'].get('username', 'INDEFINIDO')
-                    bot_info['name'] = bot_details['result'].get('first_name', 'Sem nome')
-            except:
+            # Reinícios e tempo fora do ar (segundos) vistos pelo supervisor
+            if bot_id in health:
+                bot_info['restarts'] = health[bot_id]['restarts']
+                bot_info['downtime'] = health[bot_id]['downtime']
+            
+            # Username e nome vêm do perfil salvo (atualizado em segundo plano)
+            bot_details = profiles.get(bot_id)
+            if bot_details and bot_details.get('result'):
+                bot_info['username'] = bot_details['result'].get('username', 'INDEFINIDO')
+                bot_info['name'] = bot_details['result'].get('first_name', 'Sem nome')
+            elif bot_details is False:
                 bot_info['username'] = 'Token Inválido'
                 bot_info['name'] = 'Erro'
             
@@ -977,6 +882,13 @@ def get_active_bots():
         return jsonify(active_bots)
     return jsonify({"error": "Unauthorized"}), 403
 
+@app.route('/api/bots/health', methods=['GET'])
+def get_bots_health():
+    if session.get("auth", False):
+        # Heartbeats/lag dos workers e reinícios/tempo fora do ar de cada bot
+        return jsonify(supervisor.health_report())
+    return jsonify({"error": "Unauthorized"}), 403
+
 @app.route('/api/bot/ban/<bot_id>', methods=['POST'])
 def ban_bot(bot_id):
     if session.get("auth", False):
@@ -987,8 +899,8 @@ def ban_bot(bot_id):
             
             # 1. PRIMEIRO envia a notificação através do PRÓPRIO BOT do cliente
             try:
-                # Pega detalhes do bot
-                bot_details = manager.check_bot_token(bot_token)
+                # Pega detalhes do bot (perfil salvo)
+                bot_details = manager.get_bot_details(bot_id)
                 bot_username = bot_details['result'].get('username', 'Bot') if bot_details else 'Bot'
                 
                 message = (
@@ -1019,33 +931,10 @@ def ban_bot(bot_id):
             except Exception as e:
                 print(f"Erro ao enviar notificação através do bot do cliente: {e}")
             
-            # 2. Para TODOS os processos que usam este token
-            # IMPORTANTE: Procura por token, não só por ID
-            for pid, process in list(processes.items()):
-                if pid == str(bot_id) or (pid in bots_data and bots_data[pid].get('token') == bot_token):
-                    try:
-                        if process:
-                            # Envia SIGTERM
-                            process.terminate()
-                            time.sleep(0.5)
-                            
-                            # Se ainda estiver vivo, SIGKILL
-                            if process.is_alive():
-                                process.kill()
-                                time.sleep(0.5)
-                            
-                            # Aguarda o processo realmente terminar
-                            process.join(timeout=2)
-                        
-                        # Remove do dicionário de processos
-                        processes.pop(pid, None)
-                        print(f"Processo {pid} parado com sucesso")
-                    except Exception as e:
-                        print(f"Erro ao parar processo {pid}: {e}")
-                    
-                    # Remove dos dados em memória
-                    if pid in bots_data:
-                        bots_data.pop(pid)
+            # 2. Para o bot no worker dele
+            # O supervisor garante um único bot rodando por token
+            if supervisor.stop_bot(bot_id):
+                print(f"Bot {bot_id} parado com sucesso")
             
             # 3. Remove o token da lista global
             if bot_token in tokens:
@@ -1071,7 +960,7 @@ def ban_bot(bot_id):
 @app.route('/check-inactive', methods=['GET'])
 def check_inactive():
     """Endpoint interno para verificar bots inativos"""
-    check_and_remove_inactive_bots()
+    supervisor.sweep_inactive()
     return jsonify({"status": "checked"})
 
 if __name__ == '__main__':
@@ -1079,13 +968,11 @@ if __name__ == '__main__':
     print(f"URL configurada: {IP_DA_VPS}")
     
     manager.inicialize_database()
-    manager.create_recovery_tracking_table()
+    # VACUUM único (se ainda não estiver em modo incremental) antes de qualquer bot abrir o banco
+    retention.enable_incremental_vacuum()
+    # Sobe os workers antes do bot de registro para ele herdar a fila de controle
+    supervisor.start()
     initialize_all_registered_bots()
     start_register()
     
-    # Inicia thread de verificação de inatividade
-    import threading
-    inactivity_thread = threading.Thread(target=inactivity_checker_thread, daemon=True)
-    inactivity_thread.start()
-    
     app.run(debug=False, host='0.0.0.0', port=port)
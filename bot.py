@@ -1,32 +1,35 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import modules.scheduled_broadcast as scheduled_broadcast
-import json, re, requests, asyncio
+import modules.webhook as webhook
+from modules.ratelimit import TokenBucket
+from modules.expiration import ExpirationScheduler
+import json, re, requests, asyncio, threading, os, time
 
 from modules.actions import recovery_thread
 import modules.recovery_system as recovery_system
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, CallbackContext, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters, Updater, CallbackContext, ChatJoinRequestHandler
-from telegram.error import BadRequest, Conflict
+from telegram.error import BadRequest, Conflict, RetryAfter, InvalidToken
 
 
 
     
 
 # Função de execução do bot
-from modules.utils import cancel, escape_markdown_v2
+from modules.utils import cancel, escape_markdown_v2, bot_snapshot
 from modules.actions import send_disparo, send_upsell, send_downsell, send_expiration, send_invite, send_payment, acessar_planos, confirmar_plano, notificar_admin, acessar_planos_mensagem
-from comandos.grupo import conv_handler_grupo
-from comandos.planos import conv_handler_planos
-from comandos.upsell import conv_handler_upsell
-from comandos.expiracao import conv_handler_adeus
-from comandos.recuperacao import conv_handler_recuperacao
-from comandos.inicio import conv_handler_inicio
-from comandos.admins import conv_handler_admin
-from comandos.gateway import conv_handler_gateway
-from comandos.downsell import conv_handler_downsell
-from comandos.disparo import conv_handler_disparo
-from comandos.orderbump import conv_handler_orderbump
+from comandos.grupo import build_conv_handler_grupo
+from comandos.planos import build_conv_handler_planos
+from comandos.upsell import build_conv_handler_upsell
+from comandos.expiracao import build_conv_handler_adeus
+from comandos.recuperacao import build_conv_handler_recuperacao
+from comandos.inicio import build_conv_handler_inicio
+from comandos.admins import build_conv_handler_admin
+from comandos.gateway import build_conv_handler_gateway
+from comandos.downsell import build_conv_handler_downsell
+from comandos.disparo import build_conv_handler_disparo
+from comandos.orderbump import build_conv_handler_orderbump
 from comandos.start import start
 from datetime import datetime, timedelta
 def add_days(date_str, type, amount, date_format="%Y-%m-%d"):
@@ -47,10 +50,9 @@ def add_days(date_str, type, amount, date_format="%Y-%m-%d"):
 from datetime import datetime, timedelta
 
 def calcular_datas(dias: int):
-    agora = datetime.now()  # Obtém a data e hora atual
-    futura = agora + timedelta(days=dias)  # Soma os dias à data atual
-
-    return agora.strftime("%Y-%m-%d %H:%M:%S"), futura.strftime("%Y-%m-%d %H:%M:%S")
+    """(agora, agora + dias) em epoch (segundos), como gravado em USERS"""
+    agora = int(time.time())
+    return agora, agora + dias * 86400
 
 async def check_join_request(update: Update, context: CallbackContext):
     join_request = update.chat_join_request
@@ -58,12 +60,13 @@ async def check_join_request(update: Update, context: CallbackContext):
     chat_id = str(join_request.chat.id)
     
     # Pega o grupo principal e o grupo do upsell
-    main_group = manager.get_bot_group(bot_application.bot_data['id'])
-    upsell_config = manager.get_bot_upsell(bot_application.bot_data['id'])
+    snapshot = await bot_snapshot(context)
+    main_group = snapshot.group
+    upsell_config = snapshot.upsell
     upsell_group = upsell_config.get('group_id', '') if upsell_config else ''
     
     # Verifica se tem autorização para o grupo específico
-    auth = manager.get_user_expiration(str(user.id), chat_id)
+    auth = await amanager.get_user_expiration(str(user.id), chat_id)
     
     if auth:
         await join_request.approve()
@@ -73,181 +76,137 @@ async def check_join_request(update: Update, context: CallbackContext):
         if chat_id == main_group:
             await send_upsell(context, str(user.id))
         
-async def expiration_task():
-    print('expiration')
-    while True:
-        try:
-            grupo_id = manager.get_bot_group(bot_application.bot_data['id'])
-            expirados = manager.verificar_expirados(grupo_id)
-        
-            for user_id in expirados:
-                try:
-                    print(f'expirado {user_id}')
-                    manager.remover_usuario(user_id, grupo_id)
-                    await send_expiration(bot_application, user_id)
-                    await bot_application.bot.ban_chat_member(chat_id=grupo_id, user_id=user_id)
-                    await bot_application.bot.unban_chat_member(chat_id=grupo_id, user_id=user_id)
-                    
-                    
-                except Exception as e:
-                    print(e)
-        except Exception as e:
-            print(e)
-            #print(f'erro exp {bot_application.bot_data['id']}')
-        await asyncio.sleep(5)
-
-async def payment_task():
-    print("PAYMENT TASK > Iniciando")
+async def expiration_task(application):
+    await application.bot_data['expiration_scheduler'].run()
+
+# Os pagamentos confirmados chegam por aviso do processo web (evento 'payment' do host_main);
+# a varredura periódica fica só como reconciliação caso algum aviso se perca.
+PAYMENT_RECONCILE_INTERVAL = 60
+# Pagamentos reservados e entregues em paralelo a cada rodada do payment_task
+PAYMENT_CLAIM_BATCH = 8
+
+# Bots iniciando ao mesmo tempo em cada processo host
+STARTUP_CONCURRENCY = 8
+# Chamadas à Bot API feitas para iniciar um bot (close, getMe, webhook/polling)
+STARTUP_API_CALLS = 3
+# Chamadas à Bot API por segundo na inicialização de um processo host
+STARTUP_RATE = 10
+# Tentativas de iniciar um bot quando o Telegram pede para esperar (429)
+STARTUP_RETRIES = 3
+# Intervalo entre heartbeats do processo host para o supervisor (segundos)
+HEARTBEAT_INTERVAL = 5
+
+async def deliver_payment(application, payment):
+    """Entrega um pagamento reservado por claim_paid_payments; False se falhou antes de liberar o acesso"""
     name = {
             'dia':1,
             'semana':7,
             'mes':30,
             'ano':365
         }
+    try:
+        # Grupo, admins e dono numa única leitura por pagamento
+        snapshot = await amanager.get_bot_snapshot(application.bot_data['id'])
+        group = snapshot.group
+        user = payment[2]
+        plan = await amanager.get_payment_plan(payment)
+        days = 3650
+        if not plan['time_type'] == 'eterno':
+            days = name[plan['time_type']]*int(plan['time'])
+        today, expiration = calcular_datas(days)
+
+        # ADICIONAR ESTE CÓDIGO AQUI - CANCELA RECUPERAÇÕES AO PAGAR
+        # Cancela todas as recuperações pendentes para este usuário
+        await amanager.stop_recovery_tracking(user, application.bot_data['id'])
+        print(f"Recuperações canceladas para usuário {user} - pagamento confirmado")
+
+        # Verifica se é upsell ou downsell: para eles o acesso é ao grupo extra
+        extra = plan.get('is_upsell') or plan.get('is_downsell')
+        access_group = (plan.get('upsell_group') or plan.get('downsell_group')) if extra else group
+
+        # Acesso gravado na mesma transação do finished: uma linha em USERS por pagamento
+        if not await amanager.finish_payment(payment[0], (user, today, expiration, plan, access_group)):
+            return True
+    except Exception as e:
+        # Nada foi liberado ainda: volta para 'paid' e é tentado de novo mais tarde
+        print(f"Erro ao entregar pagamento {payment[0]}: {e}")
+        await amanager.release_payment(payment[0])
+        return False
+
+    # Daqui em diante o pagamento já está concluído: falhas só são registradas
+    try:
+        application.bot_data['expiration_scheduler'].schedule(user, access_group, expiration)
+
+        if extra:
+            # Envia convite para o grupo extra
+            try:
+                group_invite_link = await application.bot.create_chat_invite_link(
+                    chat_id=access_group,
+                    creates_join_request=True
+                )
+                keyboard = [
+                    [InlineKeyboardButton("ENTRAR NO GRUPO VIP EXTRA", url=group_invite_link.invite_link)]
+                ]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+
+                await application.bot.send_message(
+                    chat_id=user,
+                    text="✅ Pagamento do VIP Extra aprovado! Clique abaixo para entrar:",
+                    reply_markup=reply_markup
+                )
+            except Exception as e:
+                print(f"Erro ao criar link do grupo extra: {e}")
+        else:
+            # Pagamento normal
+            await send_invite(application, user)
+
+        # NOTIFICAÇÃO PARA TODOS OS TIPOS DE PAGAMENTO (FORA DO ELSE!)
+        admin_list = snapshot.admin
+        owner = snapshot.owner
+        if owner not in admin_list:
+            admin_list.append(owner)
+
+        # Personaliza o nome do plano para upsell/downsell/recovery
+        if plan.get('is_upsell'):
+            plan['name'] = f"UPSELL - {plan['name']}"
+        elif plan.get('is_downsell'):
+            plan['name'] = f"DOWNSELL - {plan['name']}"
+        elif plan.get('has_orderbump'):
+            plan['name'] = f"COM ORDERBUMP - {plan['name']}"
+        elif plan.get('is_recovery'):
+            plan['name'] = f"RECUPERAÇÃO {plan.get('recovery_index', 0) + 1} - {plan['name']} ({plan.get('discount', 0)}% OFF)"
+
+        for admin in admin_list:
+            try:
+                await notificar_admin(user, plan, application, admin)
+            except Exception as e:
+                print(f"Erro ao notificar admin {admin}: {e}")
+    except Exception as e:
+        print(f"Erro ao avisar pagamento {payment[0]} já entregue: {e}")
+    return True
+
+async def payment_task(application):
+    print("PAYMENT TASK > Iniciando")
+    wakeup = application.bot_data['payment_event']
     while True:
-        await asyncio.sleep(2)
         try:
-            payments = manager.get_payments_by_status('paid', bot_application.bot_data['id'])
-            
-            if len(payments) > 0:
-                
-                for payment in payments:
-                    manager.update_payment_status(payment[1], 'finished')
-                    
-                    if True:
-                        group = manager.get_bot_group(bot_application.bot_data['id'])
-                        user = payment[2]
-                        plan = json.loads(payment[3])
-                        days = 3650
-                        if not plan['time_type'] == 'eterno':
-                            days = name[plan['time_type']]*int(plan['time'])
-                        today, expiration = calcular_datas(days)
-
-                        # ADICIONAR ESTE CÓDIGO AQUI - CANCELA RECUPERAÇÕES AO PAGAR
-                        # Cancela todas as recuperações pendentes para este usuário
-                        manager.stop_recovery_tracking(user, bot_application.bot_data['id'])
-                        print(f"Recuperações canceladas para usuário {user} - pagamento confirmado")
-
-                        # Verifica se é upsell ou downsell
-                        if plan.get('is_upsell') or plan.get('is_downsell'):
-                            # Para upsell/downsell, adiciona ao grupo extra
-                            extra_group = plan.get('upsell_group') or plan.get('downsell_group')
-                            manager.add_user_to_expiration(user, today, expiration, plan, extra_group)
-                            
-                            # Envia convite para o grupo extra
-                            try:
-                                group_invite_link = await bot_application.bot.create_chat_invite_link(
-                                    chat_id=extra_group,
-                                    creates_join_request=True
-                                )
-                                keyboard = [
-                                    [InlineKeyboardButton("ENTRAR NO GRUPO VIP EXTRA", url=group_invite_link.invite_link)]
-                                ]
-                                reply_markup = InlineKeyboardMarkup(keyboard)
-                                
-                                await bot_application.bot.send_message(
-                                    chat_id=user,
-                                    text="✅ Pagamento do VIP Extra aprovado! Clique abaixo para entrar:",
-                                    reply_markup=reply_markup
-                                )
-                            except Exception as e:
-                                print(f"Erro ao criar link do grupo extra: {e}")
-                        else:
-                            # Pagamento normal
-                            manager.add_user_to_expiration(user, today, expiration, plan, group)
-                            await send_invite(bot_application, user)
-                        
-                        # NOTIFICAÇÃO PARA TODOS OS TIPOS DE PAGAMENTO (FORA DO ELSE!)
-                        admin_list = manager.get_bot_admin(bot_application.bot_data['id'])
-                        owner = manager.get_bot_owner(bot_application.bot_data['id'])
-                        if owner not in admin_list:
-                            admin_list.append(owner)
-                        
-                        # Personaliza o nome do plano para upsell/downsell/recovery
-                        if plan.get('is_upsell'):
-                            plan['name'] = f"UPSELL - {plan['name']}"
-                        elif plan.get('is_downsell'):
-                            plan['name'] = f"DOWNSELL - {plan['name']}"
-                        elif plan.get('has_orderbump'):
-                            plan['name'] = f"COM ORDERBUMP - {plan['name']}"
-                        elif plan.get('is_recovery'):
-                            plan['name'] = f"RECUPERAÇÃO {plan.get('recovery_index', 0) + 1} - {plan['name']} ({plan.get('discount', 0)}% OFF)"
-                            
-                        for admin in admin_list:
-                            try:
-                                await notificar_admin(user, plan, bot_application, admin)
-                            except Exception as e:
-                                print(f"Erro ao notificar admin {admin}: {e}")
-                    
-        except Exception as e:
-            print(f"Erro no payment_task: {e}")
-            
-async def inactivity_check_task():
-    """Verifica bots inativos e os remove após período de inatividade"""
-    print('INACTIVITY CHECK > Iniciando')
-    
-    # Marca todos os bots como ativos na primeira execução para não deletar bots antigos
-    manager.mark_all_bots_active()
-    
-    while True:
-        await asyncio.sleep(60)  # Verifica a cada 1 minuto
-        
+            await asyncio.wait_for(wakeup.wait(), timeout=PAYMENT_RECONCILE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
         try:
-            # Pega bots inativos há mais de 5 minutos (para teste)
-            inactive_bots = manager.get_inactive_bots(minutes=21600)
-            
-            for bot_data in inactive_bots:
-                bot_id = bot_data[0]
-                bot_token = bot_data[1]
-                owner_id = bot_data[2]
-                last_activity = bot_data[3]
-                
-                print(f"Bot {bot_id} inativo detectado. Última atividade: {last_activity}")
-                
-                try:
-                    # Pega detalhes do bot
-                    bot_details = manager.check_bot_token(bot_token)
-                    bot_username = bot_details['result'].get('username', 'Bot') if bot_details else 'Bot'
-                    
-                    # Mensagem de aviso
-                    message = (
-                        "🚫 <b>ATENÇÃO: BOT REMOVIDO POR INATIVIDADE</b> 🚫\n\n"
-                        f"<b>Bot:</b> @{bot_username}\n"
-                        f"<b>ID:</b> {bot_id}\n\n"
-                        "❌ Este bot foi automaticamente removido do sistema.\n"
-                        "❌ Motivo: Inatividade por mais de 5 minutos.\n"
-                        "❌ Todos os dados foram apagados.\n\n"
-                        "💡 Para usar novamente, cadastre um novo bot.\n\n"
-                        "⚠️ <i>Sistema de limpeza automática</i>"
-                    )
-                    
-                    # Envia notificação através do próprio bot
-                    response = requests.post(
-                        f"https://api.telegram.org/bot{bot_token}/sendMessage",
-                        json={
-                            "chat_id": owner_id,
-                            "text": message,
-                            "parse_mode": "HTML"
-                        }
-                    )
-                    print(f"Notificação de inatividade enviada: {response.status_code}")
-                    
-                    # Aguarda para garantir que a mensagem foi enviada
-                    await asyncio.sleep(2)
-                    
-                except Exception as e:
-                    print(f"Erro ao enviar notificação de inatividade: {e}")
-                
-                # Agora vamos deletar do banco (o processo será parado no app.py)
-                # Deleta do banco de dados
-                manager.delete_bot(bot_id)
-                print(f"Bot {bot_id} removido por inatividade")
-                
+            # Cada lote reservado é só deste processo; as entregas do lote rodam em paralelo
+            while True:
+                payments = await amanager.claim_paid_payments(application.bot_data['id'], PAYMENT_CLAIM_BATCH)
+                delivered = await asyncio.gather(*(deliver_payment(application, payment) for payment in payments))
+                # Lote com falha espera a próxima rodada: não martela o Telegram nem o banco
+                if len(payments) < PAYMENT_CLAIM_BATCH or not all(delivered):
+                    break
         except Exception as e:
-            print(f"Erro no inactivity_check_task: {e}")
+            print(f"Erro no payment_task: {e}")
 
 from modules.utils import process_command, is_admin, cancel, error_callback, error_message, escape_markdown_v2
-from modules.actions import exibir_plano
+from modules.actions import exibir_plano, offer_plan
 
 # ADICIONAR ANTES DA FUNÇÃO processar_orderbump NO ARQUIVO bot.py
 
@@ -320,13 +279,17 @@ async def processar_orderbump(update: Update, context: CallbackContext):
     payment_id = data_parts[2]
     
     # Busca os dados do pagamento
-    payment_data = manager.get_payment_by_id(payment_id)
-    plan = json.loads(payment_data[3])
+    payment_data = await amanager.get_payment_by_id(payment_id)
+    if payment_data is None:
+        # Botão antigo de um pagamento parado que a retenção já arquivou
+        await query.message.reply_text('⌛ Este link expirou. Use /start para ver os planos novamente')
+        return ConversationHandler.END
+    plan = await amanager.get_payment_plan(payment_data)
     
     if action == 'aceitar':
         # Usuário aceitou o order bump
         plano_index = context.user_data.get('plano_selecionado', 0)
-        orderbump = manager.get_orderbump_by_plan(context.bot_data['id'], plano_index)
+        orderbump = await amanager.get_orderbump_by_plan(context.bot_data['id'], plano_index)
         
         if orderbump:
             # Soma o valor do order bump ao plano
@@ -343,7 +306,7 @@ async def processar_orderbump(update: Update, context: CallbackContext):
             plan['valor_original'] = valor_original
             
             # Atualiza o pagamento no banco com o novo plano
-            manager.update_payment_plan(payment_id, plan)
+            await amanager.update_payment_plan(payment_id, plan)
             
             print(f"Order Bump aceito: Valor original R${valor_original} + Order Bump R${valor_orderbump} = Total R${novo_valor}")
     
@@ -357,7 +320,7 @@ async def processar_orderbump(update: Update, context: CallbackContext):
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     try:
-        gate = manager.get_bot_gateway(context.bot_data['id'])
+        gate = await amanager.get_bot_gateway(context.bot_data['id'])
         if not gate.get('type', False):
             await query.message.edit_text('Nenhuma gateway cadastrada')
             return ConversationHandler.END
@@ -369,8 +332,8 @@ async def processar_orderbump(update: Update, context: CallbackContext):
         qr_data = {}
 
         # Pega o plano atualizado do banco
-        payment_data_updated = manager.get_payment_by_id(payment_id)
-        plan_updated = json.loads(payment_data_updated[3])
+        payment_data_updated = await amanager.get_payment_by_id(payment_id)
+        plan_updated = await amanager.get_payment_plan(payment_data_updated)
         
         if gate.get('type') == 'pp':
             qr_data = payment.criar_pix_pp(gate['token'], plan_updated['value'])
@@ -385,8 +348,9 @@ async def processar_orderbump(update: Update, context: CallbackContext):
             await query.message.edit_text('Erro ao gerar QRCODE tente novamente')
             return ConversationHandler.END
 
-        manager.update_payment_id(payment_id, trans_id)
-        manager.update_payment_status(payment_id, 'waiting')
+        if not await amanager.set_payment_waiting(payment_id, trans_id):
+            await query.message.edit_text('Este pagamento já foi confirmado')
+            return ConversationHandler.END
         
         await context.bot.send_message(query.from_user.id, f'*Aguarde um momento enquanto preparamos tudo\ :\) *', parse_mode='MarkdownV2')
         await context.bot.send_message(query.from_user.id, f'{escape_markdown_v2("Para efetuar o pagamento, utiliza a opção Pagar > PIX copia e Cola no aplicativo do seu banco.")}', parse_mode='MarkdownV2')
@@ -446,13 +410,24 @@ async def pagar(update: Update, context: CallbackContext):
     await query.answer()
 
     # Extrai o payment_id de diferentes formatos de callback
-    if '_' in query.data:
+    if query.data.startswith('oferta_'):
+        # Oferta de disparo/recuperação: o pagamento nasce neste clique
+        plano = await offer_plan(query, context)
+        if plano is None:
+            await query.message.reply_text('⛔ Oferta não encontrada')
+            return ConversationHandler.END
+        payment_id = await amanager.create_payment(str(query.from_user.id), plano, plano['name'], context.bot_data['id'])
+    elif '_' in query.data:
         payment_id = query.data.split('_')[-1]
     else:
         payment_id = query.data.replace('pagar', '')
     
-    payment_data = manager.get_payment_by_id(payment_id)
-    plan = json.loads(payment_data[3])
+    payment_data = await amanager.get_payment_by_id(payment_id)
+    if payment_data is None:
+        # Botão antigo de um pagamento parado que a retenção já arquivou
+        await query.message.reply_text('⌛ Este link expirou. Use /start para ver os planos novamente')
+        return ConversationHandler.END
+    plan = await amanager.get_payment_plan(payment_data)
     value = plan.get('value', False)
     
     if not value:
@@ -468,7 +443,7 @@ async def pagar(update: Update, context: CallbackContext):
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     try:
-        gate = manager.get_bot_gateway(context.bot_data['id'])
+        gate = await amanager.get_bot_gateway(context.bot_data['id'])
         if not gate.get('type', False):
             await query.message.edit_text('Nenhuma gateway cadastrada')
             return ConversationHandler.END
@@ -492,8 +467,9 @@ async def pagar(update: Update, context: CallbackContext):
             await query.message.edit_text('Erro ao gerar QRCODE tente novamente')
             return ConversationHandler.END
 
-        manager.update_payment_id(payment_id, trans_id)
-        manager.update_payment_status(payment_id, 'waiting')
+        if not await amanager.set_payment_waiting(payment_id, trans_id):
+            await query.message.edit_text('Este pagamento já foi confirmado')
+            return ConversationHandler.END
         
         # Mensagem personalizada para upsell/downsell
         if plan.get('is_upsell'):
@@ -574,70 +550,251 @@ async def acessar_planos_force(update: Update, context: ContextTypes.DEFAULT_TYP
         pass
 
 
-async def run_bot(token, bot_id):
-    global bot_application
-    
-    # REMOVER TODAS AS VERIFICAÇÕES DE BANIMENTO
-    # O código agora começa direto com:
-    disable_get_updates(token)
-    bot_application = Application.builder().token(token).build()
+def build_application(token, bot_id):
+    """Monta a Application de um bot com handlers e estado próprios (vários bots podem dividir o mesmo processo)"""
+    application = Application.builder().token(token).build()
     
     # IMPORTANTE: CommandHandlers devem vir ANTES do MessageHandler genérico
     # Handlers de comandos específicos
-    bot_application.add_handler(CommandHandler('start', start))
-    bot_application.add_handler(CommandHandler('comandos', comandos))
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(CommandHandler('comandos', comandos))
     
-    # ConversationHandlers
-    bot_application.add_handler(conv_handler_grupo)
-    bot_application.add_handler(conv_handler_upsell)
-    bot_application.add_handler(conv_handler_planos)
-    bot_application.add_handler(conv_handler_adeus)
-    bot_application.add_handler(conv_handler_recuperacao)
-    bot_application.add_handler(conv_handler_inicio)
-    bot_application.add_handler(conv_handler_admin)
-    bot_application.add_handler(conv_handler_gateway)
-    bot_application.add_handler(conv_handler_disparo)
-    bot_application.add_handler(conv_handler_downsell)
-    bot_application.add_handler(conv_handler_orderbump)
+    # ConversationHandlers (instâncias novas por bot, o estado das conversas fica no handler)
+    application.add_handler(build_conv_handler_grupo())
+    application.add_handler(build_conv_handler_upsell())
+    application.add_handler(build_conv_handler_planos())
+    application.add_handler(build_conv_handler_adeus())
+    application.add_handler(build_conv_handler_recuperacao())
+    application.add_handler(build_conv_handler_inicio())
+    application.add_handler(build_conv_handler_admin())
+    application.add_handler(build_conv_handler_gateway())
+    application.add_handler(build_conv_handler_disparo())
+    application.add_handler(build_conv_handler_downsell())
+    application.add_handler(build_conv_handler_orderbump())
     
     # Handlers de chat
-    bot_application.add_handler(ChatJoinRequestHandler(check_join_request))
+    application.add_handler(ChatJoinRequestHandler(check_join_request))
     
     # CallbackQueryHandlers
-    bot_application.add_handler(CallbackQueryHandler(pagar, pattern='^pagar_'))
-    bot_application.add_handler(CallbackQueryHandler(acessar_planos, pattern='^acessar_ofertas$'))
-    bot_application.add_handler(CallbackQueryHandler(confirmar_plano, pattern='^plano_'))
-    bot_application.add_handler(CallbackQueryHandler(processar_upsell, pattern='^upsell_'))
-    bot_application.add_handler(CallbackQueryHandler(processar_downsell, pattern='^downsell_'))
-    bot_application.add_handler(CallbackQueryHandler(exibir_plano, pattern='^exibir_'))
-    bot_application.add_handler(CallbackQueryHandler(processar_orderbump, pattern='^orderbump_'))
-    bot_application.add_handler(CallbackQueryHandler(cancel, pattern='cancelar'))
+    application.add_handler(CallbackQueryHandler(pagar, pattern='^pagar_'))
+    application.add_handler(CallbackQueryHandler(pagar, pattern='^oferta_'))
+    application.add_handler(CallbackQueryHandler(acessar_planos, pattern='^acessar_ofertas$'))
+    application.add_handler(CallbackQueryHandler(confirmar_plano, pattern='^plano_'))
+    application.add_handler(CallbackQueryHandler(processar_upsell, pattern='^upsell_'))
+    application.add_handler(CallbackQueryHandler(processar_downsell, pattern='^downsell_'))
+    application.add_handler(CallbackQueryHandler(exibir_plano, pattern='^exibir_'))
+    application.add_handler(CallbackQueryHandler(processar_orderbump, pattern='^orderbump_'))
+    application.add_handler(CallbackQueryHandler(cancel, pattern='cancelar'))
     
     # IMPORTANTE: MessageHandler genérico deve ser o ÚLTIMO
     # Adicionar um filtro mais específico para evitar conflitos
-    bot_application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, acessar_planos_force))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, acessar_planos_force))
     
-    bot_application.bot_data['id'] = bot_id
-    await bot_application.initialize()
-    await bot_application.start()
-    await bot_application.updater.start_polling()
+    application.bot_data['id'] = bot_id
+    application.bot_data['expiration_scheduler'] = ExpirationScheduler(application)
 
+    # Já começa processando pagamentos que ficaram pendentes enquanto o bot estava fora
+    payment_event = asyncio.Event()
+    payment_event.set()
+    application.bot_data['payment_event'] = payment_event
+    return application
+
+
+async def run_bot(token, bot_id):
+    """Inicia um bot e suas tarefas de fundo no event loop atual"""
+    # REMOVER TODAS AS VERIFICAÇÕES DE BANIMENTO
+    # O código agora começa direto com:
+    if not webhook.enabled():
+        await asyncio.get_running_loop().run_in_executor(None, disable_get_updates, token)
+    application = build_application(token, bot_id)
+    try:
+        await application.initialize()
+        await application.start()
+        if webhook.enabled():
+            # Os updates chegam pelo servidor web (evento 'update' do host_main)
+            await application.bot.set_webhook(
+                url=webhook.webhook_url(bot_id),
+                secret_token=webhook.secret_token(bot_id),
+            )
+        else:
+            await application.updater.start_polling()
+    except Exception:
+        # Não deixa uma Application meio iniciada para trás antes de tentar de novo
+        await stop_bot(application)
+        raise
 
-async def main_start(token, id):
-    """Executa o bot e outras tarefas simultaneamente"""
-    
-    # Primeiro inicializa o bot
-    await run_bot(token, id)
-    
     # Inicia os disparos programados após o bot estar pronto
-    scheduled_broadcast.start_scheduled_broadcasts_for_bot(bot_application, id)
-    
-    # Depois inicia as outras tasks
-    await asyncio.gather(
-        payment_task(),
-        expiration_task(),
-        inactivity_check_task()  # NOVA TASK ADICIONADA
-    )
+    await scheduled_broadcast.start_scheduled_broadcasts_for_bot(application, bot_id)
+
+    application.bot_data['tasks'] = [
+        asyncio.create_task(payment_task(application)),
+        asyncio.create_task(expiration_task(application)),
+    ]
+    return application
+
+
+async def stop_bot(application):
+    """Para um bot sem afetar os outros bots do mesmo processo"""
+    bot_id = application.bot_data['id']
+    scheduled_broadcast.stop_scheduled_broadcasts_for_bot(bot_id)
+    for task in application.bot_data.get('tasks', []):
+        task.cancel()
+    try:
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+    except Exception as e:
+        print(f"Erro ao parar bot {bot_id}: {e}")
+
+
+def listen_host_events(events, loop, handle_event):
+    """Thread que recebe os comandos do processo web e repassa para o event loop"""
+    while True:
+        try:
+            event = events.get()
+        except (EOFError, OSError):
+            return
+        loop.call_soon_threadsafe(handle_event, event)
+
+
+def bot_alive(application):
+    """Application de pé, recebendo updates e com as tarefas de fundo rodando"""
+    if not application.running:
+        return False
+    if not webhook.enabled():
+        # A tarefa de polling termina sozinha em erro fatal (ex: token revogado)
+        polling = getattr(application.updater, '_Updater__polling_task', None)
+        if not application.updater.running or (polling is not None and polling.done()):
+            return False
+    return not any(task.done() for task in application.bot_data.get('tasks', []))
+
+
+async def host_main(bots, events=None, status=None, startup_rate=STARTUP_RATE):
+    """Executa vários bots no mesmo processo e event loop.
+
+    bots é uma lista de (token, bot_id). Pela fila events chegam avisos de
+    pagamento ({'type': 'payment', 'bot_id'}), pedidos para iniciar/parar bots
+    ({'type': 'start', 'bot_id', 'token'} / {'type': 'stop', 'bot_id'}), o pedido
+    de encerramento do processo ({'type': 'shutdown'}) e, no modo webhook, os
+    updates do Telegram ({'type': 'update', 'bot_id', 'update'}).
+    Pela fila status o processo avisa quando cada bot ficou online ou falhou e,
+    no heartbeat, quais bots já iniciados pararam (dead).
+    """
+    applications = {}
+    pending_updates = {}  # bot_id -> updates recebidos enquanto o bot inicia
+    wanted = {}           # bot_id -> pedido de start mais recente
+    loop = asyncio.get_running_loop()
+    startup_slots = asyncio.Semaphore(STARTUP_CONCURRENCY)
+    bucket = TokenBucket(startup_rate)
+    finished = asyncio.Event()
+
+    def report(kind, bot_id, **extra):
+        if status is None:
+            return
+        try:
+            status.put_nowait({'type': kind, 'bot_id': bot_id, 'pid': os.getpid(), **extra})
+        except Exception as e:
+            print(f"Erro ao reportar {kind} do bot {bot_id}: {e}")
+
+    def enqueue_update(application, data):
+        application.update_queue.put_nowait(Update.de_json(data, application.bot))
+
+    async def start_hosted(token, bot_id):
+        bot_id = str(bot_id)
+        request = wanted[bot_id] = object()
+        if bot_id in applications:
+            await stop_bot(applications.pop(bot_id))
+        pending_updates[bot_id] = []
+        try:
+            async with startup_slots:
+                for attempt in range(STARTUP_RETRIES):
+                    # Parado ou reiniciado enquanto esperava a vez
+                    if wanted.get(bot_id) is not request:
+                        return
+                    await bucket.acquire(STARTUP_API_CALLS)
+                    try:
+                        application = await run_bot(token, bot_id)
+                        bucket.success()
+                        break
+                    except RetryAfter as e:
+                        print(f"Bot {bot_id}: Telegram pediu para esperar {e.retry_after}s")
+                        bucket.pause(e.retry_after)
+                        if attempt == STARTUP_RETRIES - 1:
+                            raise
+
+            if wanted.get(bot_id) is not request:
+                await stop_bot(application)
+                return
+            applications[bot_id] = application
+            print(f"✅ Bot {bot_id} iniciado (PID {os.getpid()})")
+            report('started', bot_id)
+            for data in pending_updates[bot_id]:
+                enqueue_update(application, data)
+        except Exception as e:
+            print(f"❌ Erro ao iniciar o bot {bot_id}: {e}")
+            # Token revogado não adianta tentar de novo
+            report('failed', bot_id, error=str(e), retry=not isinstance(e, InvalidToken))
+        finally:
+            if wanted.get(bot_id) is request:
+                pending_updates.pop(bot_id, None)
+
+    async def stop_hosted(bot_id):
+        wanted.pop(str(bot_id), None)
+        pending_updates.pop(str(bot_id), None)
+        application = applications.pop(str(bot_id), None)
+        if application:
+            await stop_bot(application)
+            print(f"Bot {bot_id} parado")
+
+    async def shutdown():
+        # Para todos os bots e deixa host_main retornar: o processo sai sozinho
+        wanted.clear()
+        await asyncio.gather(*(stop_hosted(bot_id) for bot_id in list(applications)))
+        finished.set()
+
+    def handle_event(event):
+        kind = event.get('type')
+        bot_id = str(event.get('bot_id'))
+        if kind == 'payment':
+            application = applications.get(bot_id)
+            if application:
+                application.bot_data['payment_event'].set()
+        elif kind == 'update':
+            application = applications.get(bot_id)
+            if application:
+                enqueue_update(application, event['update'])
+            elif bot_id in pending_updates:
+                pending_updates[bot_id].append(event['update'])
+        elif kind == 'start':
+            loop.create_task(start_hosted(event['token'], bot_id))
+        elif kind == 'stop':
+            loop.create_task(stop_hosted(bot_id))
+        elif kind == 'shutdown':
+            loop.create_task(shutdown())
+
+    async def heartbeat():
+        # O atraso do sleep mede o quanto o loop está travado (lag)
+        while True:
+            started = loop.time()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            lag = loop.time() - started - HEARTBEAT_INTERVAL
+            dead = [bot_id for bot_id, application in applications.items() if not bot_alive(application)]
+            report('heartbeat', None, lag=round(lag, 3), bots=len(applications), dead=dead)
+
+    if events is not None:
+        threading.Thread(target=listen_host_events, args=(events, loop, handle_event), daemon=True).start()
+    if status is not None:
+        report('heartbeat', None, lag=0.0, bots=0)
+        # Guarda a referência para a tarefa não ser coletada
+        heartbeat_task = asyncio.create_task(heartbeat())
+
+    await asyncio.gather(*(start_hosted(token, bot_id) for token, bot_id in bots))
+
+    # Os bots rodam nas tarefas do loop; a limpeza de inativos fica no supervisor
+    await finished.wait()
+    print(f"Worker PID {os.getpid()} encerrado")
 
 def disable_get_updates(token):
     url = f"https://api.telegram.org/bot{token}/close"
@@ -648,9 +805,13 @@ def disable_get_updates(token):
     else:
         print(f"❌ Erro ao desativar getUpdates: {response.text}")
 
-def run_bot_sync(token, bot_id):
+def run_host_sync(bots, events=None, status=None, startup_rate=STARTUP_RATE):
+    """Executa vários bots sincronamente dentro do novo processo."""
+    asyncio.run(host_main(bots, events, status, startup_rate))
+
+def run_bot_sync(token, bot_id, events=None):
     """Executa o bot sincronamente dentro do novo processo."""
-    asyncio.run(main_start(token, bot_id))
+    run_host_sync([(token, bot_id)], events)
 
 #def run_bot_sync(token,bot_id):
 #    loop = asyncio.new_event_loop()
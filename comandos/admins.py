@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 
@@ -21,7 +21,7 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = False
     
-    admin_list = manager.get_bot_admin(context.bot_data['id'])
+    admin_list = await amanager.get_bot_admin(context.bot_data['id'])
     if len(admin_list) > 0:
         keyboard = [
             [InlineKeyboardButton("➕ ADICIONAR", callback_data="adicionar"), InlineKeyboardButton("➖ REMOVER", callback_data="remover")],
@@ -49,7 +49,7 @@ async def admin_escolha(update: Update, context: CallbackContext):
         await query.message.edit_text("🛡️ Envie o id do admin que deseja adicionar\:\n> Adicione pessoas de confiança apenas, não nos responsabilizamos por problemas com admins", reply_markup=reply_markup, parse_mode='MarkdownV2')
         return ADMIN_RECEBER
     elif query.data == 'remover':
-        admins = manager.get_bot_admin(context.bot_data['id'])
+        admins = await amanager.get_bot_admin(context.bot_data['id'])
         keyboard = []
         
         for i in admins:
@@ -69,7 +69,7 @@ async def recebe_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ADMIN_RECEBER
     
     id_recebido = update.message.text.strip()
-    admin_list = manager.get_bot_admin(context.bot_data['id'])
+    admin_list = await amanager.get_bot_admin(context.bot_data['id'])
     
     if id_recebido in admin_list:
         await update.message.reply_text(text=f"⛔ Esse usuario ja possui privilegios admin")
@@ -106,11 +106,11 @@ async def admin_remover(update: Update, context: CallbackContext):
     if query.data == 'cancelar':
         await cancel(update, context)
         return ConversationHandler.END
-    admin_list = manager.get_bot_admin(context.bot_data['id'])
+    admin_list = await amanager.get_bot_admin(context.bot_data['id'])
 
     if query.data in admin_list:
         admin_list.remove(query.data)
-        manager.update_bot_admin(context.bot_data['id'], admin_list)
+        await amanager.update_bot_admin(context.bot_data['id'], admin_list)
         await query.message.edit_text("✅ Admin removido com sucesso")
     else:
         await query.message.edit_text("⛔ Admin não encontrado")
@@ -126,9 +126,9 @@ async def admin_confirmar(update: Update, context: CallbackContext):
         return ConversationHandler.END
 
     elif query.data == 'confirmar':
-        admin_list = manager.get_bot_admin(context.bot_data['id'])
+        admin_list = await amanager.get_bot_admin(context.bot_data['id'])
         admin_list.append(context.user_data['admin_payload'])
-        manager.update_bot_admin(context.bot_data['id'], admin_list)
+        await amanager.update_bot_admin(context.bot_data['id'], admin_list)
         await query.message.edit_text("✅ Admin adicionado com sucesso")
         
         context.user_data['conv_state'] = False
@@ -137,14 +137,15 @@ async def admin_confirmar(update: Update, context: CallbackContext):
 
 
 
-conv_handler_admin = ConversationHandler(
-    entry_points=[CommandHandler("admin", admin)],
-    states={
-        ADMIN_ESCOLHA: [CallbackQueryHandler(admin_escolha)],
-        ADMIN_REMOVER: [CallbackQueryHandler(admin_remover)],
-        ADMIN_RECEBER: [MessageHandler(~filters.COMMAND, recebe_admin), CallbackQueryHandler(cancel)],
-        ADMIN_CONFIRMAR: [CallbackQueryHandler(admin_confirmar)]
+def build_conv_handler_admin():
+    return ConversationHandler(
+        entry_points=[CommandHandler("admin", admin)],
+        states={
+            ADMIN_ESCOLHA: [CallbackQueryHandler(admin_escolha)],
+            ADMIN_REMOVER: [CallbackQueryHandler(admin_remover)],
+            ADMIN_RECEBER: [MessageHandler(~filters.COMMAND, recebe_admin), CallbackQueryHandler(cancel)],
+            ADMIN_CONFIRMAR: [CallbackQueryHandler(admin_confirmar)]
 
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-    )
\ No newline at end of file
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+        )
\ No newline at end of file
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests, asyncio
 from datetime import datetime
 
@@ -24,7 +24,7 @@ async def disparo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await is_admin(context, update.message.from_user.id):
         return ConversationHandler.END
     
-    context.user_data['inicio_context'] = manager.get_bot_config(context.bot_data['id'])
+    context.user_data['inicio_context'] = await amanager.get_bot_config(context.bot_data['id'])
     context.user_data['conv_state'] = "disparo"
 
     # NOVO KEYBOARD COM PROGRAMADO
@@ -51,7 +51,7 @@ async def disparo_escolha(update: Update, context: CallbackContext):
         return ConversationHandler.END
     elif query.data == 'programado':
         # Verifica quantos disparos programados já existem
-        broadcasts = manager.get_bot_scheduled_broadcasts(context.bot_data['id'])
+        broadcasts = await amanager.get_bot_scheduled_broadcasts(context.bot_data['id'])
         
         # CORREÇÃO: Sempre mostra as opções, mesmo com 3 disparos
         keyboard = []
@@ -90,7 +90,7 @@ async def disparo_escolha(update: Update, context: CallbackContext):
         return DISPARO_LINK
     elif query.data == 'plano':
         context.user_data['disparo_payload']['tipo'] = 'plano'
-        planos = manager.get_bot_plans(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
         keyboard_plans = []
         for plan_index in range(len(planos)):
             keyboard_plans.append([InlineKeyboardButton(f'{planos[plan_index]['name']} - R$ {planos[plan_index]['value']}', callback_data=f"planod_{plan_index}")])
@@ -108,7 +108,7 @@ async def disparo_plano(update: Update, context: CallbackContext):
     plano_index = query.data.split('_')[-1]
     try:
         plano_index = int(plano_index)
-        planos = manager.get_bot_plans(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
         plano = planos[plano_index]
         plano['recovery'] = False
         context.user_data['disparo_payload']['plano'] = plano
@@ -275,7 +275,7 @@ async def disparo_confirma(update: Update, context: CallbackContext):
         await cancel(update, context)
         return ConversationHandler.END
     elif query.data == 'confirmar':
-        users = manager.get_bot_users(context.bot_data['id'])
+        users = await amanager.get_bot_users(context.bot_data['id'])
         total_users = len(users)
         
         # Mensagem inicial
@@ -304,10 +304,15 @@ async def disparo_confirma(update: Update, context: CallbackContext):
         update_interval = 5  # Atualiza a cada 5 segundos
         
         # Loop principal de envio
+        # Disparo de plano: o pagamento só é criado quando o usuário clica na oferta
+        campaign_id = None
+        if context.user_data['disparo_payload']['tipo'] == 'plano':
+            campaign_id = await amanager.create_campaign(context.bot_data['id'], [context.user_data['disparo_payload']['plano']])
+        
         for i, user_id in enumerate(users):
             try:
                 # Envia mensagem
-                sucesso = await send_disparo(context, user_id, context.user_data['disparo_payload'])
+                sucesso = await send_disparo(context, user_id, context.user_data['disparo_payload'], campaign_id)
                 
                 if sucesso:
                     enviados += 1
@@ -337,7 +342,7 @@ async def disparo_confirma(update: Update, context: CallbackContext):
                 await asyncio.sleep(e.retry_after)
                 # Tenta novamente
                 try:
-                    sucesso = await send_disparo(context, user_id, context.user_data['disparo_payload'])
+                    sucesso = await send_disparo(context, user_id, context.user_data['disparo_payload'], campaign_id)
                     if sucesso:
                         enviados += 1
                     else:
@@ -432,7 +437,7 @@ async def disparo_programado_escolha(update: Update, context: CallbackContext):
         return DISPARO_MENSAGEM
     
     elif query.data == 'prog_remover':
-        broadcasts = manager.get_bot_scheduled_broadcasts(context.bot_data['id'])
+        broadcasts = await amanager.get_bot_scheduled_broadcasts(context.bot_data['id'])
         keyboard = []
         
         for broadcast in broadcasts:
@@ -461,11 +466,11 @@ async def disparo_programado_remover(update: Update, context: CallbackContext):
         return ConversationHandler.END
     
     broadcast_id = int(query.data.split('_')[1])
-    manager.remove_scheduled_broadcast(context.bot_data['id'], broadcast_id)
+    await amanager.remove_scheduled_broadcast(context.bot_data['id'], broadcast_id)
     
     # Reinicia as tasks do bot
     import modules.scheduled_broadcast as scheduled_broadcast
-    scheduled_broadcast.start_scheduled_broadcasts_for_bot(context, context.bot_data['id'])
+    await scheduled_broadcast.start_scheduled_broadcasts_for_bot(context, context.bot_data['id'])
     
     await query.message.edit_text("✅ Disparo programado removido com sucesso!")
     context.user_data['conv_state'] = False
@@ -544,12 +549,12 @@ async def disparo_programado_confirma(update: Update, context: CallbackContext):
         broadcast_data = context.user_data['disparo_programado']
         
         # Adiciona o disparo programado
-        success = manager.add_scheduled_broadcast(context.bot_data['id'], broadcast_data)
+        success = await amanager.add_scheduled_broadcast(context.bot_data['id'], broadcast_data)
         
         if success:
             # Reinicia as tasks do bot para incluir o novo disparo
             import modules.scheduled_broadcast as scheduled_broadcast
-            scheduled_broadcast.start_scheduled_broadcasts_for_bot(context, context.bot_data['id'])
+            await scheduled_broadcast.start_scheduled_broadcasts_for_bot(context, context.bot_data['id'])
             
             await query.message.edit_text(
                 f"✅ Disparo programado criado com sucesso!\n\n"
@@ -562,21 +567,22 @@ async def disparo_programado_confirma(update: Update, context: CallbackContext):
         return ConversationHandler.END
 
 # ConversationHandler permanece igual
-conv_handler_disparo = ConversationHandler(
-    entry_points=[CommandHandler("disparo", disparo)],
-    states={
-        DISPARO_TIPO: [CallbackQueryHandler(disparo_escolha)],
-        DISPARO_PLANO: [CallbackQueryHandler(disparo_plano)],
-        DISPARO_VALOR_CONFIRMA: [CallbackQueryHandler(disparo_valor_confirma)],
-        DISPARO_VALOR: [MessageHandler(~filters.COMMAND, disparo_valor), CallbackQueryHandler(cancel)],
-        DISPARO_MENSAGEM: [MessageHandler(~filters.COMMAND, disparo_mensagem), CallbackQueryHandler(cancel)],
-        DISPARO_LINK: [MessageHandler(~filters.COMMAND, disparo_link), CallbackQueryHandler(cancel)],
-        DISPARO_CONFIRMA: [CallbackQueryHandler(disparo_confirma)],
-        DISPARO_PROGRAMADO_ESCOLHA: [CallbackQueryHandler(disparo_programado_escolha)],
-        DISPARO_PROGRAMADO_DESCONTO: [MessageHandler(~filters.COMMAND, disparo_programado_desconto), CallbackQueryHandler(cancel)],
-        DISPARO_PROGRAMADO_HORARIO: [MessageHandler(~filters.COMMAND, disparo_programado_horario), CallbackQueryHandler(cancel)],
-        DISPARO_PROGRAMADO_CONFIRMA: [CallbackQueryHandler(disparo_programado_confirma)],
-        DISPARO_PROGRAMADO_REMOVER: [CallbackQueryHandler(disparo_programado_remover)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
\ No newline at end of file
+def build_conv_handler_disparo():
+    return ConversationHandler(
+        entry_points=[CommandHandler("disparo", disparo)],
+        states={
+            DISPARO_TIPO: [CallbackQueryHandler(disparo_escolha)],
+            DISPARO_PLANO: [CallbackQueryHandler(disparo_plano)],
+            DISPARO_VALOR_CONFIRMA: [CallbackQueryHandler(disparo_valor_confirma)],
+            DISPARO_VALOR: [MessageHandler(~filters.COMMAND, disparo_valor), CallbackQueryHandler(cancel)],
+            DISPARO_MENSAGEM: [MessageHandler(~filters.COMMAND, disparo_mensagem), CallbackQueryHandler(cancel)],
+            DISPARO_LINK: [MessageHandler(~filters.COMMAND, disparo_link), CallbackQueryHandler(cancel)],
+            DISPARO_CONFIRMA: [CallbackQueryHandler(disparo_confirma)],
+            DISPARO_PROGRAMADO_ESCOLHA: [CallbackQueryHandler(disparo_programado_escolha)],
+            DISPARO_PROGRAMADO_DESCONTO: [MessageHandler(~filters.COMMAND, disparo_programado_desconto), CallbackQueryHandler(cancel)],
+            DISPARO_PROGRAMADO_HORARIO: [MessageHandler(~filters.COMMAND, disparo_programado_horario), CallbackQueryHandler(cancel)],
+            DISPARO_PROGRAMADO_CONFIRMA: [CallbackQueryHandler(disparo_programado_confirma)],
+            DISPARO_PROGRAMADO_REMOVER: [CallbackQueryHandler(disparo_programado_remover)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -24,7 +24,7 @@ async def downsell(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['conv_state'] = "downsell"
     
     # Verifica se existe upsell configurado
-    upsell_config = manager.get_bot_upsell(context.bot_data['id'])
+    upsell_config = await amanager.get_bot_upsell(context.bot_data['id'])
     if not upsell_config or not upsell_config.get('group_id'):
         await update.message.reply_text(
             "⛔ Configure o upsell primeiro!\n"
@@ -64,7 +64,7 @@ async def downsell_escolha(update: Update, context: CallbackContext):
         return DOWNSELL_RECEBER
     
     elif query.data == 'remover':
-        manager.update_bot_downsell(context.bot_data['id'], {})
+        await amanager.update_bot_downsell(context.bot_data['id'], {})
         await query.message.edit_text("✅ Downsell removido com sucesso!")
         context.user_data['conv_state'] = False
         return ConversationHandler.END
@@ -101,7 +101,7 @@ async def downsell_receber_mensagem(update: Update, context: ContextTypes.DEFAUL
         context.user_data['downsell_context']['text'] = save['text']
         
         # Pega o valor do upsell para referência
-        upsell_config = manager.get_bot_upsell(context.bot_data['id'])
+        upsell_config = await amanager.get_bot_upsell(context.bot_data['id'])
         upsell_value = upsell_config.get('value', 0)
         
         await update.message.reply_text(
@@ -129,7 +129,7 @@ async def downsell_valor(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return DOWNSELL_VALOR
         
         # Verifica se é menor que o upsell
-        upsell_config = manager.get_bot_upsell(context.bot_data['id'])
+        upsell_config = await amanager.get_bot_upsell(context.bot_data['id'])
         upsell_value = upsell_config.get('value', 0)
         
         if valor >= upsell_value:
@@ -145,7 +145,7 @@ async def downsell_valor(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Salva o downsell
         downsell_data = context.user_data['downsell_context']
-        manager.update_bot_downsell(context.bot_data['id'], downsell_data)
+        await amanager.update_bot_downsell(context.bot_data['id'], downsell_data)
         
         desconto = int(((upsell_value - valor) / upsell_value) * 100)
         
@@ -164,12 +164,13 @@ async def downsell_valor(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ Envie um valor numérico válido:", reply_markup=cancel_markup)
         return DOWNSELL_VALOR
 
-conv_handler_downsell = ConversationHandler(
-    entry_points=[CommandHandler("downsell", downsell)],
-    states={
-        DOWNSELL_ESCOLHA: [CallbackQueryHandler(downsell_escolha)],
-        DOWNSELL_RECEBER: [MessageHandler(~filters.COMMAND, downsell_receber_mensagem), CallbackQueryHandler(cancel)],
-        DOWNSELL_VALOR: [MessageHandler(~filters.COMMAND, downsell_valor), CallbackQueryHandler(cancel)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
\ No newline at end of file
+def build_conv_handler_downsell():
+    return ConversationHandler(
+        entry_points=[CommandHandler("downsell", downsell)],
+        states={
+            DOWNSELL_ESCOLHA: [CallbackQueryHandler(downsell_escolha)],
+            DOWNSELL_RECEBER: [MessageHandler(~filters.COMMAND, downsell_receber_mensagem), CallbackQueryHandler(cancel)],
+            DOWNSELL_VALOR: [MessageHandler(~filters.COMMAND, downsell_valor), CallbackQueryHandler(cancel)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
@@ -12,7 +12,7 @@ EXPIRACAO_RECEBER, EXPIRACAO_ESCOLHA, EXPIRACAO_CONFIRMAR = range(3)
 #comando adeus
 async def adeus(update: Update, context: ContextTypes.DEFAULT_TYPE):
     command_check = await process_command(update, context)
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = await amanager.get_bot_plans(context.bot_data['id'])
     if not command_check:
         return ConversationHandler.END
     if not await is_admin(context, update.message.from_user.id):
@@ -40,7 +40,7 @@ async def adeus_escolha(update: Update, context: CallbackContext):
         await query.message.edit_text("⏳ Envie como deseja a mensagem de expiração\:\n> Pode conter midia", reply_markup=reply_markup, parse_mode='MarkdownV2')
         return EXPIRACAO_RECEBER
     elif query.data == 'remover':
-        manager.update_bot_expiration(context.bot_data['id'], {}) 
+        await amanager.update_bot_expiration(context.bot_data['id'], {}) 
         await query.message.edit_text("✅ Expiração deletada com sucesso")
         context.user_data['conv_state'] = False
         return ConversationHandler.END
@@ -123,7 +123,7 @@ async def adeus_confirmar(update: Update, context: CallbackContext):
             save = context.user_data.get('expiracao_temp', {})
             
             # Salva no banco de dados
-            manager.update_bot_expiration(context.bot_data['id'], save)
+            await amanager.update_bot_expiration(context.bot_data['id'], save)
             
             await query.message.edit_text("✅ Expiração salva com sucesso!")
             
@@ -138,12 +138,13 @@ async def adeus_confirmar(update: Update, context: CallbackContext):
             context.user_data['conv_state'] = False
             return ConversationHandler.END
 
-conv_handler_adeus = ConversationHandler(
-    entry_points=[CommandHandler("adeus", adeus)],
-    states={
-        EXPIRACAO_ESCOLHA: [CallbackQueryHandler(adeus_escolha)],
-        EXPIRACAO_RECEBER: [MessageHandler(~filters.COMMAND, adeus_receber_mensagem), CallbackQueryHandler(cancel)],
-        EXPIRACAO_CONFIRMAR: [CallbackQueryHandler(adeus_confirmar)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
+def build_conv_handler_adeus():
+    return ConversationHandler(
+        entry_points=[CommandHandler("adeus", adeus)],
+        states={
+            EXPIRACAO_ESCOLHA: [CallbackQueryHandler(adeus_escolha)],
+            EXPIRACAO_RECEBER: [MessageHandler(~filters.COMMAND, adeus_receber_mensagem), CallbackQueryHandler(cancel)],
+            EXPIRACAO_CONFIRMAR: [CallbackQueryHandler(adeus_confirmar)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
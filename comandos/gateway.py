@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import modules.payment as payment
 import json, re, requests
 
@@ -15,7 +15,7 @@ GATEWAY_RECEBER, GATEWAY_ESCOLHA = range(2)
 #comando adeus
 async def gateway(update: Update, context: ContextTypes.DEFAULT_TYPE):
     command_check = await process_command(update, context)
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = await amanager.get_bot_plans(context.bot_data['id'])
     if not command_check:
         return ConversationHandler.END
     if not await is_admin(context, update.message.from_user.id):
@@ -60,17 +60,18 @@ async def recebe_gateway(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Insira um token valido:", reply_markup=reply_markup)
         return GATEWAY_RECEBER
     
-    manager.update_bot_gateway(context.bot_data['id'], {'type':'pp', 'token':token_recebido})
+    await amanager.update_bot_gateway(context.bot_data['id'], {'type':'pp', 'token':token_recebido})
     await update.message.reply_text(text=f"✅ Gateway modificado com sucesso")
     context.user_data['conv_state'] = False
     return ConversationHandler.END
 
 
-conv_handler_gateway = ConversationHandler(
-    entry_points=[CommandHandler("gateway", gateway)],
-    states={
-        GATEWAY_ESCOLHA: [CallbackQueryHandler(gateway_escolha)],
-        GATEWAY_RECEBER: [MessageHandler(~filters.COMMAND, recebe_gateway), CallbackQueryHandler(cancel)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-    )
+def build_conv_handler_gateway():
+    return ConversationHandler(
+        entry_points=[CommandHandler("gateway", gateway)],
+        states={
+            GATEWAY_ESCOLHA: [CallbackQueryHandler(gateway_escolha)],
+            GATEWAY_RECEBER: [MessageHandler(~filters.COMMAND, recebe_gateway), CallbackQueryHandler(cancel)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+        )
@@ -1,5 +1,5 @@
 
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 
@@ -51,7 +51,7 @@ async def recebe_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except:
             await update.message.reply_text("❌ Insira um ID valido\:\n>Lembre\-se o bot tem que ter permissão de admin no grupo", reply_markup=reply_markup, parse_mode='MarkdownV2')
             return GRUPO_RECEBER
-    manager.update_bot_group(context.bot_data['id'], id_grupo)
+    await amanager.update_bot_group(context.bot_data['id'], id_grupo)
     await update.message.reply_text(text=f"✅ ID do grupo modificado com sucesso\n\nNovo grupo\:\n> {escape_markdown_v2(invite_link.invite_link)}", parse_mode='MarkdownV2')
     context.user_data['conv_state'] = False
     return ConversationHandler.END
@@ -60,10 +60,11 @@ async def recebe_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-conv_handler_grupo = ConversationHandler(
-    entry_points=[CommandHandler("vip", grupo)],
-    states={
-        GRUPO_RECEBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, recebe_grupo), CallbackQueryHandler(cancel)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-    )
\ No newline at end of file
+def build_conv_handler_grupo():
+    return ConversationHandler(
+        entry_points=[CommandHandler("vip", grupo)],
+        states={
+            GRUPO_RECEBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, recebe_grupo), CallbackQueryHandler(cancel)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+        )
\ No newline at end of file
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 
@@ -27,7 +27,7 @@ async def inicio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await is_admin(context, update.message.from_user.id):
         
         return ConversationHandler.END
-    context.user_data['inicio_context'] = manager.get_bot_config(context.bot_data['id'])
+    context.user_data['inicio_context'] = await amanager.get_bot_config(context.bot_data['id'])
     context.user_data['conv_state'] = "inicio"
 
     keyboard = [
@@ -86,7 +86,7 @@ async def inicio_adicionar_ou_deletar(update: Update, context: CallbackContext):
 
         context.user_data['inicio_context'][acao] = False
         await query.message.edit_text(f"✅ {acao.capitalize()} foi deletado com sucesso.")
-        manager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
+        await amanager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
         
         context.user_data['conv_state'] = False
         return ConversationHandler.END
@@ -117,7 +117,7 @@ async def inicio_receber(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     'type': 'photo' if update.message.photo else 'video'
                 }
                 await update.message.reply_text("✅ Mídia inicial atualizada com sucesso.")
-                manager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
+                await amanager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
             else:
                 for i in range(10):
                     print('erro')
@@ -130,14 +130,14 @@ async def inicio_receber(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return INICIO_RECEBER
             context.user_data['inicio_context'][acao] = mensagem
             await update.message.reply_text(f"✅ {acao.capitalize()} atualizado com sucesso.")
-            manager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
+            await amanager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
         elif acao == "botao":
             if update.message.photo or update.message.video:
                 await update.message.reply_text(f"⛔ Envie apenas texto, midia não suportada", reply_markup=cancel_markup)
                 return INICIO_RECEBER
             context.user_data['inicio_context']['button'] = mensagem
             await update.message.reply_text("✅ Botão atualizado com sucesso.")
-            manager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
+            await amanager.update_bot_config(context.bot_data['id'], context.user_data['inicio_context'])
 
     except Exception as e:
         print('erro')
@@ -149,12 +149,13 @@ async def inicio_receber(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-conv_handler_inicio = ConversationHandler(
-    entry_points=[CommandHandler("inicio", inicio)],
-    states={
-        INICIO_ESCOLHA: [CallbackQueryHandler(inicio_escolha)],
-        INICIO_ADICIONAR_OU_DELETAR: [CallbackQueryHandler(inicio_adicionar_ou_deletar)],
-        INICIO_RECEBER: [MessageHandler(filters.ALL, inicio_receber)]
-    },
-    fallbacks=[CallbackQueryHandler(cancel)],
-)
\ No newline at end of file
+def build_conv_handler_inicio():
+    return ConversationHandler(
+        entry_points=[CommandHandler("inicio", inicio)],
+        states={
+            INICIO_ESCOLHA: [CallbackQueryHandler(inicio_escolha)],
+            INICIO_ADICIONAR_OU_DELETAR: [CallbackQueryHandler(inicio_adicionar_ou_deletar)],
+            INICIO_RECEBER: [MessageHandler(filters.ALL, inicio_receber)]
+        },
+        fallbacks=[CallbackQueryHandler(cancel)],
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -25,14 +25,14 @@ async def orderbump(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['conv_state'] = "orderbump"
     
     # Verifica se existem planos
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = await amanager.get_bot_plans(context.bot_data['id'])
     if len(planos) == 0:
         await update.message.reply_text("⛔ Nenhum plano cadastrado. Crie planos primeiro usando /planos")
         context.user_data['conv_state'] = False
         return ConversationHandler.END
     
     # Verifica quais planos já tem order bump
-    orderbumps = manager.get_bot_orderbump(context.bot_data['id'])
+    orderbumps = await amanager.get_bot_orderbump(context.bot_data['id'])
     planos_com_ob = [ob.get('plano_id') for ob in orderbumps]
     
     keyboard = []
@@ -56,8 +56,8 @@ async def orderbump_escolha(update: Update, context: CallbackContext):
     
     elif query.data == 'adicionar':
         context.user_data['orderbump_action'] = 'adicionar'
-        planos = manager.get_bot_plans(context.bot_data['id'])
-        orderbumps = manager.get_bot_orderbump(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
+        orderbumps = await amanager.get_bot_orderbump(context.bot_data['id'])
         planos_com_ob = [ob.get('plano_id') for ob in orderbumps]
         
         keyboard_plans = []
@@ -81,8 +81,8 @@ async def orderbump_escolha(update: Update, context: CallbackContext):
     
     elif query.data == 'remover':
         context.user_data['orderbump_action'] = 'remover'
-        planos = manager.get_bot_plans(context.bot_data['id'])
-        orderbumps = manager.get_bot_orderbump(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
+        orderbumps = await amanager.get_bot_orderbump(context.bot_data['id'])
         
         keyboard_plans = []
         for ob in orderbumps:
@@ -195,7 +195,7 @@ async def orderbump_valor(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['orderbump_context']['value'] = valor
         
         # Pega informações do plano
-        planos = manager.get_bot_plans(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
         plano_index = context.user_data['orderbump_plano_index']
         plano = planos[plano_index]
         
@@ -239,7 +239,7 @@ async def orderbump_confirmar(update: Update, context: CallbackContext):
             bot_id = context.bot_data['id']
             plan_index = context.user_data['orderbump_plano_index']
             
-            manager.add_orderbump_to_plan(bot_id, plan_index, orderbump_data)
+            await amanager.add_orderbump_to_plan(bot_id, plan_index, orderbump_data)
             
             await query.message.edit_text("✅ Order Bump criado com sucesso!")
             
@@ -259,7 +259,7 @@ async def orderbump_deletar(update: Update, context: CallbackContext):
     
     try:
         plano_index = int(query.data.split('_')[-1])
-        manager.remove_orderbump_from_plan(context.bot_data['id'], plano_index)
+        await amanager.remove_orderbump_from_plan(context.bot_data['id'], plano_index)
         
         await query.message.edit_text("✅ Order Bump removido com sucesso!")
         
@@ -270,15 +270,16 @@ async def orderbump_deletar(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 # ConversationHandler
-conv_handler_orderbump = ConversationHandler(
-    entry_points=[CommandHandler("orderbump", orderbump)],
-    states={
-        ORDERBUMP_ESCOLHA: [CallbackQueryHandler(orderbump_escolha)],
-        ORDERBUMP_PLANO: [CallbackQueryHandler(orderbump_plano)],
-        ORDERBUMP_MENSAGEM: [MessageHandler(~filters.COMMAND, orderbump_mensagem), CallbackQueryHandler(cancel)],
-        ORDERBUMP_VALOR: [MessageHandler(~filters.COMMAND, orderbump_valor), CallbackQueryHandler(cancel)],
-        ORDERBUMP_CONFIRMAR: [CallbackQueryHandler(orderbump_confirmar)],
-        ORDERBUMP_DELETAR: [CallbackQueryHandler(orderbump_deletar)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
\ No newline at end of file
+def build_conv_handler_orderbump():
+    return ConversationHandler(
+        entry_points=[CommandHandler("orderbump", orderbump)],
+        states={
+            ORDERBUMP_ESCOLHA: [CallbackQueryHandler(orderbump_escolha)],
+            ORDERBUMP_PLANO: [CallbackQueryHandler(orderbump_plano)],
+            ORDERBUMP_MENSAGEM: [MessageHandler(~filters.COMMAND, orderbump_mensagem), CallbackQueryHandler(cancel)],
+            ORDERBUMP_VALOR: [MessageHandler(~filters.COMMAND, orderbump_valor), CallbackQueryHandler(cancel)],
+            ORDERBUMP_CONFIRMAR: [CallbackQueryHandler(orderbump_confirmar)],
+            ORDERBUMP_DELETAR: [CallbackQueryHandler(orderbump_deletar)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
\ No newline at end of file
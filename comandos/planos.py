@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 
@@ -23,7 +23,7 @@ async def planos(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = False
 
-    plan_list = manager.get_bot_plans(context.bot_data['id'])
+    plan_list = await amanager.get_bot_plans(context.bot_data['id'])
     if len(plan_list) > 0:
         keyboard = [
             [InlineKeyboardButton("➕ ADICIONAR", callback_data="adicionar"), InlineKeyboardButton("➖ REMOVER", callback_data="remover")],
@@ -56,7 +56,7 @@ async def planos_escolha(update: Update, context: CallbackContext):
         await query.message.edit_text("💎 Envie o nome do plano:", reply_markup=reply_markup)
         return PLANOS_NOME
     elif query.data == 'remover':
-        planos = manager.get_bot_plans(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
         keyboard_plans = []
         for plan_index in range(len(planos)):
             keyboard_plans.append([InlineKeyboardButton(planos[plan_index]['name'], callback_data=f"planor_{plan_index}")])
@@ -74,9 +74,9 @@ async def planos_deletar(update: Update, context: CallbackContext):
     plano_index = query.data.split('_')[-1]
     try:
         plano_index = int(plano_index)
-        planos = manager.get_bot_plans(context.bot_data['id'])
+        planos = await amanager.get_bot_plans(context.bot_data['id'])
         planos.pop(plano_index)
-        manager.update_bot_plans(context.bot_data['id'] ,planos)
+        await amanager.update_bot_plans(context.bot_data['id'] ,planos)
         await query.message.edit_text("✅ Plano deletado com sucesso")
     except:
         await query.message.edit_text("⛔ Erro ao identificar ação, Todos os comandos cancelados")
@@ -200,10 +200,10 @@ async def plano_confirmar(update: Update, context: CallbackContext):
         return ConversationHandler.END
 
     plano = context.user_data['plan_context']
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = await amanager.get_bot_plans(context.bot_data['id'])
     planos.append(plano)
     print(planos)
-    manager.update_bot_plans(context.bot_data['id'] , planos)
+    await amanager.update_bot_plans(context.bot_data['id'] , planos)
     await query.message.edit_text("✅ Plano criado com sucesso")
     context.user_data['plan_context'] = False
     context.user_data['conv_state'] = False
@@ -211,19 +211,20 @@ async def plano_confirmar(update: Update, context: CallbackContext):
 
 
 
-conv_handler_planos = ConversationHandler(
-    entry_points=[CommandHandler("planos", planos)],
-    states={
-        PLANOS_ESCOLHA: [CallbackQueryHandler(planos_escolha)],
-        PLANOS_DELETAR: [CallbackQueryHandler(planos_deletar)],
-        PLANOS_NOME: [MessageHandler(~filters.COMMAND, plano_nome), CallbackQueryHandler(cancel)],
-        PLANOS_TEMPO_TIPO:[CallbackQueryHandler(plano_tempo_tipo)],
-        PLANOS_TEMPO:[MessageHandler(~filters.COMMAND, plano_tempo), CallbackQueryHandler(cancel)],
-        PLANOS_VALOR:[MessageHandler(~filters.COMMAND, plano_valor), CallbackQueryHandler(cancel)],
-        PLANOS_CONFIRMAR:[CallbackQueryHandler(plano_confirmar)],
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-    )
+def build_conv_handler_planos():
+    return ConversationHandler(
+        entry_points=[CommandHandler("planos", planos)],
+        states={
+            PLANOS_ESCOLHA: [CallbackQueryHandler(planos_escolha)],
+            PLANOS_DELETAR: [CallbackQueryHandler(planos_deletar)],
+            PLANOS_NOME: [MessageHandler(~filters.COMMAND, plano_nome), CallbackQueryHandler(cancel)],
+            PLANOS_TEMPO_TIPO:[CallbackQueryHandler(plano_tempo_tipo)],
+            PLANOS_TEMPO:[MessageHandler(~filters.COMMAND, plano_tempo), CallbackQueryHandler(cancel)],
+            PLANOS_VALOR:[MessageHandler(~filters.COMMAND, plano_valor), CallbackQueryHandler(cancel)],
+            PLANOS_CONFIRMAR:[CallbackQueryHandler(plano_confirmar)],
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+        )
 
 
 #PLANO
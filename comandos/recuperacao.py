@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -25,7 +25,7 @@ async def recuperacao(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['conv_state'] = "recuperacao"
     
     # Conta quantas recuperações existem
-    count = manager.count_recovery_messages(context.bot_data['id'])
+    count = await amanager.count_recovery_messages(context.bot_data['id'])
     
     keyboard = []
     
@@ -76,7 +76,7 @@ async def recuperacao_menu(update: Update, context: CallbackContext):
     
     elif query.data == 'ver_recuperacoes':
         # Mostra todas as recuperações
-        recoveries = manager.get_all_recovery_messages(context.bot_data['id'])
+        recoveries = await amanager.get_all_recovery_messages(context.bot_data['id'])
         
         if not recoveries:
             texto = "❌ Nenhuma recuperação encontrada."
@@ -100,7 +100,7 @@ async def recuperacao_menu(update: Update, context: CallbackContext):
     
     elif query.data == 'remover_recuperacao':
         # Lista recuperações para remover
-        recoveries = manager.get_all_recovery_messages(context.bot_data['id'])
+        recoveries = await amanager.get_all_recovery_messages(context.bot_data['id'])
         
         if not recoveries:
             await query.message.edit_text("❌ Nenhuma recuperação para remover.")
@@ -308,7 +308,7 @@ async def recuperacao_confirmar(update: Update, context: CallbackContext):
             rec = context.user_data['recovery_context']
             bot_id = context.bot_data['id']
             
-            recovery_id = manager.create_recovery_message(
+            recovery_id = await amanager.create_recovery_message(
                 bot_id=bot_id,
                 name=rec['name'],
                 media=rec['media'],
@@ -331,7 +331,7 @@ async def recuperacao_ver(update: Update, context: CallbackContext):
     
     if query.data == 'voltar_menu':
         # Volta para o menu principal
-        count = manager.count_recovery_messages(context.bot_data['id'])
+        count = await amanager.count_recovery_messages(context.bot_data['id'])
         
         keyboard = []
         if count > 0:
@@ -363,7 +363,7 @@ async def recuperacao_deletar(update: Update, context: CallbackContext):
     
     try:
         recovery_id = int(query.data.split('_')[1])
-        manager.delete_recovery_message(recovery_id)
+        await amanager.delete_recovery_message(recovery_id)
         
         await query.message.edit_text("✅ Recuperação removida com sucesso!")
         
@@ -374,18 +374,19 @@ async def recuperacao_deletar(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 # ConversationHandler
-conv_handler_recuperacao = ConversationHandler(
-    entry_points=[CommandHandler("recuperacao", recuperacao)],
-    states={
-        RECUPERACAO_MENU: [CallbackQueryHandler(recuperacao_menu)],
-        RECUPERACAO_NOME: [MessageHandler(~filters.COMMAND, recuperacao_nome), CallbackQueryHandler(cancel)],
-        RECUPERACAO_MENSAGEM: [MessageHandler(~filters.COMMAND, recuperacao_mensagem), CallbackQueryHandler(cancel)],
-        RECUPERACAO_PORCENTAGEM: [MessageHandler(~filters.COMMAND, recuperacao_porcentagem), CallbackQueryHandler(cancel)],
-        RECUPERACAO_TEMPO_TIPO: [CallbackQueryHandler(recuperacao_tempo_tipo)],
-        RECUPERACAO_TEMPO: [MessageHandler(~filters.COMMAND, recuperacao_tempo), CallbackQueryHandler(cancel)],
-        RECUPERACAO_CONFIRMAR: [CallbackQueryHandler(recuperacao_confirmar)],
-        RECUPERACAO_VER: [CallbackQueryHandler(recuperacao_ver)],
-        RECUPERACAO_DELETAR: [CallbackQueryHandler(recuperacao_deletar)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
\ No newline at end of file
+def build_conv_handler_recuperacao():
+    return ConversationHandler(
+        entry_points=[CommandHandler("recuperacao", recuperacao)],
+        states={
+            RECUPERACAO_MENU: [CallbackQueryHandler(recuperacao_menu)],
+            RECUPERACAO_NOME: [MessageHandler(~filters.COMMAND, recuperacao_nome), CallbackQueryHandler(cancel)],
+            RECUPERACAO_MENSAGEM: [MessageHandler(~filters.COMMAND, recuperacao_mensagem), CallbackQueryHandler(cancel)],
+            RECUPERACAO_PORCENTAGEM: [MessageHandler(~filters.COMMAND, recuperacao_porcentagem), CallbackQueryHandler(cancel)],
+            RECUPERACAO_TEMPO_TIPO: [CallbackQueryHandler(recuperacao_tempo_tipo)],
+            RECUPERACAO_TEMPO: [MessageHandler(~filters.COMMAND, recuperacao_tempo), CallbackQueryHandler(cancel)],
+            RECUPERACAO_CONFIRMAR: [CallbackQueryHandler(recuperacao_confirmar)],
+            RECUPERACAO_VER: [CallbackQueryHandler(recuperacao_ver)],
+            RECUPERACAO_DELETAR: [CallbackQueryHandler(recuperacao_deletar)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
\ No newline at end of file
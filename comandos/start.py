@@ -1,20 +1,14 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import modules.recovery_system as recovery_system
 import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from modules.utils import is_admin
+from modules.utils import is_admin, bot_snapshot
 
-def add_user_to_list(user, bot_id):
-   print(user)
-   print(bot_id)
-   users = manager.get_bot_users(bot_id)
-   print(users)
-   if not user in users:
-       users.append(user)
-       manager.update_bot_users(bot_id, users)
+async def add_user_to_list(user, bot_id):
+   await amanager.add_bot_user(bot_id, user)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
    # ADICIONAR FLAG PARA INDICAR QUE ESTÁ PROCESSANDO START
@@ -24,20 +18,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
    import time
    context.user_data['last_start_time'] = time.time()
    
-   config = manager.get_bot_config(context.bot_data['id'])
+   config = (await bot_snapshot(context)).config
    user_id = str(update.message.from_user.id)
    bot_id = context.bot_data['id']
    
    # ATUALIZA ÚLTIMA ATIVIDADE DO BOT
-   manager.update_bot_last_activity(bot_id)
+   await amanager.update_bot_last_activity(bot_id)
    
    # Adiciona usuário à lista
-   add_user_to_list(user_id, bot_id)
+   await add_user_to_list(user_id, bot_id)
    
    # Inicia o sistema de recuperação para este usuário (apenas se não for admin)
    # IMPORTANTE: passa False para não mostrar planos
    if not await is_admin(context, update.message.from_user.id, show_plans_if_not_admin=False):
-       recovery_system.start_recovery_for_user(context, user_id, bot_id)
+       await recovery_system.start_recovery_for_user(context, user_id, bot_id)
    
    print(config)
 
@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -55,7 +55,7 @@ async def upsell_escolha(update: Update, context: CallbackContext):
         return UPSELL_RECEBER
     
     elif query.data == 'remover':
-        manager.update_bot_upsell(context.bot_data['id'], {})
+        await amanager.update_bot_upsell(context.bot_data['id'], {})
         await query.message.edit_text("✅ Upsell removido com sucesso!")
         context.user_data['conv_state'] = False
         return ConversationHandler.END
@@ -155,7 +155,7 @@ async def upsell_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Salva o upsell
     upsell_data = context.user_data['upsell_context']
-    manager.update_bot_upsell(context.bot_data['id'], upsell_data)
+    await amanager.update_bot_upsell(context.bot_data['id'], upsell_data)
     
     await update.message.reply_text(
         f"✅ Upsell configurado com sucesso!\n\n"
@@ -166,13 +166,14 @@ async def upsell_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['conv_state'] = False
     return ConversationHandler.END
 
-conv_handler_upsell = ConversationHandler(
-    entry_points=[CommandHandler("upsell", upsell)],
-    states={
-        UPSELL_ESCOLHA: [CallbackQueryHandler(upsell_escolha)],
-        UPSELL_RECEBER: [MessageHandler(~filters.COMMAND, upsell_receber_mensagem), CallbackQueryHandler(cancel)],
-        UPSELL_VALOR: [MessageHandler(~filters.COMMAND, upsell_valor), CallbackQueryHandler(cancel)],
-        UPSELL_GRUPO: [MessageHandler(~filters.COMMAND, upsell_grupo), CallbackQueryHandler(cancel)]
-    },
-    fallbacks=[CallbackQueryHandler(error_callback)]
-)
\ No newline at end of file
+def build_conv_handler_upsell():
+    return ConversationHandler(
+        entry_points=[CommandHandler("upsell", upsell)],
+        states={
+            UPSELL_ESCOLHA: [CallbackQueryHandler(upsell_escolha)],
+            UPSELL_RECEBER: [MessageHandler(~filters.COMMAND, upsell_receber_mensagem), CallbackQueryHandler(cancel)],
+            UPSELL_VALOR: [MessageHandler(~filters.COMMAND, upsell_valor), CallbackQueryHandler(cancel)],
+            UPSELL_GRUPO: [MessageHandler(~filters.COMMAND, upsell_grupo), CallbackQueryHandler(cancel)]
+        },
+        fallbacks=[CallbackQueryHandler(error_callback)]
+    )
\ No newline at end of file
@@ -1,23 +1,26 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import modules.payment as payment
+import modules.offers as offers
 import modules.utils as utils
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, CallbackContext, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters, Updater, CallbackContext, ChatJoinRequestHandler
 from telegram.error import BadRequest, Conflict
 import asyncio, json
 
-from modules.utils import escape_markdown_v2
+from modules.utils import escape_markdown_v2, bot_snapshot
 
-async def send_disparo(context, user_id, config):
+async def send_disparo(context, user_id, config, campaign_id=None):
     
     try:
         print(user_id)
         keyboard = []
         if config['tipo'] == "plano":
-            payment_id = manager.create_payment(user_id, config['plano'], config['plano'], context.bot_data['id'])
+            if campaign_id is None:
+                campaign_id = await amanager.create_campaign(context.bot_data['id'], [config['plano']])
             valor = config['plano']['value']
+            # Só a referência da oferta: o pagamento é criado no clique
             keyboard = [
-                [InlineKeyboardButton('💠 Pagar via PIX 💠', callback_data=f'exibir_{payment_id}')]
+                [InlineKeyboardButton('💠 Pagar via PIX 💠', callback_data=offers.callback_data(context.bot_data['id'], campaign_id, 0, user_id, prefix='exibir_oferta'))]
             ]
         elif config['tipo'] == "livre":
             keyboard = [[InlineKeyboardButton('Acessar Conteúdo', url=config['link'])]]
@@ -59,7 +62,7 @@ async def send_upsell(context, user_id):
     # Marca que está no fluxo de upsell
     context.user_data['in_upsell_flow'] = True
     
-    config = manager.get_bot_upsell(context.bot_data['id'])
+    config = (await bot_snapshot(context)).upsell
     
     if not config or not config.get('value') or not config.get('group_id'):
         # Se não tem upsell configurado, limpa a flag e retorna
@@ -76,7 +79,7 @@ async def send_upsell(context, user_id):
         'upsell_group': config['group_id']
     }
     
-    payment_id = manager.create_payment(str(user_id), upsell_plan, 'Upsell', context.bot_data['id'])
+    payment_id = await amanager.create_payment(str(user_id), upsell_plan, 'Upsell', context.bot_data['id'])
     
     keyboard = [
         [
@@ -125,8 +128,9 @@ async def send_upsell(context, user_id):
 
 async def send_downsell(context, user_id):
     """Envia o downsell se recusar o upsell"""
-    config = manager.get_bot_downsell(context.bot_data['id'])
-    upsell_config = manager.get_bot_upsell(context.bot_data['id'])
+    snapshot = await bot_snapshot(context)
+    config = snapshot.downsell
+    upsell_config = snapshot.upsell
     
     if not config or not config.get('value'):
         # Se não tem downsell configurado, não faz nada
@@ -142,7 +146,7 @@ async def send_downsell(context, user_id):
         'downsell_group': upsell_config['group_id']  # Mesmo grupo do upsell
     }
     
-    payment_id = manager.create_payment(str(user_id), downsell_plan, 'Downsell', context.bot_data['id'])
+    payment_id = await amanager.create_payment(str(user_id), downsell_plan, 'Downsell', context.bot_data['id'])
     
     keyboard = [
         [
@@ -190,7 +194,7 @@ async def send_downsell(context, user_id):
         )
 
 async def send_expiration(context, user_id):
-    config = manager.get_bot_expiration(context.bot_data['id'])
+    config = await amanager.get_bot_expiration(context.bot_data['id'])
     if not config.get('text', False) or not config.get('media', False):
         return
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(text='RENOVAR ASSINATURA', callback_data='acessar_ofertas')]])
@@ -211,7 +215,7 @@ async def send_expiration(context, user_id):
 async def send_invite(context, user_id):
     try:
         # Carrega as informações do grupo
-        grupo_info = manager.get_bot_group(bot_id=context.bot_data['id'])
+        grupo_info = await amanager.get_bot_group(bot_id=context.bot_data['id'])
         user = await context.bot.get_chat(user_id)
         # Cria o link de convite com solicitação de entrada ativada
         
@@ -249,7 +253,7 @@ async def acessar_planos(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = (await bot_snapshot(context)).plans
     keyboard_plans = []
     for plan_index in range(len(planos)):
         keyboard_plans.append([InlineKeyboardButton(f'{planos[plan_index]['name']} - R$ {planos[plan_index]['value']}', callback_data=f"plano_{plan_index}")])
@@ -260,7 +264,7 @@ async def acessar_planos_mensagem(update: Update, context: CallbackContext):
     """Versão de acessar_planos para mensagens diretas (não callback)"""
     # Não tem query.answer() porque não é um callback
     
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = (await bot_snapshot(context)).plans
     keyboard_plans = []
     for plan_index in range(len(planos)):
         keyboard_plans.append([InlineKeyboardButton(f'{planos[plan_index]['name']} - R$ {planos[plan_index]['value']}', callback_data=f"plano_{plan_index}")])
@@ -278,7 +282,7 @@ async def confirmar_plano(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     plano_index = int(query.data.split('_')[-1])
-    planos = manager.get_bot_plans(context.bot_data['id'])
+    planos = (await bot_snapshot(context)).plans
     
     if len(planos) > plano_index:
         plano = planos[plano_index]
@@ -287,11 +291,11 @@ async def confirmar_plano(update: Update, context: CallbackContext):
         context.user_data['plano_selecionado'] = plano_index
         
         # Verifica se este plano tem order bump
-        orderbump = manager.get_orderbump_by_plan(context.bot_data['id'], plano_index)
+        orderbump = await amanager.get_orderbump_by_plan(context.bot_data['id'], plano_index)
         
         if orderbump:
             # Se tem order bump, mostra a oferta primeiro
-            payment_id = manager.create_payment(str(query.from_user.id), plano, plano['name'], context.bot_data['id'])
+            payment_id = await amanager.create_payment(str(query.from_user.id), plano, plano['name'], context.bot_data['id'])
             
             keyboard = [
                 [
@@ -334,7 +338,7 @@ async def confirmar_plano(update: Update, context: CallbackContext):
                 )
         else:
             # Se não tem order bump, segue o fluxo normal
-            payment_id = manager.create_payment(str(query.from_user.id), plano, plano['name'], context.bot_data['id'])
+            payment_id = await amanager.create_payment(str(query.from_user.id), plano, plano['name'], context.bot_data['id'])
             keyboard = [
                 [InlineKeyboardButton('💠 Pagar via PIX 💠', callback_data=f'pagar_{payment_id}')]
             ]
@@ -365,14 +369,34 @@ async def confirmar_plano(update: Update, context: CallbackContext):
     else:
         await query.message.reply_text(f'⛔ Erro ao encontrar oferta')
 
+async def offer_plan(query, context):
+    """Plano da oferta (botão oferta_/exibir_oferta_) clicada pelo usuário, ou None se inválida"""
+    offer = offers.parse(query.data, context.bot_data['id'], query.from_user.id)
+    if offer is None:
+        return None
+    return await amanager.get_campaign_plan(context.bot_data['id'], *offer)
+
 async def exibir_plano(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
-    payment_index = query.data.split('_')[-1]
-    plano = json.loads(manager.get_payment_plan_by_id(payment_index))
+    if query.data.startswith('exibir_oferta_'):
+        # Oferta do disparo: mostra o plano e o pagamento só é criado no "Pagar"
+        plano = await offer_plan(query, context)
+        if plano is None:
+            await query.message.reply_text('⛔ Oferta não encontrada')
+            return
+        callback_pagar = query.data.replace('exibir_', '', 1)
+    else:
+        payment_index = query.data.split('_')[-1]
+        plano = await amanager.get_payment_plan_by_id(payment_index)
+        if plano is None:
+            # Botão antigo de um pagamento parado que a retenção já arquivou
+            await query.message.reply_text('⌛ Este link expirou. Use /start para ver os planos novamente')
+            return
+        callback_pagar = f'pagar_{payment_index}'
 
     keyboard = [
-        [InlineKeyboardButton('💠 Pagar via PIX 💠', callback_data=f'pagar_{payment_index}')]
+        [InlineKeyboardButton('💠 Pagar via PIX 💠', callback_data=callback_pagar)]
     ]
     names = {
         'dia':'dias',
@@ -0,0 +1,87 @@
+"""Fachada assíncrona do modules.manager para os handlers dos bots.
+
+    planos = await amanager.get_bot_plans(bot_id)
+
+Cada chamada roda na thread dedicada ao banco do processo, sem travar o event
+loop do bot (e dos outros bots do mesmo processo) enquanto o SQLite consulta
+ou espera um lock. Como é uma única thread, as operações de um mesmo handler
+acontecem na ordem em que foram pedidas.
+
+Leituras iguais feitas ao mesmo tempo (ex: vários usuários abrindo /start e
+pedindo os planos do mesmo bot) viram uma única consulta; quem chegou depois
+recebe uma cópia do resultado. Qualquer escrita descarta as leituras em
+andamento para que as próximas já vejam o dado novo.
+"""
+import asyncio, copy, functools, os
+from concurrent.futures import ThreadPoolExecutor
+
+import modules.manager as manager
+
+# Prefixos das funções do manager que só leem o banco
+READ_PREFIXES = ('get_', 'count_', 'bot_exists', 'verificar_')
+
+_executor = None
+_executor_pid = None
+_inflight = {}  # (loop, função, argumentos) -> [future da leitura em andamento, chamadas]
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Threads não sobrevivem a um fork: cada processo cria a sua
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        _executor_pid = os.getpid()
+        _inflight.clear()
+    return _executor
+
+
+async def _run(func, args, kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def _read(name, func, args):
+    loop = asyncio.get_running_loop()
+    try:
+        key = (loop, name, args)
+        entry = _inflight.get(key)
+    except TypeError:
+        # Argumentos não hasheáveis: sem agrupamento
+        return await _run(func, args, {})
+
+    if entry is not None:
+        entry[1] += 1
+        return copy.deepcopy(await asyncio.shield(entry[0]))
+
+    future = loop.run_in_executor(_get_executor(), func, *args)
+    entry = _inflight[key] = [future, 1]
+    future.add_done_callback(lambda _: _inflight.get(key) is entry and _inflight.pop(key))
+    result = await asyncio.shield(future)
+    # Resultado dividido com outras chamadas: cada uma fica com a sua cópia
+    return copy.deepcopy(result) if entry[1] > 1 else result
+
+
+async def _write(func, args, kwargs):
+    _get_executor()
+    # Leituras posteriores a esta escrita não podem reaproveitar as anteriores
+    _inflight.clear()
+    return await _run(func, args, kwargs)
+
+
+def __getattr__(name):
+    func = getattr(manager, name)
+    if not callable(func):
+        return func
+
+    if name.startswith(READ_PREFIXES):
+        @functools.wraps(func)
+        async def call(*args, **kwargs):
+            if kwargs:
+                return await _run(func, args, kwargs)
+            return await _read(name, func, args)
+    else:
+        @functools.wraps(func)
+        async def call(*args, **kwargs):
+            return await _write(func, args, kwargs)
+
+    return call
@@ -0,0 +1,80 @@
+import os, sqlite3, threading
+from contextlib import contextmanager
+
+# Caminho do banco compartilhado entre o app e os processos dos bots
+DB_PATH = os.environ.get("DATABASE_PATH", "data.db")
+
+# Tempo máximo (ms) que uma conexão espera por um lock antes de falhar
+BUSY_TIMEOUT = 15000
+
+# Pragmas aplicados em toda conexão nova
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # leitores não bloqueiam escritores
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT}",
+    "PRAGMA synchronous=NORMAL",        # seguro com WAL e bem mais rápido que FULL
+    "PRAGMA mmap_size=268435456",       # 256MB de leitura via mmap
+    "PRAGMA cache_size=-16000",         # ~16MB de cache de páginas
+    "PRAGMA temp_store=MEMORY",
+)
+
+_local = threading.local()
+
+
+def _connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT / 1000,
+        isolation_level=None,  # autocommit, transações são abertas explicitamente
+        check_same_thread=False,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Retorna a conexão persistente da thread atual (uma por thread, por processo)"""
+    conn = getattr(_local, 'conn', None)
+    # Conexões herdadas de um fork não podem ser reutilizadas no processo filho
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    """Fecha a conexão da thread atual, se existir"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """Escopo de escrita: BEGIN IMMEDIATE, commit no sucesso e rollback em erro.
+
+    Transações aninhadas reaproveitam a transação externa.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def fetch_one(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+
+def fetch_all(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
@@ -0,0 +1,127 @@
+import asyncio, heapq, time
+
+import modules.async_manager as amanager
+from modules.actions import send_expiration
+
+# Janela de expirações carregadas do banco por vez (segundos)
+HORIZON = 3600
+# Máximo de expirações carregadas por grupo em cada leitura
+BATCH_SIZE = 500
+# Intervalo máximo entre leituras do banco, mesmo sem expirações na fila
+REFRESH_INTERVAL = 600
+# Intervalo mínimo entre leituras do banco (lote cheio de expirações já vencidas)
+MIN_REFRESH_INTERVAL = 1
+# Espera (segundos) antes de tentar de novo uma expiração que falhou
+RETRY_DELAY = 60
+
+
+class ExpirationScheduler:
+    """Remove membros expirados no momento exato da expiração.
+
+    Mantém uma heap com as próximas expirações (grupo VIP principal e grupo
+    extra do upsell/downsell), dorme até o próximo vencimento e é acordada
+    por schedule() quando um novo pagamento é registrado.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.bot_id = application.bot_data['id']
+        self._heap = []
+        self._queued = set()
+        # (user_id, grupo, due) -> epoch da próxima tentativa das expirações que falharam
+        self._retry_at = {}
+        self._loaded_until = 0
+        self._next_reload = 0
+        self._wakeup = asyncio.Event()
+        self.main_group = None
+
+    async def groups(self):
+        """Grupos vigiados: o VIP principal e o grupo extra (upsell/downsell usam o mesmo)"""
+        self.main_group = await amanager.get_bot_group(self.bot_id)
+        groups = [self.main_group]
+        upsell = await amanager.get_bot_upsell(self.bot_id) or {}
+        if upsell.get('group_id'):
+            groups.append(str(upsell['group_id']))
+        return [group for group in dict.fromkeys(groups) if group]
+
+    def _push(self, user_id, grupo, due):
+        key = (str(user_id), str(grupo), due)
+        if key in self._queued:
+            return
+        self._queued.add(key)
+        # A heap é ordenada pelo momento de agir: o vencimento ou a próxima tentativa
+        heapq.heappush(self._heap, (max(due, self._retry_at.get(key, 0)), *key))
+
+    async def _reload(self):
+        now = time.time()
+        until = now + HORIZON
+        self._heap = []
+        self._queued = set()
+
+        for grupo in await self.groups():
+            rows = await amanager.get_due_expirations(grupo, until, BATCH_SIZE)
+            # Lote cheio: só temos certeza da fila até a última expiração lida
+            if len(rows) == BATCH_SIZE:
+                until = min(until, rows[-1][2])
+            for user_id, grupo, due in rows:
+                self._push(user_id, grupo, due)
+
+        # Tentativas de linhas que sumiram do banco (renovadas/removidas) não voltam mais
+        self._retry_at = {key: at for key, at in self._retry_at.items() if key in self._queued}
+        self._loaded_until = until
+        # Lote cheio de linhas já vencidas deixa until no passado: não relê em loop
+        self._next_reload = max(min(now + REFRESH_INTERVAL, until), now + MIN_REFRESH_INTERVAL)
+
+    def schedule(self, user_id, grupo, due):
+        """Avisa o agendador de uma expiração (epoch) recém gravada com add_user_to_expiration"""
+        if due <= self._loaded_until:
+            self._push(user_id, grupo, due)
+            self._wakeup.set()
+
+    async def _expire(self, user_id, grupo):
+        # Se o usuário renovou, só limpa as linhas vencidas e mantém no grupo
+        latest = await amanager.get_user_latest_expiration(user_id, grupo)
+        if latest and latest > time.time():
+            await amanager.remover_expiracoes_vencidas(user_id, grupo)
+            return
+
+        print(f'expirado {user_id}')
+        await amanager.remover_usuario(user_id, grupo)
+        if grupo == self.main_group:
+            await send_expiration(self.application, user_id)
+        await self.application.bot.ban_chat_member(chat_id=grupo, user_id=user_id)
+        await self.application.bot.unban_chat_member(chat_id=grupo, user_id=user_id)
+
+    async def run(self):
+        print('expiration')
+        while True:
+            try:
+                if time.time() >= self._next_reload:
+                    await self._reload()
+
+                while self._heap and self._heap[0][0] <= time.time():
+                    _, user_id, grupo, due = heapq.heappop(self._heap)
+                    key = (user_id, grupo, due)
+                    self._queued.discard(key)
+                    try:
+                        await self._expire(user_id, grupo)
+                        self._retry_at.pop(key, None)
+                    except Exception as e:
+                        print(e)
+                        # Volta para a fila só depois de RETRY_DELAY (e sobrevive às releituras)
+                        self._retry_at[key] = time.time() + RETRY_DELAY
+                        self._push(user_id, grupo, due)
+
+                deadline = self._next_reload
+                if self._heap:
+                    deadline = min(deadline, self._heap[0][0])
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(deadline - time.time(), 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(e)
+                await asyncio.sleep(5)
@@ -1,10 +1,21 @@
-import json, sqlite3, datetime, requests
+import json, sqlite3, datetime, requests, time, hashlib
 from datetime import datetime, timedelta
 
-def inicialize_database():
-    conn = sqlite3.connect('data.db')
-    cur = conn.cursor()
+from modules.database import transaction, fetch_one, fetch_all
+
+def _table_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
 
+# ---------------------------------------------------------------------------
+# Migrações de schema
+#
+# Cada migração roda uma única vez, dentro de uma transação, e a versão
+# aplicada fica registrada em PRAGMA user_version. Para alterar o schema,
+# adicione uma nova função no final de MIGRATIONS (nunca edite as antigas).
+# ---------------------------------------------------------------------------
+
+def _migration_base_tables(cur):
     cur.execute("""
         CREATE TABLE IF NOT EXISTS BOTS (
             id TEXT PRIMARY KEY,
@@ -42,7 +53,6 @@ def inicialize_database():
         )
     """)
     
-    # NOVA TABELA ADICIONADA AQUI:
     cur.execute("""
         CREATE TABLE IF NOT EXISTS RECOVERY_MESSAGES (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -56,34 +66,316 @@ def inicialize_database():
             FOREIGN KEY (bot_id) REFERENCES BOTS(id)
         )
     """)
-    
-    conn.commit()
-    conn.close()
+
+    # Tabela para rastrear recuperações em andamento
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS RECOVERY_TRACKING (
+            user_id TEXT,
+            bot_id TEXT,
+            start_time TEXT,
+            recovery_index INTEGER,
+            status TEXT,
+            PRIMARY KEY (user_id, bot_id)
+        )
+    """)
+
+def _migration_bot_columns(cur):
+    # Colunas que antes eram criadas sob demanda pelos próprios getters/setters
+    columns = _table_columns(cur, 'BOTS')
+    if 'orderbump' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN orderbump TEXT DEFAULT '[]'")
+    if 'downsell' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN downsell TEXT DEFAULT '{}'")
+    if 'scheduled_broadcasts' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN scheduled_broadcasts TEXT DEFAULT '[]'")
+    if 'last_activity' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN last_activity TEXT DEFAULT NULL")
+
+def _migration_bot_users(cur):
+    # Público de cada bot (antes ficava no JSON BOTS.users)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS BOT_USERS (
+            bot_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            first_seen TEXT,
+            last_seen TEXT,
+            status TEXT NOT NULL DEFAULT 'active'
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_bot_users_bot_user ON BOT_USERS (bot_id, user_id)")
+
+    cur.execute("SELECT id, users FROM BOTS WHERE users IS NOT NULL AND users NOT IN ('', '[]')")
+    for bot_id, users_json in cur.fetchall():
+        try:
+            users = json.loads(users_json)
+        except:
+            users = []
+        _insert_bot_users(cur, bot_id, users)
+        cur.execute("UPDATE BOTS SET users = '[]' WHERE id = ?", (bot_id,))
+        print(f"[BOT_USERS] {len(users)} usuários migrados do bot {bot_id}")
+
+def _migration_payments_primary_key(cur):
+    # PAYMENTS.id era calculado com COUNT(*) e podia repetir entre processos.
+    # Recria a tabela com uma chave AUTOINCREMENT preservando os ids já
+    # enviados nos botões; ids duplicados recebem um id novo.
+    cur.execute("""
+        CREATE TABLE PAYMENTS_NEW (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trans_id TEXT,
+            chat TEXT,
+            plano TEXT,
+            bot TEXT,
+            status TEXT
+        )
+    """)
+    cur.execute("""
+        INSERT INTO PAYMENTS_NEW (id, trans_id, chat, plano, bot, status)
+        SELECT CAST(id AS INTEGER), trans_id, chat, plano, bot, status FROM PAYMENTS
+        WHERE rowid IN (SELECT MIN(rowid) FROM PAYMENTS GROUP BY id)
+        ORDER BY rowid
+    """)
+    cur.execute("""
+        INSERT INTO PAYMENTS_NEW (trans_id, chat, plano, bot, status)
+        SELECT trans_id, chat, plano, bot, status FROM PAYMENTS
+        WHERE rowid NOT IN (SELECT MIN(rowid) FROM PAYMENTS GROUP BY id)
+        ORDER BY rowid
+    """)
+    cur.execute("DROP TABLE PAYMENTS")
+    cur.execute("ALTER TABLE PAYMENTS_NEW RENAME TO PAYMENTS")
+
+def _migration_payments_trans_id(cur):
+    # trans_id passa a ser NULL enquanto o PIX não foi gerado (antes 'false'),
+    # permitindo um índice UNIQUE. Duplicatas antigas ficam só no pagamento mais recente.
+    cur.execute("UPDATE PAYMENTS SET trans_id = NULL WHERE trans_id IN ('false', '')")
+    cur.execute("""
+        UPDATE PAYMENTS SET trans_id = NULL
+        WHERE trans_id IS NOT NULL
+        AND id NOT IN (SELECT MAX(id) FROM PAYMENTS WHERE trans_id IS NOT NULL GROUP BY trans_id)
+    """)
+
+def _migration_bot_profile(cur):
+    # Perfil do bot (getMe) salvo para não consultar o Telegram a cada tela
+    columns = _table_columns(cur, 'BOTS')
+    if 'username' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN username TEXT DEFAULT NULL")
+    if 'first_name' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN first_name TEXT DEFAULT NULL")
+    if 'profile_updated_at' not in columns:
+        cur.execute("ALTER TABLE BOTS ADD COLUMN profile_updated_at REAL DEFAULT NULL")
+
+def _migration_bot_version(cur):
+    # Versão das configurações do bot, usada pelo cache do get_bot_snapshot
+    if 'version' not in _table_columns(cur, 'BOTS'):
+        cur.execute("ALTER TABLE BOTS ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+def _migration_campaigns(cur):
+    # Planos oferecidos nos disparos e recuperações; o pagamento só nasce no clique
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS CAMPAIGNS (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            plans TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_campaigns_bot_digest ON CAMPAIGNS (bot, digest)")
+
+def _migration_payment_plan_ref(cur):
+    # Pagamentos novos guardam a versão do plano + só o que difere dela (desconto,
+    # flags de recuperação/upsell...) em vez de uma cópia inteira do plano.
+    # Os antigos continuam com o JSON completo em PAYMENTS.plano.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS PLAN_VERSIONS (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bot TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_plan_versions_bot_digest ON PLAN_VERSIONS (bot, digest)")
+    columns = _table_columns(cur, 'PAYMENTS')
+    if 'plan_version' not in columns:
+        cur.execute("ALTER TABLE PAYMENTS ADD COLUMN plan_version INTEGER DEFAULT NULL")
+    if 'plan_overrides' not in columns:
+        cur.execute("ALTER TABLE PAYMENTS ADD COLUMN plan_overrides TEXT DEFAULT NULL")
+
+def _migration_epoch_columns(cur):
+    # Datas viram epoch em segundos (INTEGER): buscas por prazo são um range no
+    # índice, sem parse por linha e sem depender do fuso do servidor. Os textos
+    # antigos foram gravados com datetime.now(), ou seja, na hora local ('utc').
+    # USERS e RECOVERY_TRACKING são recriadas para manter a ordem das colunas.
+    cur.execute("""
+        CREATE TABLE USERS_NEW (
+            id_user TEXT,
+            entrada_at INTEGER,
+            expiracao_at INTEGER,
+            plano TEXT,
+            grupo TEXT
+        )
+    """)
+    cur.execute("""
+        INSERT INTO USERS_NEW (id_user, entrada_at, expiracao_at, plano, grupo)
+        SELECT id_user,
+               CAST(strftime('%s', data_entrada, 'utc') AS INTEGER),
+               CAST(strftime('%s', data_expiracao, 'utc') AS INTEGER),
+               plano, grupo
+        FROM USERS ORDER BY rowid
+    """)
+    cur.execute("DROP TABLE USERS")
+    cur.execute("ALTER TABLE USERS_NEW RENAME TO USERS")
+
+    cur.execute("""
+        CREATE TABLE RECOVERY_TRACKING_NEW (
+            user_id TEXT,
+            bot_id TEXT,
+            started_at INTEGER,
+            recovery_index INTEGER,
+            status TEXT,
+            PRIMARY KEY (user_id, bot_id)
+        )
+    """)
+    cur.execute("""
+        INSERT INTO RECOVERY_TRACKING_NEW (user_id, bot_id, started_at, recovery_index, status)
+        SELECT user_id, bot_id, CAST(strftime('%s', start_time, 'utc') AS INTEGER), recovery_index, status
+        FROM RECOVERY_TRACKING
+    """)
+    cur.execute("DROP TABLE RECOVERY_TRACKING")
+    cur.execute("ALTER TABLE RECOVERY_TRACKING_NEW RENAME TO RECOVERY_TRACKING")
+
+    # BOTS é lida com SELECT * só até a coluna "group": basta trocar a coluna
+    cur.execute("ALTER TABLE BOTS ADD COLUMN last_activity_at INTEGER DEFAULT NULL")
+    cur.execute("UPDATE BOTS SET last_activity_at = CAST(strftime('%s', last_activity, 'utc') AS INTEGER)")
+    cur.execute("DROP INDEX IF EXISTS idx_bots_last_activity")
+    cur.execute("ALTER TABLE BOTS DROP COLUMN last_activity")
+
+    # Pagamentos antigos não têm data de criação
+    cur.execute("ALTER TABLE PAYMENTS ADD COLUMN created_at INTEGER DEFAULT NULL")
+
+def _migration_counters(cur):
+    # Contadores do dashboard por bot e globais ('*'), mantidos a cada mudança
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS COUNTERS (
+            scope TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value NUMERIC NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, name)
+        ) WITHOUT ROWID
+    """)
+    # Carga inicial a partir dos dados existentes
+    cur.execute("SELECT id FROM BOTS")
+    for (bot_id,) in cur.fetchall():
+        _bump_counters(cur, bot_id, bots=1)
+    cur.execute("SELECT bot_id, COUNT(*) FROM BOT_USERS GROUP BY bot_id")
+    for bot_id, users in cur.fetchall():
+        _bump_counters(cur, bot_id, users=users)
+    cur.execute("SELECT id, plan FROM PLAN_VERSIONS")
+    versions = {version_id: json.loads(plan) for version_id, plan in cur.fetchall()}
+    cur.execute("SELECT bot, plano, plan_version, plan_overrides FROM PAYMENTS WHERE status = 'finished'")
+    for bot_id, plano, plan_version, plan_overrides in cur.fetchall():
+        if plan_version is None:
+            plan = json.loads(plano)
+        else:
+            plan = {**versions[plan_version], **json.loads(plan_overrides or '{}')}
+        _bump_counters(cur, bot_id, sales=1, revenue=plan.get('value', 0))
+
+def _migration_payments_created_at(cur):
+    # Pagamentos anteriores ao created_at contam a partir de agora para a retenção
+    cur.execute("UPDATE PAYMENTS SET created_at = ? WHERE created_at IS NULL", (int(time.time()),))
+
+def _migration_payment_claims(cur):
+    # Momento em que um processador reservou o pagamento para entrega
+    cur.execute("ALTER TABLE PAYMENTS ADD COLUMN claimed_at INTEGER DEFAULT NULL")
+    # Entregas que falharam e quando o pagamento pode ser reservado de novo
+    cur.execute("ALTER TABLE PAYMENTS ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE PAYMENTS ADD COLUMN retry_at INTEGER DEFAULT NULL")
+
+def _migration_plan_versions_used_at(cur):
+    # Último momento em que algum processo pôs a versão no cache (ver _plan_version)
+    cur.execute("ALTER TABLE PLAN_VERSIONS ADD COLUMN used_at INTEGER DEFAULT NULL")
+    cur.execute("UPDATE PLAN_VERSIONS SET used_at = CAST(created_at AS INTEGER)")
+
+def _migration_campaigns_used_at(cur):
+    # Último disparo/recuperação que reaproveitou a campanha (ver create_campaign)
+    cur.execute("ALTER TABLE CAMPAIGNS ADD COLUMN used_at INTEGER DEFAULT NULL")
+    cur.execute("UPDATE CAMPAIGNS SET used_at = CAST(created_at AS INTEGER)")
+
+MIGRATIONS = [
+    _migration_base_tables,
+    _migration_bot_columns,
+    _migration_bot_users,
+    _migration_payments_primary_key,
+    _migration_payments_trans_id,
+    _migration_bot_profile,
+    _migration_bot_version,
+    _migration_campaigns,
+    _migration_payment_plan_ref,
+    _migration_epoch_columns,
+    _migration_counters,
+    _migration_payments_created_at,
+    _migration_payment_claims,
+    _migration_plan_versions_used_at,
+    _migration_campaigns_used_at,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version():
+    return fetch_one("PRAGMA user_version")[0]
+
+def run_migrations():
+    """Leva o banco até SCHEMA_VERSION, aplicando apenas as migrações pendentes"""
+    current = get_schema_version()
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        with transaction() as cur:
+            # Outro processo pode ter aplicado a migração enquanto esperávamos o lock
+            if cur.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {version}")
+        print(f"[SCHEMA] Migração {version} ({migration.__name__}) aplicada")
+
+# Índices das consultas quentes (payment_task, webhooks, expiração, recuperação).
+# São (re)criados a cada inicialização, então basta declarar aqui.
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_payments_bot_status ON PAYMENTS (bot, status)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_trans_id ON PAYMENTS (trans_id)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_status ON PAYMENTS (status)",
+    "CREATE INDEX IF NOT EXISTS idx_users_grupo_expiracao_at ON USERS (grupo, expiracao_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_user_grupo ON USERS (id_user, grupo)",
+    "CREATE INDEX IF NOT EXISTS idx_recovery_tracking_bot ON RECOVERY_TRACKING (bot_id)",
+    "CREATE INDEX IF NOT EXISTS idx_recovery_tracking_status_started ON RECOVERY_TRACKING (status, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_recovery_messages_bot_delay ON RECOVERY_MESSAGES (bot_id, delay)",
+    "CREATE INDEX IF NOT EXISTS idx_bots_owner ON BOTS (owner)",
+    "CREATE INDEX IF NOT EXISTS idx_bots_last_activity_at ON BOTS (last_activity_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_created_at ON PAYMENTS (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_status_created ON PAYMENTS (status, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_bots_profile_updated ON BOTS (profile_updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_plan_version ON PAYMENTS (plan_version)",
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_used_at ON CAMPAIGNS (used_at)",
+]
+
+def create_indexes():
+    with transaction() as cur:
+        for statement in INDEXES:
+            cur.execute(statement)
+
+def inicialize_database():
+    run_migrations()
+    create_indexes()
 def count_bots():
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM BOTS")
-        count = cursor.fetchone()[0]
-        
-        return count
+        return fetch_one("SELECT COUNT(*) FROM BOTS")[0]
     except sqlite3.Error as e:
         print(f"Erro ao acessar o banco de dados: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 def get_bot_by_id(bot_id):
 
     print(bot_id)
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM BOTS WHERE id = ?", (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return result
+    return fetch_one("SELECT * FROM BOTS WHERE id = ?", (bot_id,))
 
 config_default = {
     'texto1':False,
@@ -94,321 +386,443 @@ config_default = {
 
 def get_bots_by_owner(owner_id):
     """Retorna todos os bots de um owner específico"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM BOTS WHERE owner = ?", (str(owner_id),))
-    result = cursor.fetchall()
-    conn.close()
+    result = fetch_all("SELECT * FROM BOTS WHERE owner = ?", (str(owner_id),))
     return result if result else []
 
 def create_bot(id, token, owner, config=config_default, admin=[], plans=[], gateway={}, users=[], upsell={}, group='', expiration={}):
-    # Conecta ao banco de dados
-    conn = sqlite3.connect('data.db')
-    cur = conn.cursor()
-    
-    # Primeiro, garante que a coluna last_activity existe
-    cur.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cur.fetchall()]
-    
-    if 'last_activity' not in columns:
-        cur.execute("ALTER TABLE BOTS ADD COLUMN last_activity TEXT DEFAULT NULL")
-        conn.commit()
+    # IMPORTANTE: Define last_activity_at como AGORA
+    current_time = int(time.time())
 
-    # Insere um novo registro na tabela BOTS
     try:
-        # IMPORTANTE: Define last_activity como AGORA
-        from datetime import datetime
-        current_time = datetime.now().isoformat()
-        
-        cur.execute("""
-            INSERT INTO BOTS (id, token, owner, config, admin, plans, gateway, users, upsell, "group", expiration, last_activity)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (id, token, owner, json.dumps(config), json.dumps(admin), json.dumps(plans), 
-              json.dumps(gateway), json.dumps(users), json.dumps(upsell), group, 
-              json.dumps(expiration), current_time))
-        
-        # Confirma a transação
-        conn.commit()
+        with transaction() as cur:
+            # Insere um novo registro na tabela BOTS
+            cur.execute("""
+                INSERT INTO BOTS (id, token, owner, config, admin, plans, gateway, users, upsell, "group", expiration, last_activity_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (id, token, owner, json.dumps(config), json.dumps(admin), json.dumps(plans), 
+                  json.dumps(gateway), json.dumps([]), json.dumps(upsell), group, 
+                  json.dumps(expiration), current_time))
+            _bump_counters(cur, id, bots=1, users=_insert_bot_users(cur, id, users))
         print(f"Bot criado com sucesso! Last activity: {current_time}")
     except sqlite3.IntegrityError as e:
         print("Erro ao criar bot:", e)
-    finally:
-        # Fecha a conexão
-        conn.close()
+
+# Respostas do getMe que significam token inválido; 429 e 5xx são falhas temporárias
+INVALID_TOKEN_STATUS = (401, 404)
+# Tentativas do getMe em falha temporária e espera máxima (segundos) entre elas
+TOKEN_CHECK_RETRIES = 3
+TOKEN_CHECK_MAX_WAIT = 5
+
+class TelegramUnavailable(Exception):
+    """getMe sem resposta definitiva (429/5xx): o token não foi validado nem invalidado"""
 
 def check_bot_token(token):
-    response = requests.get(f'https://api.telegram.org/bot{token}/getMe')
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
+    """Resultado do getMe, ou False se o token é inválido; levanta TelegramUnavailable se o Telegram não responder"""
+    for attempt in range(TOKEN_CHECK_RETRIES):
+        response = requests.get(f'https://api.telegram.org/bot{token}/getMe', timeout=10)
+        if response.status_code == 200:
+            return json.loads(response.text)
+        if response.status_code in INVALID_TOKEN_STATUS:
+            return False
+        if attempt < TOKEN_CHECK_RETRIES - 1:
+            # 429 informa quanto esperar; 5xx espera 1s, 2s, ...
+            wait = 2 ** attempt
+            if response.status_code == 429:
+                try:
+                    wait = response.json().get('parameters', {}).get('retry_after', wait)
+                except ValueError:
+                    pass
+            time.sleep(min(wait, TOKEN_CHECK_MAX_WAIT))
+    raise TelegramUnavailable(f"getMe respondeu {response.status_code}")
+
+# Validade do perfil do bot (username/first_name) salvo no BOTS, em segundos
+PROFILE_TTL = 6 * 3600
+
+def save_bot_profile(bot_id, details):
+    """Salva o resultado do getMe no BOTS (details False = token inválido)"""
+    result = details.get('result', {}) if details else {}
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE BOTS SET username = ?, first_name = ?, profile_updated_at = ?
+            WHERE id = ?
+        """, (result.get('username'), result.get('first_name'), time.time(), str(bot_id)))
+
+def refresh_bot_profile(bot_id, token):
+    """Consulta o getMe e atualiza o perfil salvo (erros de rede sobem sem apagar o perfil)"""
+    details = check_bot_token(token)
+    save_bot_profile(bot_id, details)
+    return details
+
+def _profile_details(bot_id, username, first_name, updated_at):
+    # Mesmo formato do check_bot_token: None = nunca consultado, False = token inválido
+    if updated_at is None:
+        return None
+    if not username:
         return False
-    
+    return {'result': {'id': bot_id, 'username': username, 'first_name': first_name or 'Sem nome'}}
+
+def get_bot_details(bot_id):
+    """Perfil salvo do bot no formato do check_bot_token; só chama o getMe se nunca consultou"""
+    row = fetch_one("""
+        SELECT token, username, first_name, profile_updated_at FROM BOTS WHERE id = ?
+    """, (str(bot_id),))
+    if row is None:
+        return False
+    if row[3] is None:
+        try:
+            return refresh_bot_profile(bot_id, row[0])
+        except Exception as e:
+            print(f"Erro ao consultar perfil do bot {bot_id}: {e}")
+            return False
+    return _profile_details(bot_id, row[1], row[2], row[3])
+
+def get_all_bot_details():
+    """bot_id -> perfil salvo (formato do check_bot_token), numa única consulta"""
+    rows = fetch_all("SELECT id, username, first_name, profile_updated_at FROM BOTS")
+    return {str(row[0]): _profile_details(str(row[0]), row[1], row[2], row[3]) for row in rows}
+
+def get_stale_bot_profiles(limit=200):
+    """(id, token) dos bots com perfil nunca consultado ou vencido, os mais antigos primeiro"""
+    return fetch_all("""
+        SELECT id, token FROM BOTS
+        WHERE profile_updated_at IS NULL OR profile_updated_at < ?
+        ORDER BY profile_updated_at
+        LIMIT ?
+    """, (time.time() - PROFILE_TTL, limit))
+    
+def get_bots_for_startup():
+    """(id, token) de todos os bots, com os que venderam ou tiveram atividade recente primeiro"""
+    return fetch_all("""
+        SELECT b.id, b.token
+        FROM BOTS b
+        LEFT JOIN (
+            SELECT bot, MAX(id) AS last_sale
+            FROM PAYMENTS
+            WHERE status IN ('paid', 'delivering', 'finished')
+            GROUP BY bot
+        ) s ON s.bot = b.id
+        ORDER BY s.last_sale IS NULL, s.last_sale DESC, b.last_activity_at DESC
+    """)
+
 def bot_exists(token):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM BOTS WHERE token = ?", (token,))
-    exists = cursor.fetchone() is not None
-    
-    conn.close()
-    return exists
+    return fetch_one("SELECT 1 FROM BOTS WHERE token = ?", (token,)) is not None
 
 def get_all_bots():
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM BOTS")
-    exists = cursor.fetchall()
+    exists = fetch_all("SELECT * FROM BOTS")
     print(exists)
-    conn.close()
     return exists
 
+# Cache em memória das configurações dos bots (config, planos, admins, dono...).
+# Toda escrita por _update_bot_column incrementa BOTS.version e limpa o cache
+# local na hora; outros processos percebem a nova versão em até
+# SETTINGS_CHECK_INTERVAL segundos (só consultam a versão, sem ler o JSON).
+SETTINGS_CHECK_INTERVAL = 2
+_settings_cache = {}  # bot_id -> {'version', 'checked_at', 'row': {coluna: valor bruto}}
+
+# Colunas do BOTS que não são configuração: não mudam a versão nem limpam o cache
+UNVERSIONED_COLUMNS = ('last_activity_at',)
+
+def invalidate_bot_settings(bot_id):
+    _settings_cache.pop(str(bot_id), None)
+
+def _update_bot_column(bot_id, column, value):
+    if column in UNVERSIONED_COLUMNS:
+        with transaction() as cur:
+            cur.execute(f'UPDATE BOTS SET "{column}" = ? WHERE id = ?', (value, bot_id))
+        return
+    with transaction() as cur:
+        cur.execute(f'UPDATE BOTS SET "{column}" = ?, version = version + 1 WHERE id = ?', (value, bot_id))
+    invalidate_bot_settings(bot_id)
+
 def update_bot_config(bot_id, config):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET config = ? WHERE id = ?", (json.dumps(config), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'config', json.dumps(config))
 
 def update_bot_admin(bot_id, admin):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET admin = ? WHERE id = ?", (json.dumps(admin), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'admin', json.dumps(admin))
 
 def update_bot_token(bot_id, admin):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET token = ? WHERE id = ?", (json.dumps(admin), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'token', json.dumps(admin))
 
 def update_bot_plans(bot_id, plans):
     print(plans)
     print(json.dumps(plans))
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET plans = ? WHERE id = ?", (json.dumps(plans), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'plans', json.dumps(plans))
 
 def update_bot_gateway(bot_id, gateway):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET gateway = ? WHERE id = ?", (json.dumps(gateway), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'gateway', json.dumps(gateway))
+
+def _insert_bot_users(cursor, bot_id, users):
+    now = datetime.now().isoformat()
+    cursor.executemany("""
+        INSERT OR IGNORE INTO BOT_USERS (bot_id, user_id, first_seen, last_seen, status)
+        VALUES (?, ?, ?, ?, 'active')
+    """, [(bot_id, str(user), now, now) for user in users])
+    return cursor.rowcount
 
 def update_bot_users(bot_id, users):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET users = ? WHERE id = ?", (json.dumps(users), bot_id))
-    conn.commit()
-    conn.close()
+    """Substitui o público do bot pela lista informada"""
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM BOT_USERS WHERE bot_id = ?", (bot_id,))
+        removed = cursor.rowcount
+        _bump_counters(cursor, bot_id, users=_insert_bot_users(cursor, bot_id, users) - removed)
+
+def add_bot_user(bot_id, user_id):
+    """Registra o usuário no público do bot (ou atualiza last_seen se já existir)"""
+    now = datetime.now().isoformat()
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT OR IGNORE INTO BOT_USERS (bot_id, user_id, first_seen, last_seen, status)
+            VALUES (?, ?, ?, ?, 'active')
+        """, (bot_id, str(user_id), now, now))
+        if cursor.rowcount:
+            _bump_counters(cursor, bot_id, users=1)
+        else:
+            cursor.execute("""
+                UPDATE BOT_USERS SET last_seen = ?, status = 'active' WHERE bot_id = ? AND user_id = ?
+            """, (now, bot_id, str(user_id)))
+
+def update_bot_user_status(bot_id, user_id, status):
+    """Altera o status de um usuário do público (ex: 'blocked' quando bloqueia o bot)"""
+    with transaction() as cursor:
+        cursor.execute("UPDATE BOT_USERS SET status = ? WHERE bot_id = ? AND user_id = ?", (status, bot_id, str(user_id)))
 
 def update_bot_upsell(bot_id, upsell):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET upsell = ? WHERE id = ?", (json.dumps(upsell), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'upsell', json.dumps(upsell))
 
 def update_bot_expiration(bot_id, expiration):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET expiration = ? WHERE id = ?", (json.dumps(expiration), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'expiration', json.dumps(expiration))
 
 def update_bot_group(bot_id, group):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE BOTS SET 'group' = ? WHERE id = ?", (group, bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'group', group)
     
 def delete_bot(bot_id):
     """Remove completamente um bot do banco de dados"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
     try:
-        # Remove o bot da tabela BOTS
-        cursor.execute("DELETE FROM BOTS WHERE id = ?", (bot_id,))
-        
-        # Remove todos os pagamentos associados ao bot
-        cursor.execute("DELETE FROM PAYMENTS WHERE bot = ?", (bot_id,))
-        
-        # Remove todos os usuários/expiração associados ao bot
-        # Primeiro, pega o grupo do bot antes de deletar
-        cursor.execute("SELECT 'group' FROM BOTS WHERE id = ?", (bot_id,))
-        result = cursor.fetchone()
-        if result and result[0]:
-            grupo = result[0]
-            cursor.execute("DELETE FROM USERS WHERE grupo = ?", (grupo,))
-        
-        # Remove rastreamento de recuperação associado
-        cursor.execute("DELETE FROM RECOVERY_TRACKING WHERE bot_id = ?", (bot_id,))
-        
-        conn.commit()
+        with transaction() as cursor:
+            # Remove o bot da tabela BOTS
+            cursor.execute("DELETE FROM BOTS WHERE id = ?", (bot_id,))
+            removed = cursor.rowcount
+            
+            # Remove todos os pagamentos associados ao bot
+            cursor.execute("DELETE FROM PAYMENTS WHERE bot = ?", (bot_id,))
+            
+            # USERS fica: o grupo VIP pode continuar em uso por outro bot
+            # (troca de token cria o bot novo com o grupo do antigo)
+            
+            # Remove o público do bot
+            cursor.execute("DELETE FROM BOT_USERS WHERE bot_id = ?", (bot_id,))
+            
+            # Remove rastreamento de recuperação associado
+            cursor.execute("DELETE FROM RECOVERY_TRACKING WHERE bot_id = ?", (bot_id,))
+            
+            # Versões de plano que ficaram sem pagamentos; as usadas há pouco (ainda
+            # em cache em algum processo) saem depois, pela retenção
+            delete_unused_plan_versions(bot_id)
+            
+            # Remove as campanhas de disparo e recuperação do bot
+            cursor.execute("DELETE FROM CAMPAIGNS WHERE bot = ?", (str(bot_id),))
+            
+            # Tira os números do bot dos contadores globais; 'bots' só cai se o bot existia
+            cursor.execute("SELECT name, value FROM COUNTERS WHERE scope = ? AND name != 'bots'", (str(bot_id),))
+            _bump_counters(cursor, GLOBAL_SCOPE, bots=-removed, **{name: -value for name, value in cursor.fetchall()})
+            cursor.execute("DELETE FROM COUNTERS WHERE scope = ?", (str(bot_id),))
+            
+        invalidate_bot_settings(bot_id)
         print(f"Bot {bot_id} removido completamente do banco de dados")
         return True
         
     except Exception as e:
         print(f"Erro ao deletar bot {bot_id}: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 
 
+# Colunas carregadas de uma vez no BotSnapshot
+SNAPSHOT_COLUMNS = ('owner', 'config', 'admin', 'plans', 'gateway', 'upsell', '"group"',
+                    'expiration', 'orderbump', 'downsell', 'scheduled_broadcasts')
+
+def _json_property(column, default=None):
+    def decode(self):
+        # Decodifica só na primeira leitura; colunas com default toleram JSON vazio/inválido
+        try:
+            return self._decoded[column]
+        except KeyError:
+            pass
+        raw = self._raw[column]
+        if default is None:
+            value = json.loads(raw) if raw is not None else None
+        else:
+            try:
+                value = json.loads(raw) if raw else type(default)()
+            except ValueError:
+                value = type(default)()
+        self._decoded[column] = value
+        return value
+    return property(decode)
+
+class BotSnapshot:
+    """Configurações de um bot lidas numa única consulta.
+
+    Cada coluna JSON só é decodificada quando lida pela primeira vez. O
+    snapshot tem suas próprias cópias dos valores: pode ser alterado e
+    repassado durante o handler sem afetar o cache.
+    """
+    __slots__ = ('id', 'version', 'owner', 'group', '_raw', '_decoded')
+
+    def __init__(self, bot_id, version, row):
+        self.id = bot_id
+        self.version = version
+        self.owner = str(row['owner']) if row['owner'] is not None else None
+        self.group = row['group']
+        self._raw = row
+        self._decoded = {}
+
+    config = _json_property('config')
+    admin = _json_property('admin')
+    plans = _json_property('plans')
+    gateway = _json_property('gateway')
+    upsell = _json_property('upsell')
+    expiration = _json_property('expiration')
+    orderbump = _json_property('orderbump', [])
+    downsell = _json_property('downsell', {})
+    scheduled_broadcasts = _json_property('scheduled_broadcasts', [])
+
+def get_bot_snapshot(bot_id):
+    """BotSnapshot do bot (None se não existir), a partir do cache de configurações"""
+    bot_id = str(bot_id)
+    now = time.monotonic()
+    entry = _settings_cache.get(bot_id)
+
+    # Passou o intervalo: confere se outro processo alterou o bot
+    if entry is not None and now - entry['checked_at'] > SETTINGS_CHECK_INTERVAL:
+        row = fetch_one("SELECT version FROM BOTS WHERE id = ?", (bot_id,))
+        if row is None or row[0] != entry['version']:
+            invalidate_bot_settings(bot_id)
+            entry = None
+        else:
+            entry['checked_at'] = now
+
+    if entry is None:
+        row = fetch_one(f"SELECT version, {', '.join(SNAPSHOT_COLUMNS)} FROM BOTS WHERE id = ?", (bot_id,))
+        if row is None:
+            return None
+        # Guarda os valores brutos (texto JSON): cada snapshot decodifica a sua cópia
+        columns = [column.strip('"') for column in SNAPSHOT_COLUMNS]
+        entry = _settings_cache[bot_id] = {
+            'version': row[0], 'checked_at': now, 'row': dict(zip(columns, row[1:])),
+        }
+
+    return BotSnapshot(bot_id, entry['version'], entry['row'])
+
 def get_bot_users(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "users" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    print(result)
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    """Retorna os ids dos usuários ativos do bot, em ordem de chegada"""
+    rows = fetch_all("""
+        SELECT user_id FROM BOT_USERS
+        WHERE bot_id = ? AND status = 'active'
+        ORDER BY rowid
+    """, (bot_id,))
+    return [row[0] for row in rows]
 
 def get_bot_gateway(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "gateway" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.gateway
 
 
 
 
 
 def get_bot_config(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "config" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.config
 
 
 def get_bot_group(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "group" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return result[0]
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.group
 
 def get_bot_upsell(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "upsell" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.upsell
 
 def get_bot_plans(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "plans" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.plans
 
 def get_bot_expiration(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "expiration" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.expiration
 
 # Administração
 
 def get_bot_owner(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "owner" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return str(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.owner
 def get_bot_admin(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT "admin" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result:
-        conn.close()
-        return json.loads(result[0])
+    snapshot = get_bot_snapshot(bot_id)
+    if snapshot:
+        return snapshot.admin
     
 
 
 
-def add_user_to_expiration(id_user, data_entrada, data_expiracao, plano_dict, grupo):
+def add_user_to_expiration(id_user, entrada_at, expiracao_at, plano_dict, grupo):
+    """Registra o acesso do usuário ao grupo; entrada_at e expiracao_at em epoch (segundos)"""
     # Converter o plano (dicionário) em uma string JSON
     plano_json = json.dumps(plano_dict)
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    # Inserir a nova linha na tabela
-    cursor.execute('''
-    INSERT INTO USERS (id_user, data_entrada, data_expiracao, plano, grupo)
-    VALUES (?, ?, ?, ?, ?)
-    ''', (id_user, data_entrada, data_expiracao, plano_json, grupo))
-    
-    # Salvar as alterações e fechar
-    conn.commit()
+    with transaction() as cursor:
+        cursor.execute('''
+        INSERT INTO USERS (id_user, entrada_at, expiracao_at, plano, grupo)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (id_user, int(entrada_at), int(expiracao_at), plano_json, grupo))
 
 
 def remover_usuario(id_user, id_group):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-    DELETE FROM USERS 
-    WHERE id_user = ? and grupo = ?
-    ''', (id_user, id_group,))
-    
-    # Salvar as alterações
-    conn.commit()
+    with transaction() as cursor:
+        cursor.execute('''
+        DELETE FROM USERS 
+        WHERE id_user = ? and grupo = ?
+        ''', (id_user, id_group,))
 
 def verificar_expirados(grupo):
-    data_atual = datetime.now()
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-    SELECT id_user, data_expiracao FROM USERS 
-    WHERE grupo = ?
-    ''', (grupo,))
-
-    expirados = []
-    
-    for id_user, data_expiracao in cursor.fetchall():
-        # Converter a data de expiração para objeto datetime
-        data_expiracao_dt = datetime.strptime(data_expiracao, '%Y-%m-%d %H:%M:%S')
-        
-        # Verificar se o usuário está expirado
-        if data_expiracao_dt < data_atual:
-            print(expirados)
-            expirados.append(id_user)
-    
-    return expirados
+    rows = fetch_all('''
+    SELECT id_user FROM USERS 
+    WHERE grupo = ? AND expiracao_at < ?
+    ''', (grupo, int(time.time())))
+    return [row[0] for row in rows]
+
+def get_due_expirations(grupo, until, limit=500):
+    """Retorna (id_user, grupo, epoch) das expirações do grupo até o epoch `until`, da mais próxima para a mais distante"""
+    return fetch_all('''
+    SELECT id_user, grupo, expiracao_at FROM USERS
+    WHERE grupo = ? AND expiracao_at <= ?
+    ORDER BY expiracao_at
+    LIMIT ?
+    ''', (grupo, until, limit))
+
+def get_user_latest_expiration(id_user, grupo):
+    """Retorna o epoch da expiração mais distante do usuário no grupo (ou None)"""
+    result = fetch_one('SELECT MAX(expiracao_at) FROM USERS WHERE id_user = ? AND grupo = ?', (id_user, grupo))
+    return result[0] if result else None
+
+def remover_expiracoes_vencidas(id_user, grupo):
+    """Remove apenas as linhas já vencidas do usuário (quando ele renovou e ainda tem acesso)"""
+    with transaction() as cursor:
+        cursor.execute('''
+        DELETE FROM USERS
+        WHERE id_user = ? AND grupo = ? AND expiracao_at < ?
+        ''', (id_user, grupo, int(time.time())))
 
 
 def get_user_expiration(id_user, grupo):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM USERS WHERE "id_user" = ? and grupo = ?', (id_user, grupo,))
-    result = cursor.fetchone()
+    result = fetch_one('SELECT * FROM USERS WHERE "id_user" = ? and grupo = ?', (id_user, grupo,))
     if result and len(result) > 0:
-        conn.close()
         return result[0]
     else:
         return False
@@ -416,149 +830,262 @@ def get_user_expiration(id_user, grupo):
 
 def count_payments():
     try:
-        conn = sqlite3.connect("data.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM PAYMENTS")
-        count = cursor.fetchone()[0]
-        
-        return count
+        return fetch_one("SELECT COUNT(*) FROM PAYMENTS")[0]
     except sqlite3.Error as e:
         print(f"Erro ao acessar o banco de dados: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
-
-def create_payment(chat, plano, nome_plano, bot, status='idle', trans_id='false'):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    id  = count_payments()
-    cursor.execute(
-        "INSERT INTO PAYMENTS (id, trans_id, chat, plano, bot, status) VALUES (?, ?, ?, ?, ?, ?)",
-        (id, trans_id, chat, json.dumps(plano), bot, status,)
-    )
+
+# Campos do plano cadastrado no /planos; o resto vai para os overrides do pagamento
+PLAN_BASE_KEYS = ('name', 'value', 'time', 'time_type')
+_plan_version_ids = {}  # (bot, digest) -> (id em PLAN_VERSIONS, quando entrou no cache)
+_plan_versions = {}  # id -> plano base (versões nunca mudam depois de gravadas)
+# Validade (segundos) do id em cache. Cada ida ao banco marca PLAN_VERSIONS.used_at,
+# e só versões sem pagamentos e sem uso há PLAN_VERSION_GRACE são apagadas: nenhum
+# processo pode estar com o id delas em cache.
+PLAN_VERSION_CACHE_TTL = 3600
+PLAN_VERSION_GRACE = 2 * PLAN_VERSION_CACHE_TTL
+
+def _plan_version(bot, base):
+    """Id da versão do plano base, gravando-a na primeira vez"""
+    plan_json = json.dumps(base, sort_keys=True)
+    key = (str(bot), hashlib.sha256(plan_json.encode()).hexdigest())
+    now = int(time.time())
+    cached = _plan_version_ids.get(key)
+    if cached and now - cached[1] < PLAN_VERSION_CACHE_TTL:
+        return cached[0]
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT OR IGNORE INTO PLAN_VERSIONS (bot, digest, plan, created_at, used_at) VALUES (?, ?, ?, ?, ?)
+        """, (*key, plan_json, time.time(), now))
+        cursor.execute("UPDATE PLAN_VERSIONS SET used_at = ? WHERE bot = ? AND digest = ? RETURNING id", (now, *key))
+        version_id = cursor.fetchone()[0]
+    # Só entra no cache depois do commit
+    _plan_version_ids[key] = (version_id, now)
+    return version_id
+
+def delete_unused_plan_versions(bot_id=None):
+    """Apaga as versões de plano sem pagamentos e sem uso há PLAN_VERSION_GRACE (só do bot, se informado)"""
+    with transaction() as cursor:
+        cursor.execute(f"""
+            DELETE FROM PLAN_VERSIONS
+            WHERE used_at < ? {'AND bot = ?' if bot_id is not None else ''}
+            AND NOT EXISTS (SELECT 1 FROM PAYMENTS WHERE plan_version = PLAN_VERSIONS.id)
+        """, (int(time.time()) - PLAN_VERSION_GRACE, *([str(bot_id)] if bot_id is not None else [])))
+        return cursor.rowcount
+
+def _encode_plan(bot, plano):
+    """(plan_version, plan_overrides) do plano efetivo de um pagamento"""
+    base = {key: plano[key] for key in PLAN_BASE_KEYS if key in plano}
+    # Ofertas com desconto e order bump apontam para o plano com o valor cadastrado
+    for key in ('original_value', 'valor_original'):
+        if key in plano:
+            base['value'] = plano[key]
+            break
+    overrides = {key: value for key, value in plano.items() if key not in base or base[key] != value}
+    return _plan_version(bot, base), (json.dumps(overrides) if overrides else None)
+
+def _get_plan_version(version_id):
+    if version_id not in _plan_versions:
+        _plan_versions[version_id] = json.loads(fetch_one("SELECT plan FROM PLAN_VERSIONS WHERE id = ?", (version_id,))[0])
+    return _plan_versions[version_id]
+
+def get_payment_plan(payment):
+    """Plano efetivo de uma linha de PAYMENTS (SELECT *): versão do plano + overrides, ou o JSON antigo"""
+    if payment[6] is None:
+        return json.loads(payment[3])
+    plano = dict(_get_plan_version(payment[6]))
+    if payment[7]:
+        plano.update(json.loads(payment[7]))
+    return plano
+
+def create_payment(chat, plano, nome_plano, bot, status='idle', trans_id=None):
+    plan_version, plan_overrides = _encode_plan(bot, plano)
+    with transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO PAYMENTS (trans_id, chat, bot, status, plan_version, plan_overrides, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (trans_id, chat, bot, status, plan_version, plan_overrides, int(time.time()),)
+        )
+        # O id é alocado pelo próprio SQLite na mesma transação do INSERT
+        id = cursor.lastrowid
     print('criei um pagamento')
-    conn.commit()
-    conn.close()
     return id
 
-
-
-def update_payment_status(id, status):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    id = str(id)
-    cursor.execute("UPDATE PAYMENTS SET status = ? WHERE trans_id = ?", (status, id))
-    conn.commit()
-    conn.close()
-
-def update_payment_id(id, trans):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    id = str(id)
-    cursor.execute("UPDATE PAYMENTS SET trans_id = ? WHERE id = ?", (trans, id))
-    conn.commit()
-    conn.close()
+# Intervalo mínimo (segundos) entre duas atualizações do used_at da mesma campanha
+CAMPAIGN_TOUCH_INTERVAL = 86400
+
+def create_campaign(bot, plans):
+    """Id da campanha com estes planos (já com desconto); reaproveita a existente se for igual"""
+    plans_json = json.dumps(plans, sort_keys=True)
+    digest = hashlib.sha256(plans_json.encode()).hexdigest()
+    now = time.time()
+    # Recuperações e disparos repetem os mesmos planos: na maioria das vezes é só leitura
+    row = fetch_one("SELECT id, used_at FROM CAMPAIGNS WHERE bot = ? AND digest = ?", (str(bot), digest))
+    if row:
+        # Campanha reaproveitada não pode ser expirada pela retenção (no máximo uma escrita por dia)
+        if (row[1] or 0) < now - CAMPAIGN_TOUCH_INTERVAL:
+            with transaction() as cursor:
+                cursor.execute("UPDATE CAMPAIGNS SET used_at = ? WHERE id = ?", (int(now), row[0]))
+        return row[0]
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT OR IGNORE INTO CAMPAIGNS (bot, digest, plans, created_at, used_at) VALUES (?, ?, ?, ?, ?)
+        """, (str(bot), digest, plans_json, now, int(now)))
+        cursor.execute("SELECT id FROM CAMPAIGNS WHERE bot = ? AND digest = ?", (str(bot), digest))
+        return cursor.fetchone()[0]
+
+def get_campaign_plan(bot, campaign_id, plan_index):
+    """Plano oferecido pela campanha do bot, ou None se não existir"""
+    row = fetch_one("SELECT plans FROM CAMPAIGNS WHERE id = ? AND bot = ?", (campaign_id, str(bot)))
+    if row is None:
+        return None
+    plans = json.loads(row[0])
+    return plans[plan_index] if 0 <= plan_index < len(plans) else None
+
+def delete_unused_campaigns(before):
+    """Apaga as campanhas sem disparo/recuperação desde before (epoch); os botões antigos viram oferta expirada"""
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM CAMPAIGNS WHERE used_at < ?", (int(before),))
+        return cursor.rowcount
+
+
+
+# Máquina de estados do pagamento: status atual -> status permitidos a seguir.
+#   idle -> waiting (PIX gerado) -> paid (webhook) -> delivering (reservado) -> finished
+# Cada mudança é um UPDATE condicionado ao status atual, então só um processo
+# (webhook repetido, outro host, task reiniciada) consegue fazer cada transição.
+# A devolução delivering -> paid após uma falha fica só em release_payment.
+PAYMENT_TRANSITIONS = {
+    'idle': ('waiting', 'paid'),          # PIX antigo gravado sem passar para waiting
+    'waiting': ('waiting', 'paid'),       # novo PIX para o mesmo pagamento
+    'paid': ('delivering',),
+    'delivering': ('finished',),
+}
+# Reserva sem conclusão depois deste tempo (segundos) volta para a fila: o processador caiu
+CLAIM_TIMEOUT = 600
+# Espera antes de tentar de novo uma entrega que falhou: dobra a cada falha, até 2^6 vezes
+RETRY_DELAY = 60
+RETRY_MAX_SHIFT = 6
+
+def _from_statuses(status):
+    """Status dos quais se pode chegar em status"""
+    return tuple(source for source, targets in PAYMENT_TRANSITIONS.items() if status in targets)
+
+def _transition(cursor, status, where, params, extra=''):
+    """UPDATE condicional para status; retorna as linhas que de fato mudaram"""
+    sources = _from_statuses(status)
+    cursor.execute(f"""
+        UPDATE PAYMENTS SET status = ?{extra}
+        WHERE {where} AND status IN ({', '.join('?' * len(sources))})
+        RETURNING *
+    """, (status, *params, *sources))
+    return cursor.fetchall()
+
+def set_payment_waiting(payment_id, trans_id):
+    """Grava a transação do PIX gerado; False se o pagamento já foi pago"""
+    with transaction() as cursor:
+        return bool(_transition(cursor, 'waiting', "id = ?", (trans_id, str(payment_id)), extra=", trans_id = ?"))
+
+def mark_payment_paid(trans_id):
+    """Confirmação do gateway; retorna o pagamento só na primeira vez (webhooks repetidos viram None)"""
+    with transaction() as cursor:
+        rows = _transition(cursor, 'paid', "trans_id = ?", (str(trans_id),))
+    return rows[0] if rows else None
+
+def claim_paid_payments(bot_id, limit):
+    """Reserva até limit pagamentos pagos do bot para entrega; cada um sai para um único processador.
+
+    Reservas mais antigas que CLAIM_TIMEOUT são retomadas na mesma consulta.
+    """
+    now = int(time.time())
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE PAYMENTS SET status = 'delivering', claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM PAYMENTS
+                WHERE bot = ? AND (
+                    (status = 'paid' AND (retry_at IS NULL OR retry_at <= ?))
+                    OR (status = 'delivering' AND claimed_at < ?)
+                )
+                LIMIT ?
+            )
+            RETURNING *
+        """, (now, str(bot_id), now, now - CLAIM_TIMEOUT, limit))
+        return cursor.fetchall()
+
+def finish_payment(payment_id, access=None):
+    """Entrega concluída; a venda entra nos contadores na mesma transação.
+
+    access são os argumentos de add_user_to_expiration: o acesso é gravado junto
+    com o finished, então um pagamento nunca gera duas linhas em USERS.
+    Retorna False se o pagamento já não estava reservado (outro processo concluiu).
+    """
+    with transaction() as cursor:
+        rows = _transition(cursor, 'finished', "id = ?", (payment_id,))
+        for payment in rows:
+            if access:
+                add_user_to_expiration(*access)
+            _bump_counters(cursor, payment[4], sales=1, revenue=get_payment_plan(payment).get('value', 0))
+    return bool(rows)
+
+def release_payment(payment_id):
+    """Devolve um pagamento reservado para a fila quando a entrega falhou, com espera crescente"""
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE PAYMENTS
+            SET status = 'paid', claimed_at = NULL, attempts = attempts + 1,
+                retry_at = ? + ? * (1 << MIN(attempts, ?))
+            WHERE id = ? AND status = 'delivering'
+        """, (int(time.time()), RETRY_DELAY, RETRY_MAX_SHIFT, payment_id))
+        return cursor.rowcount > 0
 
 def get_payment_by_trans_id(id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE trans_id = ?", (id,))
-    payment = cursor.fetchone()
-    conn.close()
-    return payment
+    return fetch_one("SELECT * FROM PAYMENTS WHERE trans_id = ?", (id,))
 
 
 def get_payment_by_id(id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE id = ?", (id,))
-    payment = cursor.fetchone()
-    conn.close()
-    return payment
+    return fetch_one("SELECT * FROM PAYMENTS WHERE id = ?", (id,))
 
 def get_payment_plan_by_id(id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT plano FROM PAYMENTS WHERE id = ?", (id,))
-    payment = cursor.fetchone()
-    conn.close()
-    return payment[0]
-
-
-def get_payment_by_chat(id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE chat = ?", (id,))
-    payment = cursor.fetchone()
-    conn.close()
-    return payment
+    """Plano do pagamento, ou None se ele não existe mais (arquivado pela retenção)"""
+    payment = get_payment_by_id(id)
+    return get_payment_plan(payment) if payment else None
 
 
 def get_payment_by_chat(id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE chat = ?", (id,))
-    payment = cursor.fetchone()
-    conn.close()
-    return payment
+    return fetch_one("SELECT * FROM PAYMENTS WHERE chat = ?", (id,))
 
 def get_payments_by_status(status, bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE status = ? AND bot = ?", (status, bot_id,))
-    payment = cursor.fetchall()
-    conn.close()
-    return payment
+    return fetch_all("SELECT * FROM PAYMENTS WHERE status = ? AND bot = ?", (status, bot_id,))
 
 def get_all_payments_by_status(status):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM PAYMENTS WHERE status = ?", (status,))
-    payment = cursor.fetchall()
-    conn.close()
-    return payment
+    return fetch_all("SELECT * FROM PAYMENTS WHERE status = ?", (status,))
+
+# Contadores do dashboard (tabela COUNTERS): por bot e no escopo global
+GLOBAL_SCOPE = '*'
+COUNTER_NAMES = ('bots', 'users', 'sales', 'revenue')
+
+def _bump_counters(cursor, scope, **deltas):
+    """Soma os deltas no escopo e no global, dentro da transação que mudou os dados"""
+    scopes = {str(scope), GLOBAL_SCOPE}
+    cursor.executemany("""
+        INSERT INTO COUNTERS (scope, name, value) VALUES (?, ?, ?)
+        ON CONFLICT (scope, name) DO UPDATE SET value = value + excluded.value
+    """, [(s, name, delta) for s in scopes for name, delta in deltas.items() if delta])
+
+def get_counters(scope=GLOBAL_SCOPE):
+    """{'bots', 'users', 'sales', 'revenue'} de um bot (id) ou do sistema todo"""
+    counters = dict.fromkeys(COUNTER_NAMES, 0)
+    counters.update(fetch_all("SELECT name, value FROM COUNTERS WHERE scope = ?", (str(scope),)))
+    return counters
 
 # ADICIONAR NO FINAL DO ARQUIVO manager.py
 
 def update_bot_orderbump(bot_id, orderbump):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    # Primeiro, verifica se a coluna orderbump existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'orderbump' not in columns:
-        # Adiciona a coluna se não existir
-        cursor.execute("ALTER TABLE BOTS ADD COLUMN orderbump TEXT DEFAULT '{}'")
-        conn.commit()
-    
-    cursor.execute("UPDATE BOTS SET orderbump = ? WHERE id = ?", (json.dumps(orderbump), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'orderbump', json.dumps(orderbump))
 
 def get_bot_orderbump(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'orderbump' not in columns:
-        conn.close()
-        return []
-    
-    cursor.execute('SELECT "orderbump" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result and result[0]:
-        conn.close()
-        try:
-            return json.loads(result[0])
-        except:
-            return []
-    return []
+    snapshot = get_bot_snapshot(bot_id)
+    return snapshot.orderbump if snapshot else []
 
 def add_orderbump_to_plan(bot_id, plan_index, orderbump_data):
     """Adiciona order bump a um plano específico"""
@@ -589,121 +1116,63 @@ def get_orderbump_by_plan(bot_id, plan_index):
 
 def update_payment_plan(payment_id, plan):
     """Atualiza o plano de um pagamento"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE PAYMENTS SET plano = ? WHERE id = ?", (json.dumps(plan), payment_id))
-    conn.commit()
-    conn.close()
+    payment = fetch_one("SELECT bot FROM PAYMENTS WHERE id = ?", (payment_id,))
+    if payment is None:
+        return
+    plan_version, plan_overrides = _encode_plan(payment[0], plan)
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE PAYMENTS SET plano = NULL, plan_version = ?, plan_overrides = ? WHERE id = ?
+        """, (plan_version, plan_overrides, payment_id))
     
 # ADICIONAR NO FINAL DO ARQUIVO manager.py
 
 def update_bot_downsell(bot_id, downsell):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna downsell existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'downsell' not in columns:
-        # Adiciona a coluna se não existir
-        cursor.execute("ALTER TABLE BOTS ADD COLUMN downsell TEXT DEFAULT '{}'")
-        conn.commit()
-    
-    cursor.execute("UPDATE BOTS SET downsell = ? WHERE id = ?", (json.dumps(downsell), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'downsell', json.dumps(downsell))
 
 def get_bot_downsell(bot_id):
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'downsell' not in columns:
-        conn.close()
-        return {}
-    
-    cursor.execute('SELECT "downsell" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result and result[0]:
-        conn.close()
-        try:
-            return json.loads(result[0])
-        except:
-            return {}
-    return {}
-
-# Tabela para rastrear recuperações em andamento
-def create_recovery_tracking_table():
-    """Cria tabela para rastrear recuperações em andamento"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS RECOVERY_TRACKING (
-            user_id TEXT,
-            bot_id TEXT,
-            start_time TEXT,
-            recovery_index INTEGER,
-            status TEXT,
-            PRIMARY KEY (user_id, bot_id)
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    snapshot = get_bot_snapshot(bot_id)
+    return snapshot.downsell if snapshot else {}
 
 def start_recovery_tracking(user_id, bot_id):
     """Inicia o rastreamento de recuperação para um usuário"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se já existe um rastreamento ativo
-    cursor.execute("""
-        SELECT * FROM RECOVERY_TRACKING 
-        WHERE user_id = ? AND bot_id = ? AND status = 'active'
-    """, (user_id, bot_id))
-    
-    existing = cursor.fetchone()
-    
-    if existing:
-        # Já existe rastreamento ativo, não faz nada
-        conn.close()
-        return False
-    
-    # Remove rastreamentos antigos inativos
-    cursor.execute("""
-        DELETE FROM RECOVERY_TRACKING 
-        WHERE user_id = ? AND bot_id = ? AND status != 'active'
-    """, (user_id, bot_id))
-    
-    # Insere novo rastreamento
-    cursor.execute("""
-        INSERT INTO RECOVERY_TRACKING (user_id, bot_id, start_time, recovery_index, status)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, bot_id, datetime.now().isoformat(), -1, 'active'))
+    with transaction() as cursor:
+        # Verifica se já existe um rastreamento ativo
+        cursor.execute("""
+            SELECT * FROM RECOVERY_TRACKING 
+            WHERE user_id = ? AND bot_id = ? AND status = 'active'
+        """, (user_id, bot_id))
+        
+        existing = cursor.fetchone()
+        
+        if existing:
+            # Já existe rastreamento ativo, não faz nada
+            return False
+        
+        # Remove rastreamentos antigos inativos
+        cursor.execute("""
+            DELETE FROM RECOVERY_TRACKING 
+            WHERE user_id = ? AND bot_id = ? AND status != 'active'
+        """, (user_id, bot_id))
+        
+        # Insere novo rastreamento
+        cursor.execute("""
+            INSERT INTO RECOVERY_TRACKING (user_id, bot_id, started_at, recovery_index, status)
+            VALUES (?, ?, ?, ?, ?)
+        """, (user_id, bot_id, int(time.time()), -1, 'active'))
     
-    conn.commit()
-    conn.close()
     return True
 
 def stop_recovery_tracking(user_id, bot_id):
     """Para o rastreamento de recuperação (quando compra ou cancela)"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE RECOVERY_TRACKING 
-        SET status = 'completed' 
-        WHERE user_id = ? AND bot_id = ? AND status = 'active'
-    """, (user_id, bot_id))
-    
-    rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE RECOVERY_TRACKING 
+            SET status = 'completed' 
+            WHERE user_id = ? AND bot_id = ? AND status = 'active'
+        """, (user_id, bot_id))
+        
+        rows_affected = cursor.rowcount
     
     if rows_affected > 0:
         print(f"Rastreamento de recuperação parado para usuário {user_id}")
@@ -712,69 +1181,25 @@ def stop_recovery_tracking(user_id, bot_id):
 
 def get_recovery_tracking(user_id, bot_id):
     """Retorna o status de rastreamento de recuperação"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM RECOVERY_TRACKING WHERE user_id = ? AND bot_id = ? AND status = 'active'", (user_id, bot_id))
-    result = cursor.fetchone()
-    
-    conn.close()
-    return result
+    return fetch_one("SELECT * FROM RECOVERY_TRACKING WHERE user_id = ? AND bot_id = ? AND status = 'active'", (user_id, bot_id))
 
 def update_recovery_tracking_index(user_id, bot_id, recovery_index):
     """Atualiza o índice da última recuperação enviada"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE RECOVERY_TRACKING 
-        SET recovery_index = ? 
-        WHERE user_id = ? AND bot_id = ? AND status = 'active'
-    """, (recovery_index, user_id, bot_id))
-    
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("""
+            UPDATE RECOVERY_TRACKING 
+            SET recovery_index = ? 
+            WHERE user_id = ? AND bot_id = ? AND status = 'active'
+        """, (recovery_index, user_id, bot_id))
     
 def update_bot_scheduled_broadcasts(bot_id, broadcasts):
     """Atualiza os disparos programados de um bot"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna scheduled_broadcasts existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'scheduled_broadcasts' not in columns:
-        # Adiciona a coluna se não existir
-        cursor.execute("ALTER TABLE BOTS ADD COLUMN scheduled_broadcasts TEXT DEFAULT '[]'")
-        conn.commit()
-    
-    cursor.execute("UPDATE BOTS SET scheduled_broadcasts = ? WHERE id = ?", (json.dumps(broadcasts), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'scheduled_broadcasts', json.dumps(broadcasts))
 
 def get_bot_scheduled_broadcasts(bot_id):
     """Retorna os disparos programados de um bot"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'scheduled_broadcasts' not in columns:
-        conn.close()
-        return []
-    
-    cursor.execute('SELECT "scheduled_broadcasts" FROM BOTS WHERE "id" = ?', (bot_id,))
-    result = cursor.fetchone()
-    if result and result[0]:
-        conn.close()
-        try:
-            return json.loads(result[0])
-        except:
-            return []
-    return []
+    snapshot = get_bot_snapshot(bot_id)
+    return snapshot.scheduled_broadcasts if snapshot else []
 
 def add_scheduled_broadcast(bot_id, broadcast_data):
     """Adiciona um disparo programado"""
@@ -806,27 +1231,13 @@ def remove_scheduled_broadcast(bot_id, broadcast_id):
 
 def get_all_bots_with_scheduled_broadcasts():
     """Retorna todos os bots que têm disparos programados"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'scheduled_broadcasts' not in columns:
-        conn.close()
-        return []
-    
-    cursor.execute("""
+    results = fetch_all("""
         SELECT id, token, scheduled_broadcasts 
         FROM BOTS 
         WHERE scheduled_broadcasts != '[]' 
         AND scheduled_broadcasts IS NOT NULL
     """)
     
-    results = cursor.fetchall()
-    conn.close()
-    
     bots_with_broadcasts = []
     for bot_id, token, broadcasts_json in results:
         try:
@@ -844,104 +1255,51 @@ def get_all_bots_with_scheduled_broadcasts():
 
 def update_bot_last_activity(bot_id):
     """Atualiza a última atividade do bot (quando recebe /start)"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'last_activity' not in columns:
-        # Adiciona a coluna se não existir
-        cursor.execute("ALTER TABLE BOTS ADD COLUMN last_activity TEXT DEFAULT NULL")
-        conn.commit()
-    
-    # Atualiza com timestamp atual
-    cursor.execute("UPDATE BOTS SET last_activity = ? WHERE id = ?", 
-                   (datetime.now().isoformat(), bot_id))
-    conn.commit()
-    conn.close()
+    _update_bot_column(bot_id, 'last_activity_at', int(time.time()))
 
 def get_inactive_bots(minutes=21600):
     """Retorna bots inativos há mais de X minutos"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'last_activity' not in columns:
-        conn.close()
-        return []
-    
     # Calcula o tempo limite
-    from datetime import datetime, timedelta
-    time_limit = datetime.now() - timedelta(minutes=minutes)
+    time_limit = int(time.time()) - minutes * 60
     
-    # IMPORTANTE: Só pega bots que TÊM last_activity E é antiga
-    # Ignora completamente bots com last_activity NULL
-    cursor.execute("""
-        SELECT id, token, owner, last_activity 
+    # IMPORTANTE: Só pega bots que TÊM last_activity_at E é antiga
+    # (NULL nunca é menor que o limite, então bots sem atividade ficam de fora)
+    inactive_bots = fetch_all("""
+        SELECT id, token, owner, last_activity_at 
         FROM BOTS 
-        WHERE last_activity IS NOT NULL 
-        AND last_activity != ''
-        AND last_activity < ?
-    """, (time_limit.isoformat(),))
-    
-    inactive_bots = cursor.fetchall()
-    conn.close()
+        WHERE last_activity_at < ?
+    """, (time_limit,))
     
     print(f"[get_inactive_bots] Encontrados {len(inactive_bots)} bots inativos")
     for bot in inactive_bots:
-        print(f"  - Bot {bot[0]}: last_activity = {bot[3]}")
+        print(f"  - Bot {bot[0]}: last_activity_at = {datetime.fromtimestamp(bot[3])}")
     
     return inactive_bots
 
 def mark_all_bots_active():
     """Marca todos os bots existentes como ativos agora (para não deletar bots antigos)"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(BOTS)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'last_activity' not in columns:
-        cursor.execute("ALTER TABLE BOTS ADD COLUMN last_activity TEXT DEFAULT NULL")
-        conn.commit()
-    
-    # Atualiza todos os bots sem última atividade
-    cursor.execute("""
-        UPDATE BOTS 
-        SET last_activity = ? 
-        WHERE last_activity IS NULL
-    """, (datetime.now().isoformat(),))
-    
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        # Atualiza todos os bots sem última atividade
+        cursor.execute("""
+            UPDATE BOTS 
+            SET last_activity_at = ? 
+            WHERE last_activity_at IS NULL
+        """, (int(time.time()),))
     
 def create_recovery_message(bot_id, name, media, text, discount, delay):
     """Cria uma nova mensagem de recuperação"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO RECOVERY_MESSAGES (bot_id, name, media, text, discount, delay)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (bot_id, name, json.dumps(media) if media else None, text, discount, delay))
-    
-    conn.commit()
-    recovery_id = cursor.lastrowid
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT INTO RECOVERY_MESSAGES (bot_id, name, media, text, discount, delay)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (bot_id, name, json.dumps(media) if media else None, text, discount, delay))
+        
+        recovery_id = cursor.lastrowid
     return recovery_id
 
 def get_all_recovery_messages(bot_id):
     """Retorna todas as recuperações de um bot ordenadas por delay"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+    rows = fetch_all("""
         SELECT id, name, media, text, discount, delay 
         FROM RECOVERY_MESSAGES 
         WHERE bot_id = ? 
@@ -949,7 +1307,7 @@ def get_all_recovery_messages(bot_id):
     """, (bot_id,))
     
     recoveries = []
-    for row in cursor.fetchall():
+    for row in rows:
         recoveries.append({
             'id': row[0],
             'name': row[1],
@@ -959,26 +1317,13 @@ def get_all_recovery_messages(bot_id):
             'delay': row[5]
         })
     
-    conn.close()
     return recoveries
 
 def delete_recovery_message(recovery_id):
     """Remove uma recuperação específica"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM RECOVERY_MESSAGES WHERE id = ?", (recovery_id,))
-    
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM RECOVERY_MESSAGES WHERE id = ?", (recovery_id,))
 
 def count_recovery_messages(bot_id):
     """Conta quantas recuperações um bot tem"""
-    conn = sqlite3.connect("data.db")
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM RECOVERY_MESSAGES WHERE bot_id = ?", (bot_id,))
-    count = cursor.fetchone()[0]
-    
-    conn.close()
-    return count
+    return fetch_one("SELECT COUNT(*) FROM RECOVERY_MESSAGES WHERE bot_id = ?", (bot_id,))[0]
@@ -0,0 +1,34 @@
+import hashlib, hmac, os
+
+# Botões de oferta dos disparos e recuperações carregam só a referência da
+# oferta (campanha + índice do plano), assinada para o usuário que a recebeu.
+# O pagamento é criado quando o usuário clica, não para cada destinatário.
+# Chave obrigatória e sem valor padrão: com uma chave pública qualquer um montaria
+# o callback de qualquer campanha/plano
+OFFER_SECRET = os.environ.get("OFFER_SECRET", "")
+if not OFFER_SECRET:
+    raise RuntimeError("OFFER_SECRET não definido: defina um segredo aleatório para assinar os botões de oferta")
+# Caracteres hex da assinatura: cabe com folga no limite de 64 bytes do callback_data
+SIGNATURE_SIZE = 10
+
+
+def _signature(bot_id, campaign_id, plan_index, user_id):
+    message = f"{bot_id}:{campaign_id}:{plan_index}:{user_id}".encode()
+    return hmac.new(OFFER_SECRET.encode(), message, hashlib.sha256).hexdigest()[:SIGNATURE_SIZE]
+
+
+def callback_data(bot_id, campaign_id, plan_index, user_id, prefix='oferta'):
+    """<prefix>_<campanha>_<plano>_<assinatura>"""
+    return f"{prefix}_{campaign_id}_{plan_index}_{_signature(bot_id, campaign_id, plan_index, user_id)}"
+
+
+def parse(data, bot_id, user_id):
+    """(campanha, índice do plano) se o callback_data for uma oferta válida para o usuário, senão None"""
+    parts = data.split('_')
+    try:
+        campaign_id, plan_index, signature = int(parts[-3]), int(parts[-2]), parts[-1]
+    except (IndexError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _signature(bot_id, campaign_id, plan_index, user_id)):
+        return None
+    return campaign_id, plan_index
@@ -0,0 +1,48 @@
+import asyncio, time
+
+
+class TokenBucket:
+    """Limita a taxa de chamadas à Bot API: rate fichas por segundo, rajadas até capacity.
+
+    A taxa se adapta: cai pela metade a cada 429 (pause) e volta a subir aos
+    poucos a cada chamada bem sucedida (success), até a taxa configurada.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.5):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        """Espera até haver fichas suficientes (chamadores são atendidos em ordem)"""
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        """O Telegram pediu para esperar (RetryAfter): segura as chamadas e reduz a taxa"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
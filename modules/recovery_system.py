@@ -2,13 +2,14 @@ import asyncio
 import json
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-import modules.manager as manager
+import modules.async_manager as amanager
+import modules.offers as offers
 
 async def send_recovery(context, user_id, recovery_data, bot_id):
     """Envia uma recuperação específica para o usuário"""
     try:
         # Pega os planos do bot
-        planos = manager.get_bot_plans(bot_id)
+        planos = await amanager.get_bot_plans(bot_id)
         if not planos:
             return False
         
@@ -16,7 +17,8 @@ async def send_recovery(context, user_id, recovery_data, bot_id):
         desconto = recovery_data['discount']
         
         # Monta os botões dos planos com desconto
-        keyboard_plans = []
+        botoes = []
+        planos_recovery = []
         for plan_index in range(len(planos)):
             plano = planos[plan_index]
             valor_original = plano['value']
@@ -35,12 +37,18 @@ async def send_recovery(context, user_id, recovery_data, bot_id):
             plano_recovery['recovery_name'] = recovery_data['name']
             plano_recovery['original_value'] = valor_original
             plano_recovery['discount'] = desconto
-            
-            # Cria o pagamento com o plano modificado
-            payment_id = manager.create_payment(user_id, plano_recovery, f"{plano['name']} - Recovery", bot_id)
-            
-            # Gera PIX direto
-            keyboard_plans.append([InlineKeyboardButton(botao_texto, callback_data=f"pagar_{payment_id}")])
+            botoes.append(botao_texto)
+            planos_recovery.append(plano_recovery)
+        
+        # Mesmos planos e desconto para todos: a campanha é reaproveitada e o
+        # pagamento só é criado quando o usuário clica
+        campaign_id = await amanager.create_campaign(bot_id, planos_recovery)
+        
+        # Gera PIX direto
+        keyboard_plans = [
+            [InlineKeyboardButton(botao_texto, callback_data=offers.callback_data(bot_id, campaign_id, plan_index, user_id))]
+            for plan_index, botao_texto in enumerate(botoes)
+        ]
         
         reply_markup = InlineKeyboardMarkup(keyboard_plans)
         
@@ -91,7 +99,7 @@ async def process_recovery_sequence(context, user_id, bot_id):
     """Processa a sequência de recuperações para um usuário"""
     try:
         # Pega todas as recuperações do bot
-        recoveries = manager.get_all_recovery_messages(bot_id)
+        recoveries = await amanager.get_all_recovery_messages(bot_id)
         if not recoveries:
             print(f"Nenhuma recuperação configurada para bot {bot_id}")
             return
@@ -106,7 +114,7 @@ async def process_recovery_sequence(context, user_id, bot_id):
             await asyncio.sleep(delay_seconds)
             
             # Verifica se o usuário ainda está sendo rastreado (não comprou)
-            tracking = manager.get_recovery_tracking(user_id, bot_id)
+            tracking = await amanager.get_recovery_tracking(user_id, bot_id)
             if not tracking or tracking[4] != 'active':
                 print(f"Recuperação cancelada para usuário {user_id} - já comprou ou foi cancelado")
                 return
@@ -120,34 +128,31 @@ async def process_recovery_sequence(context, user_id, bot_id):
                 print(f"Erro ao enviar recuperação '{recovery['name']}' para usuário {user_id}")
         
         # Após enviar todas as recuperações, para o tracking
-        manager.stop_recovery_tracking(user_id, bot_id)
+        await amanager.stop_recovery_tracking(user_id, bot_id)
         print(f"Ciclo de recuperação completo para usuário {user_id}")
             
     except Exception as e:
         print(f"Erro no processo de recuperação: {e}")
         # Em caso de erro, para o tracking
-        manager.stop_recovery_tracking(user_id, bot_id)
+        await amanager.stop_recovery_tracking(user_id, bot_id)
 
-def start_recovery_for_user(context, user_id, bot_id):
+async def start_recovery_for_user(context, user_id, bot_id):
     """Inicia o processo de recuperação para um usuário"""
-    # Cria a tabela se não existir
-    manager.create_recovery_tracking_table()
-    
     # Verifica se já existe um rastreamento ativo
-    existing_tracking = manager.get_recovery_tracking(user_id, bot_id)
+    existing_tracking = await amanager.get_recovery_tracking(user_id, bot_id)
     
     if existing_tracking:
         print(f"Usuário {user_id} já tem recuperação ativa - ignorando novo /start")
         return
     
     # Verifica se há recuperações configuradas
-    recoveries = manager.get_all_recovery_messages(bot_id)
+    recoveries = await amanager.get_all_recovery_messages(bot_id)
     if not recoveries:
         print(f"Nenhuma recuperação configurada para bot {bot_id}")
         return
     
     # Inicia o rastreamento
-    manager.start_recovery_tracking(user_id, bot_id)
+    await amanager.start_recovery_tracking(user_id, bot_id)
     
     # Cria uma task assíncrona para processar as recuperações
     asyncio.create_task(process_recovery_sequence(context, user_id, bot_id))
@@ -0,0 +1,120 @@
+"""Retenção da tabela PAYMENTS.
+
+Pagamentos que nunca foram pagos ('idle': oferta clicada sem gerar PIX;
+'waiting': PIX gerado e não pago) ficam parados para sempre. Depois de
+RETENTION_DAYS eles saem da tabela quente para arquivos mensais compactados
+(uma linha JSON por pagamento, agrupados pelo mês de criação) e o espaço é
+devolvido aos poucos com incremental_vacuum.
+"""
+import gzip, json, os, time
+
+from modules.database import get_connection, transaction
+import modules.manager as manager
+
+# Idade mínima (dias) de um pagamento parado para ser arquivado
+RETENTION_DAYS = int(os.environ.get("PAYMENT_RETENTION_DAYS", 30))
+# Pasta dos arquivos payments-AAAA-MM.jsonl.gz
+ARCHIVE_DIR = os.environ.get("PAYMENT_ARCHIVE_DIR", "archive")
+# Status que nunca viram venda
+STALE_STATUSES = ('idle', 'waiting')
+# Pagamentos por transação: lotes pequenos não seguram o lock de escrita
+BATCH_SIZE = 500
+# Páginas livres devolvidas ao sistema por execução
+VACUUM_PAGES = 2000
+# Intervalo entre execuções (segundos)
+RETENTION_INTERVAL = 3600
+
+# PRAGMA auto_vacuum = INCREMENTAL
+_INCREMENTAL = 2
+
+
+def enable_incremental_vacuum():
+    """Liga o auto_vacuum incremental; num banco existente exige um VACUUM (só na primeira vez)"""
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == _INCREMENTAL:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    print("[RETENÇÃO] auto_vacuum incremental ativado")
+    return True
+
+
+def _archive_path(created_at):
+    return os.path.join(ARCHIVE_DIR, time.strftime("payments-%Y-%m.jsonl.gz", time.localtime(created_at)))
+
+
+def _archive(rows, columns):
+    """Acrescenta os pagamentos (linhas do SELECT * e nomes das colunas) nos arquivos do mês; retorna {arquivo: quantidade}"""
+    by_file = {}
+    for row in rows:
+        record = dict(zip(columns, row))
+        # Guarda também o plano efetivo: o arquivo se basta sem o banco. Um plano
+        # ilegível não pode travar a retenção: vai só com as colunas brutas
+        try:
+            record['plan'] = manager.get_payment_plan(row)
+        except Exception as e:
+            print(f"[RETENÇÃO] Plano do pagamento {record['id']} ilegível: {e}")
+            record['plan'] = None
+        by_file.setdefault(_archive_path(record['created_at']), []).append(record)
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for path, records in by_file.items():
+        data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        # Cada append vira um novo membro gzip; zcat/gzip.open leem o arquivo inteiro
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as file:
+                file.write(data.encode('utf-8'))
+            # Só apaga do banco o que já está no disco
+            raw.flush()
+            os.fsync(raw.fileno())
+    return {path: len(records) for path, records in by_file.items()}
+
+
+def run_retention(now=None):
+    """Arquiva e apaga os pagamentos parados mais antigos que RETENTION_DAYS; retorna o relatório"""
+    started = time.monotonic()
+    cutoff = int(now or time.time()) - RETENTION_DAYS * 86400
+    report = {'archived': 0, 'batches': 0, 'files': {}, 'plan_versions': 0, 'campaigns': 0, 'freed_pages': 0}
+    placeholders = ', '.join('?' * len(STALE_STATUSES))
+
+    while True:
+        # SELECT *: o arquivo acompanha as colunas que as migrações acrescentarem
+        cursor = get_connection().execute(f"""
+            SELECT * FROM PAYMENTS
+            WHERE status IN ({placeholders}) AND created_at < ?
+            LIMIT ?
+        """, (*STALE_STATUSES, cutoff, BATCH_SIZE))
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        # Disco fora da transação: os bots não esperam o lock de escrita durante o gzip/fsync
+        for path, count in _archive(rows, columns).items():
+            report['files'][path] = report['files'].get(path, 0) + count
+        # O DELETE confere de novo o status: um pagamento que andou entre o SELECT e
+        # aqui fica no banco (e também no arquivo; o id identifica a duplicata)
+        with transaction() as cursor:
+            cursor.execute(f"""
+                DELETE FROM PAYMENTS
+                WHERE id IN ({', '.join('?' * len(rows))})
+                AND status IN ({placeholders}) AND created_at < ?
+            """, (*[row[0] for row in rows], *STALE_STATUSES, cutoff))
+            report['archived'] += cursor.rowcount
+        report['batches'] += 1
+
+    # Versões de plano que não têm mais pagamentos (os arquivados levam o plano junto)
+    report['plan_versions'] = manager.delete_unused_plan_versions()
+    # Campanhas que nenhum disparo/recuperação usa há RETENTION_DAYS
+    report['campaigns'] = manager.delete_unused_campaigns(cutoff)
+
+    conn = get_connection()
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+    report['freed_pages'] = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    print(f"[RETENÇÃO] {report['archived']} pagamentos arquivados em {report['batches']} lotes, "
+          f"{report['plan_versions']} versões de plano e {report['campaigns']} campanhas apagadas, "
+          f"{report['freed_pages']} páginas liberadas ({time.monotonic() - started:.1f}s)")
+    for path, count in report['files'].items():
+        print(f"  - {path}: {count}")
+    return report
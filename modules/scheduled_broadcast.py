@@ -2,7 +2,8 @@ import asyncio
 import json
 from datetime import datetime, time
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-import modules.manager as manager
+import modules.async_manager as amanager
+import modules.offers as offers
 from datetime import datetime, time, timezone, timedelta
 import pytz
 from telegram.error import BadRequest, Forbidden, TelegramError, RetryAfter
@@ -17,12 +18,12 @@ async def send_scheduled_broadcast(context, broadcast_config, bot_id):
         inicio = datetime.now()
         
         # Pega todos os usuários do bot
-        users = manager.get_bot_users(bot_id)
+        users = await amanager.get_bot_users(bot_id)
         if not users:
             return
         
         # Pega os planos do bot
-        planos = manager.get_bot_plans(bot_id)
+        planos = await amanager.get_bot_plans(bot_id)
         if not planos:
             return
         
@@ -48,33 +49,36 @@ async def send_scheduled_broadcast(context, broadcast_config, bot_id):
         # NOVO: Timestamp para controle de atualizações (embora não vamos atualizar mensagem aqui)
         last_update = datetime.now()
         
+        # Os planos com desconto são os mesmos para todos os usuários
+        ofertas = []
+        for plano in planos:
+            valor_original = plano['value']
+            valor_com_desconto = round(valor_original * (1 - desconto / 100), 2)  # ADICIONADO round
+            
+            # Formata o botão - MUDANÇA: verifica se desconto > 0
+            if desconto > 0:
+                botao_texto = f"{plano['name']} por R${valor_com_desconto:.2f} ({int(desconto)}% OFF)"
+            else:
+                botao_texto = f"{plano['name']} por R${valor_com_desconto:.2f}"
+            
+            # Cria um plano modificado para o pagamento
+            plano_broadcast = plano.copy()
+            plano_broadcast['value'] = valor_com_desconto
+            plano_broadcast['is_scheduled_broadcast'] = True
+            plano_broadcast['original_value'] = valor_original
+            plano_broadcast['discount'] = desconto
+            ofertas.append((botao_texto, plano_broadcast))
+        
+        # O pagamento só é criado quando o usuário clica na oferta
+        campaign_id = await amanager.create_campaign(bot_id, [plano_broadcast for _, plano_broadcast in ofertas])
+        
         for i, user_id in enumerate(users):
             try:
-                # Monta os botões dos planos com desconto
-                keyboard_plans = []
-                for plan_index in range(len(planos)):
-                    plano = planos[plan_index]
-                    valor_original = plano['value']
-                    valor_com_desconto = round(valor_original * (1 - desconto / 100), 2)  # ADICIONADO round
-                    
-                    # Formata o botão - MUDANÇA: verifica se desconto > 0
-                    if desconto > 0:
-                        botao_texto = f"{plano['name']} por R${valor_com_desconto:.2f} ({int(desconto)}% OFF)"
-                    else:
-                        botao_texto = f"{plano['name']} por R${valor_com_desconto:.2f}"
-                    
-                    # Cria um plano modificado para o pagamento
-                    plano_broadcast = plano.copy()
-                    plano_broadcast['value'] = valor_com_desconto
-                    plano_broadcast['is_scheduled_broadcast'] = True
-                    plano_broadcast['original_value'] = valor_original
-                    plano_broadcast['discount'] = desconto
-                    
-                    # Cria o pagamento com o plano modificado
-                    payment_id = manager.create_payment(user_id, plano_broadcast, f"{plano['name']} - Broadcast", bot_id)
-                    
-                    # Gera PIX direto
-                    keyboard_plans.append([InlineKeyboardButton(botao_texto, callback_data=f"pagar_{payment_id}")])
+                # Monta os botões dos planos com desconto (PIX direto)
+                keyboard_plans = [
+                    [InlineKeyboardButton(botao_texto, callback_data=offers.callback_data(bot_id, campaign_id, plan_index, user_id))]
+                    for plan_index, (botao_texto, _) in enumerate(ofertas)
+                ]
                 
                 reply_markup = InlineKeyboardMarkup(keyboard_plans)
                 
@@ -124,6 +128,8 @@ async def send_scheduled_broadcast(context, broadcast_config, bot_id):
                 bloqueados += 1
                 erro_detalhes['blocked'].append(user_id)
                 erros += 1
+                # Remove do público dos próximos disparos
+                await amanager.update_bot_user_status(bot_id, user_id, 'blocked')
                 
             except BadRequest as e:
                 if "user is deactivated" in str(e).lower():
@@ -189,8 +195,8 @@ async def notificar_admins_disparo_finalizado(context, bot_id, broadcast_config,
     """Notifica todos os admins sobre o resultado do disparo programado"""
     try:
         # Pega lista de admins
-        admin_list = manager.get_bot_admin(bot_id)
-        owner = manager.get_bot_owner(bot_id)
+        admin_list = await amanager.get_bot_admin(bot_id)
+        owner = await amanager.get_bot_owner(bot_id)
         
         # Adiciona o owner se não estiver na lista
         if owner and owner not in admin_list:
@@ -285,9 +291,9 @@ async def broadcast_scheduler(context, broadcast_config, bot_id):
             print(f"Erro no scheduler: {e}")
             await asyncio.sleep(60)  # Espera 1 minuto antes de tentar novamente
 
-def start_scheduled_broadcasts_for_bot(context, bot_id):
+async def start_scheduled_broadcasts_for_bot(context, bot_id):
     """Inicia todos os disparos programados de um bot"""
-    broadcasts = manager.get_bot_scheduled_broadcasts(bot_id)
+    broadcasts = await amanager.get_bot_scheduled_broadcasts(bot_id)
     
     # Cancela tasks antigas se existirem
     bot_key = f"bot_{bot_id}"
@@ -0,0 +1,639 @@
+import bisect, hashlib, os, sys, threading, time, requests, multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import modules.manager as manager
+import modules.retention as retention
+from bot import run_host_sync, HEARTBEAT_INTERVAL
+
+# Pontos de cada worker no anel (mais pontos = distribuição mais uniforme)
+VIRTUAL_NODES = 160
+
+# Como os workers são criados. No forkserver um processo limpo importa a pilha
+# do bot uma vez (FORKSERVER_PRELOAD) e cada worker nasce de um fork dele: não
+# reimporta nada, divide as páginas por copy-on-write e não herda as threads
+# nem os locks do processo web.
+START_METHOD = os.environ.get('BOT_START_METHOD', 'forkserver')
+# Só a pilha do bot: o __main__ (app.py) criaria Supervisor, filas, Flask e SDKs no
+# processo modelo e todo worker herdaria essas cópias
+FORKSERVER_PRELOAD = ['bot']
+
+# Bots sem atividade há mais que isso (minutos) são removidos
+INACTIVITY_MINUTES = 21600
+# Intervalo entre varreduras de bots inativos (segundos)
+SWEEP_INTERVAL = 60
+# Avisos de remoção enviados em paralelo
+NOTIFY_THREADS = 16
+
+# Intervalo entre atualizações dos perfis (getMe) vencidos, em segundos
+PROFILE_REFRESH_INTERVAL = 60
+# getMe simultâneos na atualização dos perfis
+PROFILE_THREADS = 8
+
+# Chamadas à Bot API por segundo na inicialização, somando todos os workers
+STARTUP_RATE = float(os.environ.get('BOT_STARTUP_RATE', 30))
+# Imprime o progresso da inicialização a cada tantos bots
+PROGRESS_EVERY = 25
+
+# Worker sem heartbeat há mais que isso (segundos) é considerado travado
+HEARTBEAT_TIMEOUT = 30
+# Espera antes de reiniciar de novo um worker/bot que caiu (dobra a cada queda)
+RESTART_BACKOFF = 1
+MAX_RESTART_BACKOFF = 300
+# Tempo saudável (segundos) depois do qual a espera volta ao mínimo
+STABLE_AFTER = 120
+# Espera (segundos) para um worker encerrar sozinho antes de ser morto
+SHUTDOWN_TIMEOUT = 10
+
+
+def get_context(method=START_METHOD):
+    """Contexto de multiprocessing dos workers (forkserver com a pilha do bot pré-carregada)"""
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+    context = multiprocessing.get_context(method)
+    if method == 'forkserver':
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
+
+
+def _hash(key):
+    return int(hashlib.md5(str(key).encode()).hexdigest()[:16], 16)
+
+
+def notify_inactive_owner(bot_id, bot_token, owner_id):
+    """Avisa o dono, pelo próprio bot, que ele foi removido por inatividade"""
+    try:
+        # Pega detalhes do bot (perfil salvo)
+        bot_details = manager.get_bot_details(bot_id)
+        bot_username = bot_details['result'].get('username', 'Bot') if bot_details else 'Bot'
+
+        # Mensagem de aviso
+        message = (
+            "🚫 <b>ATENÇÃO: BOT REMOVIDO POR INATIVIDADE</b> 🚫\n\n"
+            f"<b>Bot:</b> @{bot_username}\n"
+            f"<b>ID:</b> {bot_id}\n\n"
+            "❌ Este bot foi automaticamente removido do sistema.\n"
+            "❌ Motivo: Inatividade por mais de 5 minutos.\n"
+            "❌ Todos os dados foram apagados.\n\n"
+            "💡 Para usar novamente, cadastre um novo bot.\n\n"
+            "⚠️ <i>Sistema de limpeza automática</i>"
+        )
+
+        response = requests.post(
+            f"https://api.telegram.org/bot{bot_token}/sendMessage",
+            json={
+                "chat_id": owner_id,
+                "text": message,
+                "parse_mode": "HTML"
+            },
+            timeout=15
+        )
+        print(f"Notificação de inatividade enviada: {response.status_code}")
+    except Exception as e:
+        print(f"Erro ao enviar notificação de inatividade: {e}")
+
+
+class HashRing:
+    """Anel de hash consistente: cada bot cai sempre no mesmo worker e, quando
+    o número de workers muda, só os bots do trecho afetado trocam de worker."""
+
+    def __init__(self, nodes=(), replicas=VIRTUAL_NODES):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            key = _hash(f'{node}:{i}')
+            if key not in self._nodes:
+                bisect.insort(self._keys, key)
+            self._nodes[key] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            key = _hash(f'{node}:{i}')
+            if self._nodes.get(key) == node:
+                self._nodes.pop(key)
+                self._keys.remove(key)
+
+    def get(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+class Supervisor:
+    """Pool fixo de processos worker, cada um hospedando vários bots (bot.host_main).
+
+    O registro bot -> worker vive no processo que criou o supervisor. Outros
+    processos (ex: o bot de registro) herdam a fila de controle pelo fork e
+    mandam seus pedidos por ela.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or int(os.environ.get('BOT_WORKERS', 0)) or os.cpu_count() or 1
+        self.pid = os.getpid()
+        self.context = get_context()
+        self.control = self.context.Queue()
+        self.status = self.context.Queue()  # workers -> supervisor (heartbeat, bot online/falhou)
+        self.progress = {'total': 0, 'started': 0, 'failed': 0, 'since': None}
+        self.workers = {}   # worker_id -> {'process': Process, 'events': Queue}
+        self.registry = {}  # bot_id -> {'token': str, 'worker': worker_id}
+        self.health = {}         # bot_id -> reinícios, queda atual e tempo total fora do ar
+        self.worker_health = {}  # worker_id -> último heartbeat, lag do loop e reinícios
+        self.ring = HashRing()
+        self._lock = threading.RLock()
+        self._started = False
+
+    def _is_owner(self):
+        return os.getpid() == self.pid
+
+    def start(self):
+        """Sobe os workers e a thread que atende pedidos de outros processos"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for worker_id in range(self.size):
+                self._spawn(worker_id)
+                self.ring.add(worker_id)
+        threading.Thread(target=self._control_loop, daemon=True).start()
+        threading.Thread(target=self._sweeper_loop, daemon=True).start()
+        threading.Thread(target=self._status_loop, daemon=True).start()
+        threading.Thread(target=self._profile_loop, daemon=True).start()
+        threading.Thread(target=self._monitor_loop, daemon=True).start()
+        threading.Thread(target=self._retention_loop, daemon=True).start()
+        print(f"Supervisor iniciado com {self.size} workers")
+
+    def _spawn(self, worker_id):
+        events = self.context.Queue()
+        process = self.context.Process(
+            target=run_host_sync,
+            args=([], events, self.status, STARTUP_RATE / self.size),
+            name=f'bot-worker-{worker_id}'
+        )
+        process.start()
+        self.workers[worker_id] = {'process': process, 'events': events}
+        health = self.worker_health.setdefault(worker_id, {
+            'restarts': 0, 'backoff': RESTART_BACKOFF, 'next_restart': 0,
+        })
+        now = time.time()
+        health.update(pid=process.pid, spawned_at=now, last_heartbeat=now, lag=0.0, bots=0)
+        print(f"Worker {worker_id} iniciado - PID: {process.pid}")
+
+    def _shutdown(self, worker):
+        """Encerra o processo do worker pedindo pela fila; terminate/kill só se ele não sair.
+
+        Um processo morto no meio de um put na fila de status (dividida por todos
+        os workers) deixaria o lock interno dela preso para os outros.
+        """
+        process = worker['process']
+        if not process.is_alive():
+            return
+        try:
+            worker['events'].put_nowait({'type': 'shutdown'})
+        except Exception as e:
+            print(f"Erro ao pedir o encerramento do worker PID {process.pid}: {e}")
+        process.join(timeout=SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout=2)
+
+    def _send(self, worker_id, event):
+        worker = self.workers.get(worker_id)
+        if worker is None:
+            return False
+        try:
+            worker['events'].put_nowait(event)
+            return True
+        except Exception as e:
+            print(f"Erro ao enviar {event.get('type')} para o worker {worker_id}: {e}")
+            return False
+
+    def start_bot(self, token, bot_id):
+        """Inicia (ou reinicia) o bot no worker indicado pelo anel"""
+        bot_id = str(bot_id)
+        if not self._is_owner():
+            self.control.put(('start', token, bot_id))
+            return True
+
+        with self._lock:
+            # O mesmo token só pode rodar uma vez (bot substituído/recadastrado)
+            for other_id, entry in list(self.registry.items()):
+                if other_id != bot_id and entry['token'] == token:
+                    print(f"Token {token[:20]}... já está em uso pelo bot {other_id}")
+                    self.stop_bot(other_id)
+
+            worker_id = self.ring.get(bot_id)
+            current = self.registry.get(bot_id)
+            if current and current['worker'] != worker_id:
+                self._send(current['worker'], {'type': 'stop', 'bot_id': bot_id})
+
+            self.registry[bot_id] = {'token': token, 'worker': worker_id}
+            self._bot_health(bot_id)['retry_at'] = None
+            self._send(worker_id, {'type': 'start', 'bot_id': bot_id, 'token': token})
+        print(f"Bot {bot_id} atribuído ao worker {worker_id}")
+        return True
+
+    def stop_bot(self, bot_id):
+        """Para o bot no worker dele (banido, removido ou substituído)"""
+        bot_id = str(bot_id)
+        if not self._is_owner():
+            self.control.put(('stop', bot_id))
+            return True
+
+        with self._lock:
+            entry = self.registry.pop(bot_id, None)
+            self.health.pop(bot_id, None)
+        if entry is None:
+            return False
+        return self._send(entry['worker'], {'type': 'stop', 'bot_id': bot_id})
+
+    def notify_payment(self, bot_id, payment_id):
+        """Avisa o worker dono do bot que um pagamento foi aprovado"""
+        bot_id = str(bot_id)
+        if not self._is_owner():
+            self.control.put(('payment', bot_id, payment_id))
+            return
+        entry = self.registry.get(bot_id)
+        if entry is None or not self.worker_alive(entry['worker']):
+            # Bot fora do ar: a reconciliação do payment_task entrega quando ele voltar
+            return
+        self._send(entry['worker'], {'type': 'payment', 'bot_id': bot_id, 'payment_id': payment_id})
+
+    def dispatch_update(self, bot_id, update):
+        """Entrega um update recebido por webhook ao worker que hospeda o bot"""
+        entry = self.registry.get(str(bot_id))
+        if entry is None or not self.worker_alive(entry['worker']):
+            return False
+        return self._send(entry['worker'], {'type': 'update', 'bot_id': str(bot_id), 'update': update})
+
+    def worker_alive(self, worker_id):
+        worker = self.workers.get(worker_id)
+        return bool(worker and worker['process'].is_alive())
+
+    def is_running(self, bot_id):
+        entry = self.registry.get(str(bot_id))
+        return bool(entry and self._is_owner() and self.worker_alive(entry['worker']))
+
+    def assignments(self):
+        """Cópia do registro bot -> worker"""
+        with self._lock:
+            return {bot_id: entry['worker'] for bot_id, entry in self.registry.items()}
+
+    def count(self):
+        return len(self.registry)
+
+    def begin_startup(self, total):
+        """Zera o progresso antes de enviar uma leva de bots para os workers"""
+        with self._lock:
+            self.progress = {'total': total, 'started': 0, 'failed': 0, 'since': time.time()}
+
+    def startup_progress(self):
+        with self._lock:
+            progress = dict(self.progress)
+        if progress['since']:
+            progress['elapsed'] = round(time.time() - progress['since'], 1)
+        return progress
+
+    def _status_loop(self):
+        """Acompanha os bots que ficam online nos workers e imprime o progresso"""
+        while True:
+            try:
+                event = self.status.get()
+            except (EOFError, OSError):
+                return
+            kind = event.get('type')
+            if kind == 'heartbeat':
+                self._heartbeat(event)
+                continue
+            if kind not in ('started', 'failed'):
+                continue
+            with self._lock:
+                if event['bot_id'] in self.registry:
+                    if kind == 'started':
+                        self._mark_up(event['bot_id'])
+                    else:
+                        self._mark_failed(event['bot_id'], event.get('error'), event.get('retry', True))
+                self.progress[kind] += 1
+                progress = dict(self.progress)
+            done = progress['started'] + progress['failed']
+            if progress['total'] and (done % PROGRESS_EVERY == 0 or done == progress['total']):
+                elapsed = time.time() - progress['since']
+                print(f"🚀 Inicialização: {progress['started']}/{progress['total']} bots online, "
+                      f"{progress['failed']} falhas ({elapsed:.0f}s)")
+
+    def _bot_health(self, bot_id):
+        return self.health.setdefault(bot_id, {
+            'restarts': 0, 'downtime': 0.0, 'down_since': None, 'started_at': None,
+            'backoff': RESTART_BACKOFF, 'retry_at': None, 'last_error': None,
+        })
+
+    def _mark_down(self, bot_id, error):
+        health = self._bot_health(bot_id)
+        if health['down_since'] is None:
+            health['down_since'] = time.time()
+        health['last_error'] = error
+
+    def _mark_up(self, bot_id):
+        health = self._bot_health(bot_id)
+        now = time.time()
+        if health['down_since'] is not None:
+            health['downtime'] += now - health['down_since']
+            health['down_since'] = None
+        health['started_at'] = now
+        health['retry_at'] = None
+
+    def _mark_failed(self, bot_id, error, retry):
+        """Bot não subiu ou caiu: agenda nova tentativa com espera exponencial"""
+        health = self._bot_health(bot_id)
+        # Ficou no ar tempo suficiente: a queda não faz parte de uma sequência de falhas
+        if health['started_at'] and time.time() - health['started_at'] > STABLE_AFTER:
+            health['backoff'] = RESTART_BACKOFF
+        health['started_at'] = None
+        self._mark_down(bot_id, error)
+        if retry:
+            health['retry_at'] = time.time() + health['backoff']
+            health['backoff'] = min(health['backoff'] * 2, MAX_RESTART_BACKOFF)
+        else:
+            health['retry_at'] = None
+
+    def _heartbeat(self, event):
+        with self._lock:
+            for worker_id, worker in self.workers.items():
+                if worker['process'].pid == event.get('pid'):
+                    health = self.worker_health[worker_id]
+                    health['last_heartbeat'] = time.time()
+                    health['lag'] = event.get('lag', 0.0)
+                    health['bots'] = event.get('bots', 0)
+                    self._dead_bots(worker_id, event.get('dead', ()))
+                    return
+
+    def _dead_bots(self, worker_id, dead):
+        """Bots que o worker vivo informa como parados: reinicia cada um com a sua espera"""
+        for bot_id in dead:
+            entry = self.registry.get(bot_id)
+            health = self.health.get(bot_id)
+            # Só do worker atual do bot e uma vez por queda (o 'started' seguinte limpa down_since)
+            if entry is None or entry['worker'] != worker_id or health is None or health['down_since'] is not None:
+                continue
+            print(f"⚠️ Bot {bot_id} parou no worker {worker_id}; reiniciando")
+            self._mark_failed(bot_id, 'bot parou no worker', retry=True)
+
+    def restart_worker(self, worker_id, reason):
+        """Mata o worker (morto ou travado), sobe outro no lugar e reinicia os bots dele"""
+        with self._lock:
+            # Tira o worker do pool: ninguém mais envia para ele e o monitor não o reinicia de novo
+            worker = self.workers.pop(worker_id, None)
+            if worker is None:
+                return
+            health = self.worker_health[worker_id]
+            print(f"⚠️ Worker {worker_id} {reason}; reiniciando (reinício {health['restarts'] + 1})")
+            health['restarts'] += 1
+            health['next_restart'] = time.time() + health['backoff']
+            health['backoff'] = min(health['backoff'] * 2, MAX_RESTART_BACKOFF)
+
+        # Encerrar pode levar SHUTDOWN_TIMEOUT + terminate/kill: fora do lock, para
+        # não travar start_bot, notify_payment e dispatch_update dos outros workers
+        self._shutdown(worker)
+
+        with self._lock:
+            # O pool pode ter diminuído enquanto o worker encerrava
+            if worker_id >= self.size:
+                return
+            self._spawn(worker_id)
+
+            for bot_id, entry in self.registry.items():
+                if entry['worker'] != worker_id:
+                    continue
+                self._mark_down(bot_id, f"worker {worker_id} {reason}")
+                bot_health = self._bot_health(bot_id)
+                bot_health['restarts'] += 1
+                bot_health['retry_at'] = None
+                self._send(worker_id, {'type': 'start', 'bot_id': bot_id, 'token': entry['token']})
+
+    def check_health(self):
+        """Reinicia workers mortos ou travados e tenta de novo os bots que falharam"""
+        now = time.time()
+        restarts = []
+        with self._lock:
+            for worker_id, worker in list(self.workers.items()):
+                health = self.worker_health[worker_id]
+                alive = worker['process'].is_alive()
+                silent = now - health['last_heartbeat']
+                if alive and silent <= HEARTBEAT_TIMEOUT:
+                    if now - health['spawned_at'] > STABLE_AFTER:
+                        health['backoff'] = RESTART_BACKOFF
+                    continue
+                if now < health['next_restart']:
+                    continue
+                restarts.append((worker_id, 'morreu' if not alive else f'sem heartbeat há {silent:.0f}s'))
+
+            for bot_id, health in self.health.items():
+                if health['retry_at'] is None or now < health['retry_at']:
+                    continue
+                health['retry_at'] = None
+                entry = self.registry.get(bot_id)
+                if entry and self.worker_alive(entry['worker']):
+                    health['restarts'] += 1
+                    self._send(entry['worker'], {'type': 'start', 'bot_id': bot_id, 'token': entry['token']})
+
+        for worker_id, reason in restarts:
+            self.restart_worker(worker_id, reason)
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"Erro no monitoramento dos workers: {e}")
+
+    def health_report(self):
+        """Estado dos workers e, por bot, reinícios e tempo fora do ar (segundos)"""
+        now = time.time()
+        with self._lock:
+            workers = {
+                worker_id: {
+                    'pid': health['pid'],
+                    'alive': self.worker_alive(worker_id),
+                    'bots': health['bots'],
+                    'lag': health['lag'],
+                    'last_heartbeat': round(now - health['last_heartbeat'], 1),
+                    'restarts': health['restarts'],
+                }
+                for worker_id, health in self.worker_health.items() if worker_id in self.workers
+            }
+            bots = {}
+            for bot_id, entry in self.registry.items():
+                health = self._bot_health(bot_id)
+                down_for = now - health['down_since'] if health['down_since'] is not None else 0
+                bots[bot_id] = {
+                    'worker': entry['worker'],
+                    'down': health['down_since'] is not None,
+                    'restarts': health['restarts'],
+                    'downtime': round(health['downtime'] + down_for, 1),
+                    'last_error': health['last_error'],
+                }
+        return {'workers': workers, 'bots': bots}
+
+    def resize(self, size):
+        """Muda a quantidade de workers e move só os bots cujo trecho do anel mudou"""
+        with self._lock:
+            for worker_id in range(self.size, size):
+                self._spawn(worker_id)
+                self.ring.add(worker_id)
+            for worker_id in range(size, self.size):
+                self.ring.remove(worker_id)
+            old_size, self.size = self.size, size
+            self.rebalance()
+            removed = []
+            for worker_id in range(size, old_size):
+                self.worker_health.pop(worker_id, None)
+                worker = self.workers.pop(worker_id, None)
+                if worker:
+                    removed.append(worker)
+        # Encerramento (bloqueante) fora do lock
+        for worker in removed:
+            self._shutdown(worker)
+
+    def rebalance(self):
+        """Reatribui os bots cujo worker no anel não é mais o atual"""
+        with self._lock:
+            moved = 0
+            for bot_id, entry in list(self.registry.items()):
+                target = self.ring.get(bot_id)
+                if target != entry['worker']:
+                    self._send(entry['worker'], {'type': 'stop', 'bot_id': bot_id})
+                    entry['worker'] = target
+                    self._send(target, {'type': 'start', 'bot_id': bot_id, 'token': entry['token']})
+                    moved += 1
+        if moved:
+            print(f"Rebalanceamento: {moved} bots movidos")
+        return moved
+
+    def sweep_inactive(self):
+        """Remove os bots inativos: avisa os donos em paralelo, para o bot no worker e apaga do banco"""
+        inactive_bots = manager.get_inactive_bots(minutes=INACTIVITY_MINUTES)
+        if not inactive_bots:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=NOTIFY_THREADS) as pool:
+            list(pool.map(lambda bot: notify_inactive_owner(bot[0], bot[1], bot[2]), inactive_bots))
+
+        for bot_id, _, _, last_activity in inactive_bots:
+            self.stop_bot(bot_id)
+            manager.delete_bot(bot_id)
+            print(f"Bot {bot_id} removido por inatividade. Última atividade: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_activity))}")
+        return len(inactive_bots)
+
+    def _sweeper_loop(self):
+        """Única varredura de inatividade do sistema (roda no processo do supervisor)"""
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            try:
+                self.sweep_inactive()
+            except Exception as e:
+                print(f"Erro na verificação de bots inativos: {e}")
+
+    def refresh_profiles(self, pool):
+        """Atualiza os perfis vencidos em paralelo (no máximo PROFILE_THREADS getMe por vez)"""
+        def refresh(bot):
+            try:
+                manager.refresh_bot_profile(bot[0], bot[1])
+            except Exception as e:
+                print(f"Erro ao atualizar perfil do bot {bot[0]}: {e}")
+
+        stale = manager.get_stale_bot_profiles()
+        list(pool.map(refresh, stale))
+        return len(stale)
+
+    def _profile_loop(self):
+        with ThreadPoolExecutor(max_workers=PROFILE_THREADS) as pool:
+            while True:
+                try:
+                    self.refresh_profiles(pool)
+                except Exception as e:
+                    print(f"Erro na atualização de perfis: {e}")
+                time.sleep(PROFILE_REFRESH_INTERVAL)
+
+    def _retention_loop(self):
+        """Arquiva os pagamentos parados e devolve o espaço do banco (roda no processo do supervisor)"""
+        while True:
+            try:
+                retention.run_retention()
+            except Exception as e:
+                print(f"Erro na retenção de pagamentos: {e}")
+            time.sleep(retention.RETENTION_INTERVAL)
+
+    def _control_loop(self):
+        while True:
+            try:
+                command = self.control.get()
+            except (EOFError, OSError):
+                return
+            try:
+                kind = command[0]
+                if kind == 'start':
+                    self.start_bot(command[1], command[2])
+                elif kind == 'stop':
+                    self.stop_bot(command[1])
+                elif kind == 'payment':
+                    self.notify_payment(command[1], command[2])
+            except Exception as e:
+                print(f"Erro ao processar comando do supervisor {command}: {e}")
+
+
+def _benchmark_worker(ready, started_at):
+    # O que um worker precisa antes de iniciar o primeiro bot
+    import bot  # noqa: F401
+    private_kb = 0
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean', 'Private_Dirty')):
+                    private_kb += int(line.split()[1])
+    except OSError:
+        pass
+    ready.put((time.time() - started_at, private_kb))
+
+
+def benchmark_start_methods(methods=('fork', 'forkserver', 'spawn'), runs=5):
+    """Mede quanto um worker novo leva até ter a pilha do bot importada e
+    quanta memória privada (não compartilhada) ele usa, em cada start method.
+
+    Uso: python -m modules.supervisor --benchmark
+    """
+    results = {}
+    for method in methods:
+        if method not in multiprocessing.get_all_start_methods():
+            continue
+        context = get_context(method)
+        ready = context.Queue()
+        times, memory = [], []
+        for _ in range(runs):
+            process = context.Process(target=_benchmark_worker, args=(ready, time.time()))
+            process.start()
+            elapsed, private_kb = ready.get(timeout=120)
+            process.join()
+            times.append(elapsed)
+            memory.append(private_kb)
+        # A primeira rodada do forkserver inclui subir o servidor e o preload
+        results[method] = {
+            'first_ms': round(times[0] * 1000, 1),
+            'median_ms': round(sorted(times)[len(times) // 2] * 1000, 1),
+            'private_mb': round(sorted(memory)[len(memory) // 2] / 1024, 1),
+        }
+        print(f"{method:>10}: primeira {results[method]['first_ms']}ms, "
+              f"mediana {results[method]['median_ms']}ms, "
+              f"memória privada {results[method]['private_mb']}MB")
+    return results
+
+
+if __name__ == '__main__' and '--benchmark' in sys.argv:
+    benchmark_start_methods()
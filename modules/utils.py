@@ -1,4 +1,4 @@
-import modules.manager as manager
+import modules.async_manager as amanager
 import json, re, requests
 
 
@@ -6,13 +6,23 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKe
 from telegram.ext import Application, CommandHandler, CallbackContext, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters, Updater, CallbackContext, ChatJoinRequestHandler
 from telegram.error import BadRequest, Conflict
 
+async def bot_snapshot(context):
+    """Configurações do bot (BotSnapshot) lidas uma vez por update e reaproveitadas pelos handlers"""
+    snapshot = getattr(context, 'bot_snapshot', None)
+    if snapshot is None:
+        snapshot = await amanager.get_bot_snapshot(context.bot_data['id'])
+        # Só o CallbackContext vive um único update; a Application não pode guardar
+        if isinstance(context, CallbackContext):
+            context.bot_snapshot = snapshot
+    return snapshot
+
 async def is_admin(context, user_id, show_plans_if_not_admin=True):
-    if (str(user_id) in manager.get_bot_admin(context.bot_data['id']) or is_owner(context, user_id)):
+    if (str(user_id) in (await bot_snapshot(context)).admin or await is_owner(context, user_id)):
         return True
     else:
         # Só mostra planos se for explicitamente solicitado
         if show_plans_if_not_admin:
-            planos = manager.get_bot_plans(context.bot_data['id'])
+            planos = (await bot_snapshot(context)).plans
             keyboard_plans = []
             for plan_index in range(len(planos)):
                 keyboard_plans.append([InlineKeyboardButton(f'{planos[plan_index]['name']} - R$ {planos[plan_index]['value']}', callback_data=f"plano_{plan_index}")])
@@ -21,8 +31,8 @@ async def is_admin(context, user_id, show_plans_if_not_admin=True):
         return False
     
     
-def is_owner(context, user_id):
-    return (str(user_id) == manager.get_bot_owner(context.bot_data['id']))
+async def is_owner(context, user_id):
+    return (str(user_id) == (await bot_snapshot(context)).owner)
         
 
 
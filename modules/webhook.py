@@ -0,0 +1,31 @@
+import hashlib, hmac, os
+
+# Modo webhook (opcional): com BOT_WEBHOOK_URL definido os bots recebem os updates
+# pelo servidor web em /tg/<bot_id> em vez de manter um long polling aberto cada
+WEBHOOK_URL = os.environ.get("BOT_WEBHOOK_URL", "").rstrip('/')
+# Chave dos secrets por bot: obrigatória no modo webhook, sem valor padrão (um
+# padrão público deixaria qualquer um calcular o secret e forjar updates)
+WEBHOOK_SECRET = os.environ.get("BOT_WEBHOOK_SECRET", "")
+
+if WEBHOOK_URL and not WEBHOOK_SECRET:
+    raise RuntimeError("BOT_WEBHOOK_URL definido sem BOT_WEBHOOK_SECRET: defina um segredo aleatório para o modo webhook")
+
+
+def enabled():
+    return bool(WEBHOOK_URL)
+
+
+def webhook_url(bot_id):
+    return f"{WEBHOOK_URL}/tg/{bot_id}"
+
+
+def secret_token(bot_id):
+    """Secret do bot, enviado pelo Telegram no header X-Telegram-Bot-Api-Secret-Token"""
+    return hmac.new(WEBHOOK_SECRET.encode(), str(bot_id).encode(), hashlib.sha256).hexdigest()
+
+
+def is_valid(bot_id, token):
+    # Sem segredo configurado o modo webhook não existe: nenhum update é aceito
+    if not WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest(token or '', secret_token(bot_id))
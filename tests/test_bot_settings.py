@@ -0,0 +1,75 @@
+"""Cache de configurações dos bots: só uma nova BOTS.version invalida o BotSnapshot."""
+import os, sys, tempfile, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+
+import modules.manager as manager
+from modules.database import get_connection
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+def _version(bot_id):
+    return get_connection().execute("SELECT version FROM BOTS WHERE id = ?", (bot_id,)).fetchone()[0]
+
+
+class BotSettingsCacheTest(unittest.TestCase):
+    _bots = 0
+
+    def setUp(self):
+        BotSettingsCacheTest._bots += 1
+        self.bot = f"settings-{BotSettingsCacheTest._bots}"
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner', config={'texto1': 'antigo'})
+
+    def test_local_write_bumps_version_and_refreshes_snapshot(self):
+        before = manager.get_bot_snapshot(self.bot)
+        self.assertEqual(before.config, {'texto1': 'antigo'})
+
+        manager.update_bot_config(self.bot, {'texto1': 'novo'})
+        after = manager.get_bot_snapshot(self.bot)
+        self.assertEqual(after.version, before.version + 1)
+        self.assertEqual(after.config, {'texto1': 'novo'})
+        # O snapshot já entregue continua com os valores da sua versão
+        self.assertEqual(before.config, {'texto1': 'antigo'})
+
+    def test_write_from_another_process_is_seen_after_the_check_interval(self):
+        manager.get_bot_snapshot(self.bot)
+        # Outro processo: muda o banco sem passar pelo cache deste
+        conn = get_connection()
+        conn.execute("UPDATE BOTS SET config = ?, version = version + 1 WHERE id = ?",
+                     ('{"texto1": "remoto"}', self.bot))
+        conn.commit()
+
+        with mock.patch.object(manager, 'SETTINGS_CHECK_INTERVAL', 3600):
+            self.assertEqual(manager.get_bot_snapshot(self.bot).config, {'texto1': 'antigo'})
+        with mock.patch.object(manager, 'SETTINGS_CHECK_INTERVAL', -1):
+            snapshot = manager.get_bot_snapshot(self.bot)
+        self.assertEqual(snapshot.config, {'texto1': 'remoto'})
+        self.assertEqual(snapshot.version, _version(self.bot))
+
+    def test_last_activity_keeps_version_and_cache(self):
+        manager.get_bot_snapshot(self.bot)
+        entry = manager._settings_cache[self.bot]
+        version = _version(self.bot)
+
+        manager.update_bot_last_activity(self.bot)
+        self.assertEqual(_version(self.bot), version)
+        self.assertIs(manager._settings_cache.get(self.bot), entry)
+
+    def test_deleted_bot_leaves_the_cache(self):
+        manager.get_bot_snapshot(self.bot)
+        manager.delete_bot(self.bot)
+        self.assertNotIn(self.bot, manager._settings_cache)
+        self.assertIsNone(manager.get_bot_snapshot(self.bot))
+
+
+if __name__ == "__main__":
+    unittest.main()
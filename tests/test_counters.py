@@ -0,0 +1,83 @@
+"""Contadores do painel (COUNTERS): cada escrita soma no escopo do bot e no global, e delete_bot desfaz."""
+import os, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+
+import modules.manager as manager
+
+PLANO = {'name': 'Mensal', 'value': 25, 'time': 1, 'time_type': 'mes'}
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+def _delta(before, after):
+    return {name: after[name] - before[name] for name in manager.COUNTER_NAMES}
+
+
+class CountersTest(unittest.TestCase):
+    _bots = 0
+
+    def setUp(self):
+        CountersTest._bots += 1
+        self.bot = f"counters-{CountersTest._bots}"
+        # Outros testes usam o mesmo banco: o global é conferido por diferença
+        self.baseline = manager.get_counters()
+
+    def _sale(self):
+        payment_id = manager.create_payment('chat', PLANO, PLANO['name'], self.bot)
+        manager.set_payment_waiting(payment_id, f"{self.bot}-{payment_id}")
+        manager.mark_payment_paid(f"{self.bot}-{payment_id}")
+        manager.claim_paid_payments(self.bot, 8)
+        return payment_id
+
+    def test_create_bot_counts_bot_and_audience(self):
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner', users=['1', '2', '3'])
+        manager.add_bot_user(self.bot, '4')
+        manager.add_bot_user(self.bot, '4')  # repetido: só atualiza last_seen
+
+        expected = {'bots': 1, 'users': 4, 'sales': 0, 'revenue': 0}
+        self.assertEqual(manager.get_counters(self.bot), expected)
+        self.assertEqual(_delta(self.baseline, manager.get_counters()), expected)
+
+        # Token repetido não cria o bot nem conta de novo
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner')
+        self.assertEqual(_delta(self.baseline, manager.get_counters()), expected)
+
+    def test_finish_payment_counts_the_sale_once(self):
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner')
+        payment_id = self._sale()
+
+        self.assertTrue(manager.finish_payment(payment_id))
+        self.assertFalse(manager.finish_payment(payment_id))
+        counters = manager.get_counters(self.bot)
+        self.assertEqual((counters['sales'], counters['revenue']), (1, 25))
+
+        # Entrega que falhou e voltou para a fila não conta
+        failed_id = self._sale()
+        manager.release_payment(failed_id)
+        self.assertEqual(manager.get_counters(self.bot)['sales'], 1)
+
+    def test_delete_bot_subtracts_its_counters(self):
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner', users=['1', '2'])
+        manager.finish_payment(self._sale())
+        self.assertEqual(_delta(self.baseline, manager.get_counters()),
+                         {'bots': 1, 'users': 2, 'sales': 1, 'revenue': 25})
+
+        self.assertTrue(manager.delete_bot(self.bot))
+        self.assertEqual(manager.get_counters(), self.baseline)
+        self.assertEqual(manager.get_counters(self.bot), dict.fromkeys(manager.COUNTER_NAMES, 0))
+
+        # Apagar de novo um bot que não existe não mexe no global
+        self.assertTrue(manager.delete_bot(self.bot))
+        self.assertEqual(manager.get_counters(), self.baseline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""ExpirationScheduler: expira na ordem do vencimento, acorda com schedule() e espera entre tentativas que falharam."""
+import asyncio, os, sys, tempfile, time, types, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+os.environ.setdefault("OFFER_SECRET", "test")
+
+import modules.manager as manager
+
+# modules.expiration importa os handlers (python-telegram-bot, f-strings do 3.12)
+try:
+    import modules.expiration as expiration
+    _skip_reason = ''
+except (ImportError, SyntaxError) as e:
+    expiration = None
+    _skip_reason = f"modules.expiration indisponível neste ambiente: {e}"
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+@unittest.skipIf(expiration is None, _skip_reason)
+class ExpirationSchedulerTest(unittest.TestCase):
+    _bots = 0
+
+    def setUp(self):
+        ExpirationSchedulerTest._bots += 1
+        self.bot = f"expiration-{ExpirationSchedulerTest._bots}"
+        self.group = f"-100{ExpirationSchedulerTest._bots}"
+        manager.create_bot(self.bot, f"token-{self.bot}", 'owner', group=self.group)
+        self.scheduler = expiration.ExpirationScheduler(types.SimpleNamespace(bot_data={'id': self.bot}))
+        self.expired = []
+
+    def _access(self, user_id, due):
+        manager.add_user_to_expiration(user_id, time.time(), due, {}, self.group)
+
+    async def _record(self, user_id, grupo):
+        self.expired.append((user_id, time.time()))
+
+    def _run(self, seconds, during=None):
+        """Roda o agendador por seconds; during(scheduler) é chamado logo depois da partida"""
+        async def main():
+            task = asyncio.create_task(self.scheduler.run())
+            await asyncio.sleep(0.1)
+            if during:
+                during(self.scheduler)
+            await asyncio.sleep(seconds)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        asyncio.run(main())
+
+    def test_expires_in_due_order(self):
+        now = time.time()
+        self._access('late', now - 10)
+        self._access('first', now - 30)
+        self._access('middle', now - 20)
+        self._access('future', now + 3600)
+        self.scheduler._expire = self._record
+
+        self._run(0.2)
+        self.assertEqual([user_id for user_id, _ in self.expired], ['first', 'middle', 'late'])
+
+    def test_schedule_wakes_the_loop_at_the_due_time(self):
+        self.scheduler._expire = self._record
+        due = time.time() + 0.5
+
+        def new_payment(scheduler):
+            self._access('new', due)
+            scheduler.schedule('new', self.group, due)
+
+        self._run(1, during=new_payment)
+        self.assertEqual([user_id for user_id, _ in self.expired], ['new'])
+        self.assertGreaterEqual(self.expired[0][1], due)
+
+    def test_failed_expiration_waits_before_retrying(self):
+        self._access('broken', time.time() - 10)
+
+        async def fail(user_id, grupo):
+            await self._record(user_id, grupo)
+            raise RuntimeError('Telegram fora do ar')
+        self.scheduler._expire = fail
+
+        with mock.patch.object(expiration, 'RETRY_DELAY', 0.4), mock.patch('builtins.print'):
+            self._run(1)
+        # Sem a espera o loop tentaria sem parar; com ela, uma tentativa a cada 0,4s
+        self.assertLessEqual(len(self.expired), 4)
+        self.assertGreaterEqual(len(self.expired), 2)
+        gaps = [b - a for (_, a), (_, b) in zip(self.expired, self.expired[1:])]
+        self.assertTrue(all(gap >= 0.35 for gap in gaps), gaps)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""Máquina de estados do pagamento: reserva exclusiva, retomada, espera entre tentativas e transições proibidas."""
+import os, sys, tempfile, threading, time, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+
+import modules.manager as manager
+from modules.database import get_connection
+
+PLANO = {'name': 'Mensal', 'value': 10, 'time': 1, 'time_type': 'mes'}
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+def _status(payment_id):
+    return get_connection().execute("SELECT status FROM PAYMENTS WHERE id = ?", (payment_id,)).fetchone()[0]
+
+
+def _age_claim(payment_id, seconds):
+    """Volta claimed_at no tempo, como se o processador tivesse caído há seconds"""
+    conn = get_connection()
+    conn.execute("UPDATE PAYMENTS SET claimed_at = claimed_at - ? WHERE id = ?", (seconds, payment_id))
+    conn.commit()
+
+
+class PaymentStatesTest(unittest.TestCase):
+    _bots = 0
+
+    def setUp(self):
+        # Um bot por teste: as reservas de um teste não enxergam as do outro
+        PaymentStatesTest._bots += 1
+        self.bot = f"states-{PaymentStatesTest._bots}"
+
+    def _paid(self, n=1):
+        """n pagamentos do bot já confirmados pelo gateway"""
+        ids = []
+        for _ in range(n):
+            payment_id = manager.create_payment('chat', PLANO, PLANO['name'], self.bot)
+            trans_id = f"{self.bot}-{payment_id}"
+            self.assertTrue(manager.set_payment_waiting(payment_id, trans_id))
+            self.assertIsNotNone(manager.mark_payment_paid(trans_id))
+            ids.append(payment_id)
+        return ids
+
+    def test_concurrent_claimers_never_share_a_payment(self):
+        ids = self._paid(40)
+        claimed, errors = [], []
+        start = threading.Barrier(8)
+
+        def claimer():
+            try:
+                start.wait()
+                while True:
+                    rows = manager.claim_paid_payments(self.bot, 3)
+                    if not rows:
+                        return
+                    claimed.extend(row[0] for row in rows)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=claimer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(claimed), len(set(claimed)))
+        self.assertEqual(sorted(claimed), sorted(ids))
+        self.assertEqual({_status(payment_id) for payment_id in ids}, {'delivering'})
+
+    def test_stale_claim_is_taken_again(self):
+        payment_id, = self._paid()
+        self.assertEqual([row[0] for row in manager.claim_paid_payments(self.bot, 8)], [payment_id])
+        # Reserva recente: nenhum outro processador pega
+        self.assertEqual(manager.claim_paid_payments(self.bot, 8), [])
+
+        _age_claim(payment_id, manager.CLAIM_TIMEOUT + 1)
+        self.assertEqual([row[0] for row in manager.claim_paid_payments(self.bot, 8)], [payment_id])
+        # A retomada renova o claimed_at
+        self.assertEqual(manager.claim_paid_payments(self.bot, 8), [])
+        self.assertTrue(manager.finish_payment(payment_id))
+        self.assertEqual(_status(payment_id), 'finished')
+
+    def test_released_payment_waits_for_retry_at(self):
+        payment_id, = self._paid()
+        manager.claim_paid_payments(self.bot, 8)
+        before = int(time.time())
+        self.assertTrue(manager.release_payment(payment_id))
+
+        conn = get_connection()
+        attempts, retry_at = conn.execute(
+            "SELECT attempts, retry_at FROM PAYMENTS WHERE id = ?", (payment_id,)).fetchone()
+        self.assertEqual(_status(payment_id), 'paid')
+        self.assertEqual(attempts, 1)
+        self.assertGreaterEqual(retry_at, before + manager.RETRY_DELAY)
+        # Ainda dentro da espera: não é reservado
+        self.assertEqual(manager.claim_paid_payments(self.bot, 8), [])
+
+        conn.execute("UPDATE PAYMENTS SET retry_at = ? WHERE id = ?", (int(time.time()) - 1, payment_id))
+        conn.commit()
+        self.assertEqual([row[0] for row in manager.claim_paid_payments(self.bot, 8)], [payment_id])
+
+        # A segunda falha dobra a espera
+        before = int(time.time())
+        self.assertTrue(manager.release_payment(payment_id))
+        attempts, retry_at = conn.execute(
+            "SELECT attempts, retry_at FROM PAYMENTS WHERE id = ?", (payment_id,)).fetchone()
+        self.assertEqual(attempts, 2)
+        self.assertGreaterEqual(retry_at, before + 2 * manager.RETRY_DELAY)
+
+    def test_illegal_transitions_are_rejected(self):
+        payment_id, = self._paid()
+        trans_id = f"{self.bot}-{payment_id}"
+
+        # paid: não volta para waiting, não conclui sem reserva, webhook repetido é ignorado
+        self.assertFalse(manager.set_payment_waiting(payment_id, 'outro-pix'))
+        self.assertFalse(manager.finish_payment(payment_id))
+        self.assertFalse(manager.release_payment(payment_id))
+        self.assertIsNone(manager.mark_payment_paid(trans_id))
+        self.assertEqual(_status(payment_id), 'paid')
+
+        # delivering: webhook repetido não devolve para paid
+        manager.claim_paid_payments(self.bot, 8)
+        self.assertIsNone(manager.mark_payment_paid(trans_id))
+        self.assertFalse(manager.set_payment_waiting(payment_id, 'outro-pix'))
+        self.assertEqual(_status(payment_id), 'delivering')
+
+        # finished: estado final
+        self.assertTrue(manager.finish_payment(payment_id))
+        self.assertFalse(manager.finish_payment(payment_id))
+        self.assertFalse(manager.release_payment(payment_id))
+        self.assertIsNone(manager.mark_payment_paid(trans_id))
+        self.assertEqual(manager.claim_paid_payments(self.bot, 8), [])
+        self.assertEqual(_status(payment_id), 'finished')
+
+        # idle: não é reservado nem concluído antes do webhook
+        idle_id = manager.create_payment('chat', PLANO, PLANO['name'], self.bot)
+        self.assertEqual(manager.claim_paid_payments(self.bot, 8), [])
+        self.assertFalse(manager.finish_payment(idle_id))
+        self.assertEqual(_status(idle_id), 'idle')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""As consultas quentes do manager precisam resolver por índice (EXPLAIN QUERY PLAN), nunca por SCAN.
+
+As consultas não são copiadas aqui: cada função do manager roda contra um banco
+novo e os comandos que ela executou são capturados com set_trace_callback.
+"""
+import os, re, sys, tempfile, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+
+import modules.manager as manager
+from modules.database import get_connection
+
+# (descrição, chamada) das leituras e escritas feitas a cada pagamento, /start e expiração
+HOT_CALLS = [
+    ("pagamentos por status do bot", lambda: manager.get_payments_by_status('paid', '1')),
+    ("pagamento por transação", lambda: manager.get_payment_by_trans_id('t')),
+    ("pagamento por id", lambda: manager.get_payment_by_id(1)),
+    ("confirmação do webhook", lambda: manager.mark_payment_paid('t')),
+    ("reserva de pagamentos pagos", lambda: manager.claim_paid_payments('1', 8)),
+    ("conclusão da entrega", lambda: manager.finish_payment(1)),
+    ("devolução da reserva", lambda: manager.release_payment(1)),
+    ("usuários do bot", lambda: manager.get_bot_users('1')),
+    ("expirações do grupo", lambda: manager.get_due_expirations('g', 0)),
+    ("expirados do grupo", lambda: manager.verificar_expirados('g')),
+    ("expiração mais distante do usuário", lambda: manager.get_user_latest_expiration('u', 'g')),
+    ("acesso do usuário ao grupo", lambda: manager.get_user_expiration('u', 'g')),
+    ("recuperação ativa do usuário", lambda: manager.get_recovery_tracking('u', '1')),
+    ("recuperações do bot", lambda: manager.get_all_recovery_messages('1')),
+    ("bots inativos", lambda: manager.get_inactive_bots()),
+]
+
+INDEX_STEP = re.compile(r"USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY")
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+def _statements(call):
+    """Comandos SQL (já com os parâmetros) executados por call"""
+    executed = []
+    conn = get_connection()
+    conn.set_trace_callback(executed.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in executed if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')]
+
+
+class QueryPlanTest(unittest.TestCase):
+    def test_hot_queries_use_indexes(self):
+        conn = get_connection()
+        for label, call in HOT_CALLS:
+            with self.subTest(label):
+                statements = _statements(call)
+                self.assertTrue(statements, "nenhuma consulta capturada")
+                for sql in statements:
+                    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+                    self.assertTrue([step for step in plan if INDEX_STEP.search(step)], (sql, plan))
+                    self.assertFalse([step for step in plan if step.startswith("SCAN")], (sql, plan))
+
+
+if __name__ == "__main__":
+    unittest.main()
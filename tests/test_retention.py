@@ -0,0 +1,115 @@
+"""Retenção de PAYMENTS: arquiva no disco antes de apagar e não apaga o que mudou no meio do caminho."""
+import gzip, json, os, sys, tempfile, time, unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# O banco é escolhido na importação de modules.database
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_tmp.name, "data.db")
+
+import modules.manager as manager
+import modules.retention as retention
+from modules.database import get_connection
+
+PLANO = {'name': 'Mensal', 'value': 10, 'time': 1, 'time_type': 'mes'}
+
+
+def setUpModule():
+    manager.inicialize_database()
+
+
+def _payment(bot, status, age_days):
+    payment_id = manager.create_payment('chat', PLANO, PLANO['name'], bot, status=status)
+    conn = get_connection()
+    conn.execute("UPDATE PAYMENTS SET created_at = ? WHERE id = ?",
+                 (int(time.time()) - age_days * 86400, payment_id))
+    conn.commit()
+    return payment_id
+
+
+def _exists(payment_id):
+    return manager.get_payment_by_id(payment_id) is not None
+
+
+def _archived():
+    """{id: registro} de todos os arquivos gerados"""
+    records = {}
+    for name in os.listdir(retention.ARCHIVE_DIR):
+        with gzip.open(os.path.join(retention.ARCHIVE_DIR, name), 'rt', encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                records[record['id']] = record
+    return records
+
+
+class RetentionTest(unittest.TestCase):
+    _bots = 0
+
+    def setUp(self):
+        RetentionTest._bots += 1
+        self.bot = f"retention-{RetentionTest._bots}"
+        archive = tempfile.TemporaryDirectory()
+        self.addCleanup(archive.cleanup)
+        patcher = mock.patch.object(retention, 'ARCHIVE_DIR', archive.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_archives_then_deletes_only_old_stale_payments(self):
+        old = retention.RETENTION_DAYS + 1
+        idle = _payment(self.bot, 'idle', old)
+        waiting = _payment(self.bot, 'waiting', old)
+        paid = _payment(self.bot, 'paid', old)
+        recent = _payment(self.bot, 'idle', 1)
+
+        report = retention.run_retention()
+
+        self.assertFalse(_exists(idle))
+        self.assertFalse(_exists(waiting))
+        self.assertTrue(_exists(paid))
+        self.assertTrue(_exists(recent))
+        self.assertEqual(report['archived'], 2)
+
+        records = _archived()
+        self.assertEqual(set(records), {idle, waiting})
+        # O arquivo leva as colunas da tabela e o plano efetivo
+        self.assertEqual(records[idle]['status'], 'idle')
+        self.assertEqual(records[idle]['plan']['value'], 10)
+
+    def test_payment_that_moved_during_archive_stays(self):
+        old = retention.RETENTION_DAYS + 1
+        moved = _payment(self.bot, 'waiting', old)
+        stale = _payment(self.bot, 'idle', old)
+        archive = retention._archive
+
+        def archive_then_pay(rows, columns):
+            # O webhook chega entre o SELECT e o DELETE
+            written = archive(rows, columns)
+            manager.set_payment_waiting(moved, f"{self.bot}-pix")
+            manager.mark_payment_paid(f"{self.bot}-pix")
+            return written
+
+        with mock.patch.object(retention, '_archive', archive_then_pay):
+            report = retention.run_retention()
+
+        self.assertTrue(_exists(moved))
+        self.assertEqual(get_connection().execute(
+            "SELECT status FROM PAYMENTS WHERE id = ?", (moved,)).fetchone()[0], 'paid')
+        self.assertFalse(_exists(stale))
+        self.assertEqual(report['archived'], 1)
+
+    def test_unreadable_plan_is_archived_without_plan(self):
+        broken = _payment(self.bot, 'idle', retention.RETENTION_DAYS + 1)
+        conn = get_connection()
+        conn.execute("UPDATE PAYMENTS SET plan_overrides = '{' WHERE id = ?", (broken,))
+        conn.commit()
+
+        retention.run_retention()
+
+        self.assertFalse(_exists(broken))
+        self.assertIsNone(_archived()[broken]['plan'])
+
+
+if __name__ == "__main__":
+    unittest.main()